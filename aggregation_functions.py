@@ -0,0 +1,383 @@
+import pandas as pd
+import numpy as np
+import re
+import operator
+
+from loading_functions import rows_between
+
+# Columns describing a school, the same in all its classes
+SCHOOL_COLUMNS = ["schoolid", "secteur_public_prive_libe", "appellation_officielle", "libelle_commune", "localite_acheminement_uai",
+                  "libelle_departement", "libelle_region", "code_postal_uai", "geometry_type", "coordinatesLat", "coordinatesLong"]
+
+
+# Building the table of the schools (one row per school) from the classes, with the number of children of all its classes.
+# The schools are sorted by region, so that the schools of a region are next to each other.
+def build_schools(classes):
+    schools = classes[SCHOOL_COLUMNS].drop_duplicates("schoolid").dropna(subset=["schoolid"]).set_index("schoolid")
+
+    children = classes.groupby("schoolid")[["nbChild", "nbArchivedChildren"]].sum()
+    schools = schools.join(children)
+
+    return schools.sort_values("libelle_region", kind="mergesort").reset_index()
+
+
+# Positions of the schools of each region in the table of the schools
+def index_schools_by_region(schools):
+    return schools.groupby("libelle_region", observed=True).indices
+
+
+def schools_in_regions(schools, schools_by_region, regions):
+    positions = [schools_by_region[region] for region in regions if region in schools_by_region]
+    if len(positions) == 0:
+        return schools.iloc[0:0]
+    return schools.iloc[np.sort(np.concatenate(positions))]
+
+
+# Number of schools of each sector (public or private) in each region
+def count_sectors_by_region(schools):
+    return schools.groupby(["libelle_region", "secteur_public_prive_libe"], observed=True).size().unstack(fill_value=0)
+
+
+# Positions of the first day of a period and of the day after it in sorted days (a missing date leaves the period open),
+# the days being chosen the same way as in "loading_functions.dataset_with_correct_dates"
+def period_positions(days, start_date, end_date):
+    start = 0 if start_date is None else days.searchsorted(pd.to_datetime(start_date).normalize(), side="left")
+    end = len(days) if end_date is None else days.searchsorted(pd.to_datetime(end_date).normalize(), side="right")
+    return start, end
+
+
+# Counting the rows of a dataset indexed by date once, per day and per combination of the values of some columns
+# (e.g. the notifications per day, group and type), with the cumulative sums along the days: the counts over any period
+# are the difference of two rows of cumulative sums, whatever the number of rows of the dataset.
+# The rows without a date or without a value in "count_column" are not counted, as in the callbacks.
+# With "distinct", a value of "count_column" is counted once per day (e.g. the distinct events starting each day).
+# With "weekday", the counts are also split by day of the week (last level of the combinations), so that the counts
+# per day of the week over a period are a difference of two rows too
+def build_daily_counts(df, key_columns, count_column="id", distinct=False, weekday=False):
+    df = df.loc[df.index.notna() & df[count_column].notna(), key_columns + [count_column]]
+
+    if distinct:
+        df = df[~pd.MultiIndex.from_arrays([df.index, df[count_column]]).duplicated()]
+
+    keys = [df.index] + [df[column] for column in key_columns]
+    if weekday:
+        keys.append(pd.Series(df.index.dayofweek, index=df.index, name="weekday"))
+
+    counts = df.groupby(keys, observed=True).size()
+    counts = counts.unstack(list(range(1, len(keys))), fill_value=0).sort_index(axis=1)
+
+    cumulative_counts = np.zeros((counts.shape[0] + 1, counts.shape[1]), dtype=np.int64)
+    np.cumsum(counts.to_numpy(), axis=0, out=cumulative_counts[1:])
+
+    return {"days": counts.index, "keys": counts.columns, "cumulative_counts": cumulative_counts}
+
+
+# Number of rows over a period for each combination of values counted by "build_daily_counts"
+def counts_between(daily_counts, start_date, end_date):
+    start, end = period_positions(daily_counts["days"], start_date, end_date)
+    cumulative_counts = daily_counts["cumulative_counts"]
+    return pd.Series(cumulative_counts[end] - cumulative_counts[start], index=daily_counts["keys"])
+
+
+# Selecting the counts of "counts_between" where a column takes one of the values chosen in a filter
+def counts_with_values(counts, column, values):
+    return counts.index.get_level_values(column).isin(values)
+
+
+# Periods of the rollups (weeks starting on Monday)
+ROLLUP_FREQUENCIES = {"day": "D", "week": "W-SUN", "month": "M"}
+
+
+# Counting the rows of a dataset indexed by date once per day (the days with rows only), with their cumulative sums, and
+# the position of the first day of each week and each month among these days: the counts per day, week or month over any
+# period are differences of cumulative sums (see "rollup_between"). The rows without a value in "count_column" are not counted
+def build_rollups(df, count_column="id"):
+    days = df.index[df.index.notna() & df[count_column].notna().to_numpy()]
+    counts = days.value_counts(sort=False).sort_index()
+
+    cumulative_counts = np.zeros(len(counts) + 1, dtype=np.int64)
+    np.cumsum(counts.to_numpy(), out=cumulative_counts[1:])
+
+    rollups = {"days": counts.index, "cumulative_counts": cumulative_counts}
+    for granularity, frequency in ROLLUP_FREQUENCIES.items():
+        periods = counts.index.to_period(frequency).start_time
+        firsts = np.flatnonzero(np.r_[True, periods[1:] != periods[:-1]]) if len(periods) > 0 else np.array([], dtype=int)
+        rollups[granularity] = {"periods": periods[firsts], "positions": np.append(firsts, len(counts))}
+    return rollups
+
+
+# Number of rows per day, week or month over a period ("Count", the periods without rows being left out) and their
+# cumulative sum since the start of the period ("Evolution"). The first and last weeks or months only count the days of the period
+def rollup_between(rollups, granularity, start_date, end_date):
+    start, end = period_positions(rollups["days"], start_date, end_date)
+    rollup = rollups[granularity]
+    positions = rollup["positions"]
+
+    first = positions.searchsorted(start, side="right") - 1
+    last = max(positions.searchsorted(end, side="left"), first)
+    counts = np.diff(rollups["cumulative_counts"][np.clip(positions[first:last + 1], start, end)])
+
+    dff = pd.DataFrame({"Count": counts}, index=rollup["periods"][first:last].rename("day"))
+    dff["Evolution"] = dff.Count.cumsum()
+    return dff
+
+
+# Positions of the points kept to draw a line with at most "number_of_points" points, following its shape
+# ("Largest Triangle Three Buckets": the first and last points, and in each bucket of points between them, the point
+# making the largest triangle with the point kept before and the mean of the next bucket)
+def downsample_line(x, y, number_of_points):
+    n = len(x)
+    if number_of_points >= n or number_of_points < 3:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    bounds = np.linspace(1, n - 1, number_of_points - 1).astype(int)
+
+    kept = np.zeros(number_of_points, dtype=int)
+    kept[-1] = n - 1
+    for i in range(number_of_points - 2):
+        start, end = bounds[i], bounds[i + 1]
+        next_end = bounds[i + 2] if i + 2 < len(bounds) else n
+        next_x, next_y = x[end:next_end].mean(), y[end:next_end].mean()
+        a = kept[i]
+        areas = np.abs((x[a] - next_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (next_y - y[a]))
+        kept[i + 1] = start + areas.argmax()
+    return kept
+
+
+# Positions of the rows of a dataset indexed by date in a period and, with a column, where this column takes one of the
+# values chosen in a filter: the rows are then taken with "df.iloc[rows]"
+def select_rows(df, start_date, end_date, column=None, values=None):
+    start, end = rows_between(df, start_date, end_date)
+    rows = np.arange(start, end)
+    if column is not None:
+        rows = rows[df[column].iloc[start:end].isin(values).to_numpy()]
+    return rows
+
+
+# Counting the words of a text column once, per day and per value of a key column (e.g. the words of the labels of the events
+# per day and per type of event), so that the most frequent words of any period and any selection of keys are found
+# without splitting the texts again. Only the words that can appear in a wordcloud are kept (not in "stopwords", more than 2 letters).
+# The counts are stored sorted by (word, key, day), with their cumulative sum: the count of a word for a key over a period
+# is the difference of two cumulative sums, found by binary search.
+def build_word_counts(df, text_column, key_column, stopwords):
+    df = df.loc[df.index.notna() & df[text_column].notna(), [text_column, key_column]]
+
+    days = df.index.unique()
+    keys = df[key_column].astype("category").cat.categories
+    if len(days) == 0:
+        return {"days": days, "keys": keys, "vocabulary": np.array([], dtype=object), "positions": np.array([], dtype=np.int64),
+                "pairs": np.array([], dtype=np.int64), "cumulative_counts": np.zeros(1, dtype=np.int64)}
+
+    day_codes = days.get_indexer(df.index)
+    key_codes = keys.get_indexer(df[key_column])
+
+    # one row per word, indexed by the position of its text
+    words = df[text_column].reset_index(drop=True).str.split(" ").explode()
+    words = words[(words.str.len() > 2) & ~words.isin(set(stopwords))]
+    word_codes, vocabulary = pd.factorize(words)
+    day_codes, key_codes = day_codes[words.index], key_codes[words.index]
+
+    positions = (word_codes.astype(np.int64) * len(keys) + key_codes) * len(days) + day_codes
+    positions, counts = np.unique(positions, return_counts=True)
+
+    return {"days": days, "keys": keys, "vocabulary": np.asarray(vocabulary, dtype=object),
+            "positions": positions, "pairs": np.unique(positions // len(days)),
+            "cumulative_counts": np.concatenate([[0], np.cumsum(counts)])}
+
+
+# Most frequent words (at most "number_of_words", the most frequent first) for some keys over a period of days
+def top_words(word_counts, keys, start_date, end_date, number_of_words=40):
+    days = word_counts["days"]
+    n_days, n_keys = len(days), len(word_counts["keys"])
+    positions = word_counts["positions"]
+    if len(positions) == 0:
+        return []
+
+    start, end = period_positions(days, start_date, end_date)
+
+    # (word, key) pairs present in the counts, kept when the key is selected
+    pairs = word_counts["pairs"]
+    key_codes = word_counts["keys"].get_indexer(keys)
+    pairs = pairs[np.isin(pairs % n_keys, key_codes[key_codes >= 0])]
+
+    cumulative_counts = word_counts["cumulative_counts"]
+    counts = (cumulative_counts[positions.searchsorted(pairs * n_days + end)]
+              - cumulative_counts[positions.searchsorted(pairs * n_days + start)])
+    counts = np.bincount(pairs // n_keys, weights=counts, minlength=len(word_counts["vocabulary"]))
+
+    number_of_words = min(number_of_words, np.count_nonzero(counts))
+    if number_of_words == 0:
+        return []
+    # the most frequent first, the words seen first in the texts first when they are as frequent
+    smallest_count = np.partition(counts, len(counts) - number_of_words)[len(counts) - number_of_words]
+    best = np.flatnonzero(counts >= smallest_count)
+    best = best[np.lexsort((best, -counts[best]))][:number_of_words]
+
+    return list(word_counts["vocabulary"][best])
+
+
+# Counting the rows of a dataset indexed by date once per day, type (e.g. of event) and author: one entry per combination
+# present, sorted by day, with the code of its type and of its author. The counts of all the authors over any period and
+# selection of types are then summed from the entries of the period only (see "count_authors"), fewer than the rows.
+# The rows without a date, an author or a value in "count_column" are not counted, as "groupby().count()" does
+def build_author_counts(df, author_column, type_column, count_column="id"):
+    df = df.loc[df.index.notna() & df[author_column].notna().to_numpy() & df[count_column].notna().to_numpy(), [author_column, type_column]]
+    authors, author_names = pd.factorize(df[author_column], sort=True)
+    types, type_names = pd.factorize(df[type_column])
+
+    counts = pd.Series(1, index=pd.MultiIndex.from_arrays([df.index, types, authors])).groupby(level=[0, 1, 2]).size()
+
+    return {"days": counts.index.get_level_values(0), "types": counts.index.get_level_values(1).to_numpy(),
+            "authors": counts.index.get_level_values(2).to_numpy(), "counts": counts.to_numpy(),
+            "type_names": type_names, "author_names": np.asarray(author_names, dtype=object)}
+
+
+# Number of rows of each author over a period, for some types (all of them with None)
+def count_authors(author_counts, start_date, end_date, types=None):
+    start, end = period_positions(author_counts["days"], start_date, end_date)
+    authors, counts = author_counts["authors"][start:end], author_counts["counts"][start:end]
+    if types is not None:
+        selected = np.isin(author_counts["types"][start:end], author_counts["type_names"].get_indexer(types))
+        authors, counts = authors[selected], counts[selected]
+
+    return np.bincount(authors, weights=counts, minlength=len(author_counts["author_names"])).astype(np.int64)
+
+
+# Ranking of the "number_of_authors" authors with the most rows among the counts of "count_authors", found by partial
+# selection instead of sorting all the authors: the authors with the most rows first and, when they have as many rows, by
+# name (the authors are coded in the order of their names). The authors with the same number share the same rank, rounded
+# down, counting the authors with as many rows as the last one but not shown
+def rank_authors(author_counts, counts, count_name, number_of_authors):
+    authors = np.flatnonzero(counts > 0)
+    values = counts[authors]
+
+    keys = -values * len(counts) + authors
+    best = np.argpartition(keys, number_of_authors - 1)[:number_of_authors] if len(keys) > number_of_authors else np.arange(len(keys))
+    best = best[np.argsort(keys[best])]
+    top = values[best]
+
+    first = (-top).searchsorted(-top, side="left")
+    equal = (-top).searchsorted(-top, side="right") - first
+    if len(top) > 0:
+        equal[top == top[-1]] = np.count_nonzero(values == top[-1])
+
+    return pd.DataFrame({"Rank": (first + (equal + 1) / 2).astype(int), "Author": author_counts["author_names"][authors[best]],
+                         count_name: top})
+
+
+# Number of days coded for each user in the keys of the activities (about 2870 years from 1970)
+DAYS_PER_USER = 2 ** 20
+
+
+def day_number(date):
+    return int(pd.to_datetime(date).normalize().value // (24 * 3600 * 10 ** 9))
+
+
+# Indexing once the activities of the users (e.g. the homeworks, events and documents they created), given as
+# (dataset, column of the user) with the date of the activity in "date_column": the code of the user of each row of "users",
+# the number of activities and the last day of activity of each user, and a key per activity (user and day) sorted, so that
+# the activities of any users over any period are counted by binary search (see "users_without_activity").
+# The activities of unknown users or without a date are left out
+def index_activities(users, activities, date_column="creationDate"):
+    codes, user_ids = pd.factorize(users["id"])
+    if (len(user_ids) + 1) * DAYS_PER_USER > np.iinfo(np.int64).max:
+        raise ValueError("Too many users ({}) to code their activities on 64 bits".format(len(user_ids)))
+
+    activity_users, activity_days = [], []
+    for df, user_column in activities:
+        found = user_ids.get_indexer(df[user_column])
+        days = df[date_column].to_numpy().astype("datetime64[D]").astype(np.int64)
+        keep = (found >= 0) & df[date_column].notna().to_numpy()
+        activity_users.append(found[keep])
+        activity_days.append(np.clip(days[keep], 0, DAYS_PER_USER - 1))
+
+    activity_users = np.concatenate(activity_users).astype(np.int64)
+    keys = np.sort(activity_users * DAYS_PER_USER + np.concatenate(activity_days))
+
+    counts = np.bincount(activity_users, minlength=len(user_ids))
+    if len(keys) == 0:
+        return {"codes": codes, "keys": keys, "counts": counts, "last_days": np.full(len(user_ids), -1, dtype=np.int64)}
+
+    last_keys = keys[np.maximum(keys.searchsorted((np.arange(len(user_ids)) + 1) * DAYS_PER_USER, side="left") - 1, 0)]
+    last_days = np.where(counts > 0, last_keys % DAYS_PER_USER, -1)
+
+    return {"codes": codes, "keys": keys, "counts": counts, "last_days": last_days}
+
+
+# Positions of the rows of "users" among "rows" without any activity between two days (a missing date leaves the period open)
+def users_without_activity(activities_index, rows, start_date, end_date):
+    codes = activities_index["codes"][rows]
+    rows, codes = rows[codes >= 0], codes[codes >= 0].astype(np.int64)
+
+    start = 0 if start_date is None else min(max(day_number(start_date), 0), DAYS_PER_USER)
+    end = DAYS_PER_USER - 1 if end_date is None else min(max(day_number(end_date), -1), DAYS_PER_USER - 1)
+    keys = activities_index["keys"]
+    counts = keys.searchsorted(codes * DAYS_PER_USER + end, side="right") - keys.searchsorted(codes * DAYS_PER_USER + start, side="left")
+    return rows[counts <= 0]
+
+
+# Table of the activity of each user (in the order of "users"), from which the rows of the inactive users are taken.
+# The dates are written as text, to be sorted and filtered as the DataTables show them
+def build_activity_table(users, activities_index):
+    codes = activities_index["codes"]
+    last_days = np.where(codes >= 0, activities_index["last_days"][codes], -1)
+    last_activity = np.where(last_days >= 0, np.datetime_as_string(last_days.astype("datetime64[D]")), "")
+    sign_up = users["creationDate"].to_numpy().astype("datetime64[D]")
+    sign_up = np.where(np.isnat(sign_up), "", np.datetime_as_string(sign_up))
+
+    return pd.DataFrame({"User": users["id"].to_numpy(), "Username": users["username"].to_numpy(), "Sign-up": sign_up,
+                         "Last activity": last_activity,
+                         "Activities": np.where(codes >= 0, activities_index["counts"][codes], 0)})
+
+
+# Filters of the DataTables ("filter_query"), e.g. '{Author} contains "u1" && {Events Created} >= 10': the parts that
+# can't be read are ignored, a prefix "i" makes a comparison case insensitive
+FILTER_PATTERN = re.compile(r"^\{(?P<column>[^}]+)\}\s*(?P<case>[is]?)(?P<operator>>=|<=|!=|>|<|=|eq|ne|ge|le|gt|lt|contains|datestartswith)\s*(?P<value>.*)$")
+FILTER_OPERATORS = {"=": operator.eq, "eq": operator.eq, "!=": operator.ne, "ne": operator.ne, ">=": operator.ge, "ge": operator.ge,
+                    "<=": operator.le, "le": operator.le, ">": operator.gt, "gt": operator.gt, "<": operator.lt, "lt": operator.lt}
+
+
+def filter_table(df, filter_query):
+    mask = np.ones(len(df), dtype=bool)
+    for part in (filter_query or "").split(" && "):
+        match = FILTER_PATTERN.match(part.strip())
+        if match is None or match.group("column") not in df.columns:
+            continue
+
+        column, value = df[match.group("column")], match.group("value").strip()
+        if len(value) > 1 and value[0] == value[-1] and value[0] in "\"'`":
+            value = value[1:-1]
+
+        if match.group("operator") in ["contains", "datestartswith"] or not pd.api.types.is_numeric_dtype(column):
+            column = column.astype(str)
+            if match.group("case") == "i":
+                column, value = column.str.lower(), value.lower()
+            if match.group("operator") == "contains":
+                mask &= column.str.contains(value, regex=False).to_numpy()
+            elif match.group("operator") == "datestartswith":
+                mask &= column.str.startswith(value).to_numpy()
+            else:
+                mask &= FILTER_OPERATORS[match.group("operator")](column, value).to_numpy()
+        else:
+            try:
+                mask &= FILTER_OPERATORS[match.group("operator")](column, float(value)).to_numpy()
+            except ValueError:
+                mask[:] = False
+
+    return df[mask]
+
+
+# Page of a table shown by a DataTable paged, sorted and filtered by the server ("custom" actions): only the rows of the
+# page are sent. Returns the rows of the page and the number of pages (a page after the last one gives the last one)
+def table_page(df, page_current, page_size, sort_by, filter_query):
+    df = filter_table(df, filter_query)
+    for sort in reversed(sort_by or []):
+        if sort["column_id"] in df.columns:
+            df = df.sort_values(sort["column_id"], ascending=sort["direction"] == "asc", kind="mergesort")
+
+    page_count = max(-(-len(df) // page_size), 1)
+    page = min(page_current or 0, page_count - 1)
+
+    return df.iloc[page * page_size:(page + 1) * page_size].to_dict("records"), page_count
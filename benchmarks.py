@@ -0,0 +1,369 @@
+import pandas as pd
+import numpy as np
+import os
+import glob
+import time
+import sys
+import signal
+import json
+import tempfile
+import warnings
+import subprocess
+from urllib.request import urlopen
+
+from cleaning_functions import DATA_FOLDER, clean_text, grouping_notifications, clean_database, clean_database_in_chunks, clean_file, read_raw_database
+from loading_functions import SCHEMAS, dataset_with_correct_dates, index_by_date, read_csv_database, read_csv_database_in_chunks, save_columnar, save_columnar_in_chunks
+from aggregation_functions import select_rows
+from cache_functions import clear_cache
+from synthetic_data import ROWS, generate_databases, write_databases
+
+# Times of the benchmarks of the callbacks saved as the reference (see "benchmark_callbacks"): a time more than
+# REGRESSION_TOLERANCE times the one of the reference (and longer by more than 5 ms) is reported as a regression
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmarks_baseline.json")
+REGRESSION_TOLERANCE = 1.5
+
+
+# Previous implementation of "clean_text" (one replacement of the whole column after the other),
+# kept to compare it with the one-pass implementation
+def clean_text_chained(df):
+    df = df.str.lower()
+    df = df.str.replace("ãª", "ê", regex=False).str.replace("ã", "à", regex=False)
+    df = df.str.replace("lévénement", "l'événement", regex=False).str.replace("l''agenda", "l'agenda", regex=False)
+    df = df.str.replace('  ', ' ', regex=False)
+    df = df.str.replace('{0}', '', regex=False).str.replace('{1}', '', regex=False).str.replace('{2}', '', regex=False).str.replace('{3}', '', regex=False)
+    df = df.str.replace(r'[^\w\s]', '', regex=True)
+    df = df.str.strip("'.")
+    return df
+
+
+# Previous implementation of "grouping_notifications", applied row by row
+def grouping_notifications_rowwise(string):
+    if string in ["INFORMATION_EVENT", "INVITATION_EVENT", "PERIOD_TO_VALIDATE", "INFORMATION"]:
+        return "EVENT"
+    elif string in ["SETUP_CALENDAR", "SETUP_CLASS", "SETUP_SCHOOL"]:
+        return "SETUP"
+    elif string in ["HOMEWORK_REQUEST", "HOMEWORK_RESPONSE"]:
+        return "HOMEWORK"
+    elif string in ["INVITATION_CLASS", "MODAL_NOTIF_END_COACH", "MODAL_NOTIF_INIT_COACH"]:
+        return "CLASSES"
+    else:
+        return "UNKNOWN"
+
+
+# Texts of the raw databases (labels of the events and messages of the notifications) when they are in the "data" folder,
+# or a few typical texts otherwise, repeated to get the number of rows wanted
+def sample_texts(number_of_rows):
+    texts = []
+    for path in glob.glob(os.path.join(DATA_FOLDER, "*.csv")):
+        columns = pd.read_csv(path, nrows=0).columns
+        for column in ["label", "message"]:
+            if column in columns:
+                texts += list(pd.read_csv(path, usecols=[column], dtype=object)[column])
+
+    if len(texts) == 0:
+        texts = ["Réunion parents-professeurs : l''agenda du {0} est disponible !", "Sortie au musée le {1}, n'oubliez pas l'autorisation.",
+                 "{0} vous invite à lévénement « {2} »", "Ãªtes-vous disponible pour la fête de l'école ?", "Nouveau devoir  :  {0} pour le {3}",
+                 np.nan]
+
+    return pd.Series(np.resize(np.array(texts, dtype=object), number_of_rows))
+
+
+def sample_notification_types(number_of_rows):
+    types = ["INFORMATION_EVENT", "INVITATION_EVENT", "PERIOD_TO_VALIDATE", "INFORMATION", "SETUP_CALENDAR", "SETUP_CLASS", "SETUP_SCHOOL",
+             "HOMEWORK_REQUEST", "HOMEWORK_RESPONSE", "INVITATION_CLASS", "MODAL_NOTIF_END_COACH", "MODAL_NOTIF_INIT_COACH", "OTHER", np.nan]
+    return pd.Series(np.random.default_rng(0).choice(np.array(types, dtype=object), number_of_rows))
+
+
+# Best time of a function over a few runs, "setup" (not timed) being called before each of them
+def best_time(function, repeat=3, setup=None):
+    times = []
+    for i in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def benchmark_clean_text(number_of_rows=200000):
+    texts = sample_texts(number_of_rows)
+
+    chained = best_time(lambda: clean_text_chained(texts))
+    one_pass = best_time(lambda: clean_text(texts))
+    same = clean_text(texts).fillna("NaN").equals(clean_text_chained(texts).fillna("NaN"))
+
+    print("clean_text ({} rows): chained {:.3f}s, one pass {:.3f}s (x{:.1f}), same result: {}".format(
+        number_of_rows, chained, one_pass, chained / one_pass, same))
+
+
+def benchmark_grouping_notifications(number_of_rows=1000000):
+    notification_types = sample_notification_types(number_of_rows)
+
+    rowwise = best_time(lambda: notification_types.apply(grouping_notifications_rowwise))
+    vectorised = best_time(lambda: grouping_notifications(notification_types))
+    same = grouping_notifications(notification_types).astype(object).equals(notification_types.apply(grouping_notifications_rowwise))
+
+    print("grouping_notifications ({} rows): row by row {:.3f}s, vectorised {:.3f}s (x{:.1f}), same result: {}".format(
+        number_of_rows, rowwise, vectorised, rowwise / vectorised, same))
+
+
+# Checking that the two modes of cleaning (in memory and chunk by chunk) write the same clean CSV for each synthetic
+# database, with small chunks, and that the columnar file of the chunked mode, written chunk by chunk, is the one written
+# from the whole clean CSV (once indexed by date, as when it is loaded). Returns the names of the databases whose files differ
+def check_chunked_cleaning(scale=1, chunksize=1000):
+    differences = []
+    with tempfile.TemporaryDirectory() as folder:
+        for name, path in write_databases(generate_databases(scale), folder).items():
+            in_memory, in_chunks = os.path.join(folder, name + ".memory.csv"), os.path.join(folder, name + ".chunks.csv")
+            clean_database(read_raw_database(path)).to_csv(in_memory)
+            clean_database_in_chunks(path, in_chunks, chunksize=chunksize)
+
+            if name in SCHEMAS:
+                at_once, chunk_by_chunk = os.path.join(folder, name + ".feather"), os.path.join(folder, name + ".chunks.feather")
+                save_columnar(read_csv_database(in_chunks, name), at_once)
+                save_columnar_in_chunks(read_csv_database_in_chunks(in_chunks, name, chunksize), chunk_by_chunk)
+                index = SCHEMAS[name]["index"]
+                same_columnar = index_by_date(pd.read_feather(at_once), index).equals(index_by_date(pd.read_feather(chunk_by_chunk), index))
+                print("Columnar file of {} written at once and in chunks of {} rows: {}".format(name, chunksize, "same" if same_columnar else "different"))
+                if not same_columnar:
+                    differences.append(name)
+
+            with open(in_memory) as memory_file, open(in_chunks) as chunks_file:
+                lines = [(memory_line, chunks_line) for memory_line, chunks_line in zip(memory_file, chunks_file) if memory_line != chunks_line]
+            same_size = os.path.getsize(in_memory) == os.path.getsize(in_chunks)
+            print("Cleaning of {} in memory and in chunks of {} rows: {}".format(
+                name, chunksize, "same CSV" if len(lines) == 0 and same_size else "{} lines differ".format(len(lines))))
+            if len(lines) > 0 or not same_size:
+                differences.append(name)
+                for memory_line, chunks_line in lines[:3]:
+                    print("  - {}  + {}".format(memory_line.strip(), chunks_line.strip()))
+    return differences
+
+
+# Memory of a process read in /proc (Linux only), in MB: resident memory (Rss), memory shared with the other processes
+# counted in proportion (Pss) and memory used by this process only (Private)
+def process_memory(pid):
+    memory = {}
+    with open("/proc/{}/smaps_rollup".format(pid)) as file:
+        for line in file:
+            fields = line.split()
+            if fields[0] in ["Rss:", "Pss:", "Private_Clean:", "Private_Dirty:"]:
+                memory[fields[0][:-1]] = int(fields[1]) / 1024
+    return {"Rss": memory["Rss"], "Pss": memory["Pss"], "Private": memory["Private_Clean"] + memory["Private_Dirty"]}
+
+
+def worker_pids(master_pid):
+    with open("/proc/{0}/task/{0}/children".format(master_pid)) as file:
+        return [int(pid) for pid in file.read().split()]
+
+
+# Starting the dashboard with gunicorn (with "gunicorn.conf.py"), with or without loading the app before forking the workers,
+# and measuring the memory of each worker once they all answer
+def measure_workers_memory(preload, workers=3, port=8050, timeout=300):
+    environment = dict(os.environ, FEAMZY_PRELOAD="1" if preload else "0", FEAMZY_RELOAD_INTERVAL="0")
+    command = ["gunicorn", "--workers", str(workers), "--bind", "127.0.0.1:{}".format(port), "feamzy_dashboard:server"]
+    master = subprocess.Popen(command, env=environment, cwd=os.path.dirname(os.path.abspath(__file__)),
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        start = time.perf_counter()
+        while time.perf_counter() - start < timeout:
+            time.sleep(1)
+            try:
+                pids = worker_pids(master.pid)
+            except OSError:
+                continue
+            answers = 0
+            for i in range(4 * workers):
+                try:
+                    urlopen("http://127.0.0.1:{}/".format(port), timeout=5)
+                    answers += 1
+                except OSError as error:
+                    # the login request of the basic authentication is an answer too
+                    answers += getattr(error, "code", None) == 401
+            if len(pids) == workers and answers == 4 * workers:
+                time.sleep(2)
+                return [process_memory(pid) for pid in worker_pids(master.pid)], process_memory(master.pid)
+        raise RuntimeError("gunicorn didn't start in {}s".format(timeout))
+    finally:
+        master.send_signal(signal.SIGTERM)
+        master.wait()
+
+
+def benchmark_workers_memory(workers=3):
+    for preload in [False, True]:
+        memory, master = measure_workers_memory(preload, workers)
+        print("gunicorn, {} workers, {}: per worker Rss {:.0f} MB, Pss {:.0f} MB, Private {:.0f} MB; all processes Pss {:.0f} MB".format(
+            workers, "app loaded before the fork" if preload else "app loaded in each worker",
+            np.mean([m["Rss"] for m in memory]), np.mean([m["Pss"] for m in memory]), np.mean([m["Private"] for m in memory]),
+            sum(m["Pss"] for m in memory) + master["Pss"]))
+
+
+# Environment to start the dashboard in the benchmarks: without checking for new databases, and with or without
+# loading the databases in the background
+def dashboard_environment(lazy_start):
+    return dict(os.environ, FEAMZY_RELOAD_INTERVAL="0", FEAMZY_LAZY_START="1" if lazy_start else "0")
+
+
+# Time taken to import each module imported by "feamzy_dashboard" (cumulated with the modules they import first, as given
+# by "python -X importtime"), the time of the dashboard itself being mostly the loading of the databases
+def profile_import(lazy_start=False, number_of_modules=10):
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import feamzy_dashboard"], env=dashboard_environment(lazy_start),
+                            cwd=os.path.dirname(os.path.abspath(__file__)), stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+
+    # the modules are listed after the modules they import, indented by 2 spaces per level of import:
+    # the modules imported by feamzy_dashboard are the ones of level 1 since the previous module of level 0
+    modules = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        own, cumulated, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if depth == 0 and name.strip() != "feamzy_dashboard":
+            modules = []
+        elif depth <= 1:
+            modules.append((name.strip(), int(own) / 1e6, int(cumulated) / 1e6))
+        if name.strip() == "feamzy_dashboard":
+            break
+
+    total = modules[-1]
+    print("import feamzy_dashboard ({}): {:.2f}s, of which the dashboard itself {:.2f}s".format(
+        "lazy start" if lazy_start else "eager start", total[2], total[1]))
+    for name, own, cumulated in sorted(modules[:-1], key=lambda module: -module[2])[:number_of_modules]:
+        print("  {:<30} {:.3f}s".format(name, cumulated))
+
+
+STARTUP_SCRIPT = """
+import time, base64
+start = time.perf_counter()
+import feamzy_dashboard
+imported = time.perf_counter() - start
+client = feamzy_dashboard.server.test_client()
+client.get("/_dash-layout", headers={"Authorization": "Basic " + base64.b64encode(b"feamzy_adm:ironhack").decode()})
+print(imported, time.perf_counter() - start)
+"""
+
+
+# Time until the dashboard is imported (the server can answer) and until the first layout is served, in a new process
+def benchmark_startup(repeat=3):
+    for lazy_start in [False, True]:
+        times = []
+        for i in range(repeat):
+            result = subprocess.run([sys.executable, "-c", STARTUP_SCRIPT], env=dashboard_environment(lazy_start),
+                                    cwd=os.path.dirname(os.path.abspath(__file__)), stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+            times.append([float(value) for value in result.stdout.splitlines()[-1].split()])
+        imported, first_page = np.min(times, axis=0)
+        print("startup ({}): import {:.2f}s, first layout served {:.2f}s".format("lazy start" if lazy_start else "eager start", imported, first_page))
+
+
+# Importing the dashboard without loading the "data_clean" folder nor starting its background tasks, with its cache
+# in a temporary file of the folder: the benchmarks load the synthetic databases in it. The path is read by the first
+# import only, so it is also changed in "cache_functions" for the next folders
+def import_dashboard(folder):
+    path = os.path.join(folder, "cache.sqlite")
+    os.environ.update({"FEAMZY_LAZY_START": "1", "FEAMZY_START_AFTER_FORK": "1", "FEAMZY_RELOAD_INTERVAL": "0",
+                       "FEAMZY_CACHE": path})
+    import cache_functions
+    import feamzy_dashboard
+    cache_functions.CACHE_PATH = path
+    return feamzy_dashboard
+
+
+# Times of the steps of the dashboard on synthetic databases of a scale: cleaning of each raw database, filter of the dates,
+# loading of the clean databases and each callback with the default filters of the layout (computed, not read from the cache:
+# the cache is emptied before each repeat, the callbacks also reading the results of memoized functions)
+def time_dashboard(scale, folder, repeat=3):
+    raw_folder, clean_folder = os.path.join(folder, "data"), os.path.join(folder, "data_clean")
+    os.makedirs(clean_folder, exist_ok=True)
+    paths = write_databases(generate_databases(scale), raw_folder)
+
+    times = {}
+    for name, path in paths.items():
+        df = read_raw_database(path)
+        times["clean_database " + name] = best_time(lambda: clean_database(df), repeat)
+        clean_file(path, name, clean_folder)
+
+    feamzy_dashboard = import_dashboard(folder)
+    start = time.perf_counter()
+    data = feamzy_dashboard.load_snapshot(clean_folder)
+    times["load_snapshot"] = time.perf_counter() - start
+    feamzy_dashboard.swap_snapshot(data)
+
+    for key, name in [("users", "User"), ("events", "Event"), ("notifications", "Notification")]:
+        times["dataset_with_correct_dates " + name] = best_time(lambda: dataset_with_correct_dates(data[key], "2020-08-01", "2021-04-12"), repeat)
+
+    # the rows of the selections are timed without their cache (they are selected by the callbacks and exports needing them)
+    for output, function, values in feamzy_dashboard.default_callback_inputs():
+        if output.endswith("-selection.data"):
+            selection = function(*values)
+            name, column = feamzy_dashboard.SECTIONS[selection["section"]]
+            times["select_rows " + name] = best_time(lambda: select_rows(data[name], selection["start_date"], selection["end_date"],
+                                                                         column, selection["values"]), repeat)
+            continue
+        function = getattr(function, "__wrapped__", function)
+        times["callback " + function.__name__] = best_time(lambda: function(*values), repeat, clear_cache)
+
+    return times
+
+
+# Timing the dashboard on synthetic databases of each scale, and comparing the times with the reference ones saved in
+# BASELINE (made from the first run, or again with "save_baseline"). Returns the names of the regressions
+def benchmark_callbacks(scales=(1, 10), save_baseline=False, repeat=3):
+    baseline = {}
+    if os.path.exists(BASELINE) and not save_baseline:
+        with open(BASELINE) as file:
+            baseline = json.load(file)
+
+    results = {}
+    regressions = []
+    for scale in scales:
+        with tempfile.TemporaryDirectory() as folder, warnings.catch_warnings():
+            # plotly.express warns about the deprecated pandas functions it uses
+            warnings.simplefilter("ignore", FutureWarning)
+            times = time_dashboard(scale, folder, repeat)
+
+        name = "scale {:g}".format(scale)
+        results[name] = times
+        print("{} ({}):".format(name, ", ".join("{} {} rows".format(table, int(rows * scale)) for table, rows in sorted(ROWS.items()))))
+        for step, seconds in times.items():
+            reference = baseline.get(name, {}).get(step)
+            if reference is None:
+                print("  {:<45} {:8.4f}s".format(step, seconds))
+                continue
+            regression = seconds > REGRESSION_TOLERANCE * reference and seconds - reference > 0.005
+            if regression:
+                regressions.append("{} {}".format(name, step))
+            print("  {:<45} {:8.4f}s (reference {:.4f}s, x{:.2f}){}".format(
+                step, seconds, reference, seconds / reference if reference > 0 else float("inf"), "  REGRESSION" if regression else ""))
+
+    if save_baseline or len(baseline) == 0:
+        with open(BASELINE, "w") as file:
+            json.dump(dict(baseline, **results), file, indent=4)
+        print("Reference times saved in {}".format(BASELINE))
+
+    return regressions
+
+
+# "python benchmarks.py callbacks [scale ...] [--save-baseline]" only runs the benchmarks of the dashboard on synthetic data,
+# failing if a step is slower than its reference time. "python benchmarks.py check-cleaning" only compares the two modes
+# of cleaning, failing if they write different CSVs
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["check-cleaning"]:
+        if len(check_chunked_cleaning()) > 0:
+            sys.exit(1)
+    elif sys.argv[1:2] == ["callbacks"]:
+        arguments = sys.argv[2:]
+        scales = [float(argument) for argument in arguments if argument != "--save-baseline"] or [1, 10]
+        regressions = benchmark_callbacks(scales, save_baseline="--save-baseline" in arguments)
+        if len(regressions) > 0:
+            print("Regressions: {}".format(", ".join(regressions)))
+            sys.exit(1)
+    else:
+        check_chunked_cleaning()
+        benchmark_clean_text()
+        benchmark_grouping_notifications()
+        benchmark_workers_memory()
+        profile_import(lazy_start=False)
+        profile_import(lazy_start=True)
+        benchmark_startup()
+        benchmark_callbacks()
@@ -0,0 +1,315 @@
+import os
+import re
+import json
+import time
+import atexit
+import pickle
+import sqlite3
+import hashlib
+import tempfile
+import threading
+import functools
+import contextlib
+import collections
+
+import pandas as pd
+
+# Results of the callbacks of the dashboard, saved in a SQLite file so that all the gunicorn workers of the machine share them.
+# The file is limited to CACHE_SIZE bytes of results: the results used the least recently are deleted first (their total
+# size is kept up to date by the writes, in the table "cache_size")
+CACHE_PATH = os.environ.get("FEAMZY_CACHE", os.path.join(tempfile.gettempdir(), "feamzy_dashboard_cache.sqlite"))
+CACHE_SIZE = 256 * 1024 ** 2
+
+DATE_PATTERN = re.compile(r"^\d{4}-\d{2}-\d{2}")
+
+# Version of the data the results are computed from (see "set_data_version"), and connection of each thread to the file
+cache_state = {"version": None}
+connections = threading.local()
+
+# Rows selected by the filters of a section of the dashboard (see "shared_selection"): each worker also keeps the
+# SELECTIONS last ones it used in memory, the callbacks of a section asking for the same selection one after the other
+SELECTIONS = 16
+selections = collections.OrderedDict()
+selections_lock = threading.Lock()
+
+# Statistics of the cache (hits and misses of each callback, last use of the results read), kept in the memory of each process
+# and written to the file every FLUSH_INTERVAL seconds in one transaction, instead of a few writes in each read. Other
+# statistics are written in the same transaction by the functions registered with "register_flusher" (see "flush_stats")
+FLUSH_INTERVAL = 5
+stats = {"counters": {}, "used": {}, "lock": threading.Lock()}
+flushers = []
+flusher_state = {"pid": None, "lock": threading.Lock()}
+
+# Functions emptying the other tables of the file made for a version of the data, when the version changes (see
+# "register_version_cleaner")
+version_cleaners = []
+
+
+def cache_connection():
+    # a connection can't be used by another thread or, after a fork, by another process. Each thread connects again when
+    # CACHE_PATH is changed (see "benchmarks.import_dashboard")
+    if getattr(connections, "pid", None) != os.getpid() or getattr(connections, "path", None) != CACHE_PATH:
+        connection = sqlite3.connect(CACHE_PATH, timeout=5, isolation_level=None)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, version TEXT, value BLOB, size INTEGER, used REAL)")
+        connection.execute("CREATE INDEX IF NOT EXISTS results_used ON results (used)")
+        connection.execute("CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, hits INTEGER DEFAULT 0, misses INTEGER DEFAULT 0)")
+        connection.execute("CREATE TABLE IF NOT EXISTS cache_size (id INTEGER PRIMARY KEY CHECK (id = 0), total INTEGER)")
+        connection.execute("INSERT OR IGNORE INTO cache_size SELECT 0, COALESCE(SUM(size), 0) FROM results")
+        connections.connection = connection
+        connections.pid = os.getpid()
+        connections.path = CACHE_PATH
+    return connections.connection
+
+
+# Statements run in one write transaction, rolled back when one of them or the commit fails (e.g. the file stayed locked),
+# so that the connection of the thread can start the next transactions
+@contextlib.contextmanager
+def transaction(connection):
+    connection.execute("BEGIN IMMEDIATE")
+    try:
+        yield connection
+        connection.execute("COMMIT")
+    except BaseException:
+        if connection.in_transaction:
+            connection.execute("ROLLBACK")
+        raise
+
+
+# Deleting all the saved results and the selections kept in memory (e.g. to time the callbacks computed, see "benchmarks.py")
+def clear_cache():
+    with selections_lock:
+        selections.clear()
+    with transaction(cache_connection()) as connection:
+        connection.execute("DELETE FROM results")
+        connection.execute("UPDATE cache_size SET total = 0")
+
+
+# Adding a function taking the connection, called in the transaction changing the version of the data
+def register_version_cleaner(cleaner):
+    version_cleaners.append(cleaner)
+
+
+# Changing the version of the data: the results of the other versions are deleted, they can't be used anymore
+def set_data_version(version):
+    cache_state["version"] = version
+    with selections_lock:
+        selections.clear()
+    try:
+        with transaction(cache_connection()) as connection:
+            connection.execute("DELETE FROM results WHERE version != ?", (version,))
+            connection.execute("UPDATE cache_size SET total = (SELECT COALESCE(SUM(size), 0) FROM results)")
+            for cleaner in version_cleaners:
+                cleaner(connection)
+    except sqlite3.Error as error:
+        print("Cache not available: {}".format(error))
+
+
+# Inputs of a callback written the same way when they give the same result: dates reduced to their day
+# (the callbacks filter by day) and lists of selected values sorted (the callbacks only test if a value is in them)
+def normalise_input(value):
+    if isinstance(value, str) and DATE_PATTERN.match(value):
+        return value[:10]
+    if isinstance(value, (list, tuple)):
+        return sorted((normalise_input(item) for item in value), key=repr)
+    return value
+
+
+def cache_key(name, args, extra, version):
+    inputs = json.dumps([name, version, [normalise_input(arg) for arg in args], extra], default=str)
+    return hashlib.sha256(inputs.encode("utf-8")).hexdigest()
+
+
+# Adding a function returning statements to write with the statistics of the cache: (statement, list of parameters), each
+# statement being run once per parameters. The function takes the statistics it returns out of the memory of the process
+def register_flusher(flusher):
+    flushers.append(flusher)
+
+
+# Writing the statistics of this process in one transaction (nothing when there are none). They are lost when the file
+# can't be used
+def flush_stats():
+    statements = [(statement, parameters) for flusher in flushers for statement, parameters in flusher() if parameters]
+    if statements == []:
+        return
+    try:
+        with transaction(cache_connection()) as connection:
+            for statement, parameters in statements:
+                connection.executemany(statement, parameters)
+    except sqlite3.Error as error:
+        print("Statistics not saved: {}".format(error))
+
+
+def flush_periodically():
+    while True:
+        time.sleep(FLUSH_INTERVAL)
+        flush_stats()
+
+
+# Starting the thread writing the statistics of this process, once per process (the thread isn't copied by a fork)
+def start_flusher():
+    if flusher_state["pid"] == os.getpid():
+        return
+    with flusher_state["lock"]:
+        if flusher_state["pid"] == os.getpid():
+            return
+        flusher_state["pid"] = os.getpid()
+    threading.Thread(target=flush_periodically, name="feamzy-stats", daemon=True).start()
+
+
+# A forked process starts without the statistics of its parent (the parent writes them), and with new locks (a thread of
+# the parent may have held them during the fork)
+def reset_stats():
+    stats.update({"counters": {}, "used": {}, "lock": threading.Lock()})
+    flusher_state.update({"pid": None, "lock": threading.Lock()})
+
+
+def count(name, counter):
+    with stats["lock"]:
+        stats["counters"].setdefault(name, {"hits": 0, "misses": 0})[counter] += 1
+    start_flusher()
+
+
+# Statements adding the hits and misses counted since the last write, and moving the last use of the results read
+def cache_stats():
+    with stats["lock"]:
+        counters, used = stats["counters"], stats["used"]
+        stats["counters"], stats["used"] = {}, {}
+    return [("INSERT OR IGNORE INTO counters (name) VALUES (?)", [(name,) for name in counters]),
+            ("UPDATE counters SET hits = hits + ?, misses = misses + ? WHERE name = ?",
+             [(counts["hits"], counts["misses"], name) for name, counts in counters.items()]),
+            ("UPDATE results SET used = MAX(used, ?) WHERE key = ?", [(last_use, key) for key, last_use in used.items()])]
+
+
+register_flusher(cache_stats)
+os.register_at_fork(after_in_child=reset_stats)
+atexit.register(flush_stats)
+
+
+# Saving a result computed from the data of "version" (the one of its key), and deleting the results used the least
+# recently if needed, in the same transaction
+def save_result(connection, key, result, version):
+    value = pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL)
+    with transaction(connection):
+        row = connection.execute("SELECT size FROM results WHERE key = ?", (key,)).fetchone()
+        connection.execute("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?)", (key, version, value, len(value), time.time()))
+        connection.execute("UPDATE cache_size SET total = total + ?", (len(value) - (row[0] if row is not None else 0),))
+        evict(connection)
+
+
+# Deleting the results used the least recently until the results take less than CACHE_SIZE bytes
+def evict(connection):
+    total = connection.execute("SELECT total FROM cache_size").fetchone()[0]
+    if total <= CACHE_SIZE:
+        return
+    deleted = 0
+    for key, size in connection.execute("SELECT key, size FROM results ORDER BY used").fetchall():
+        connection.execute("DELETE FROM results WHERE key = ?", (key,))
+        deleted += size
+        if total - deleted <= CACHE_SIZE:
+            break
+    connection.execute("UPDATE cache_size SET total = total - ?", (deleted,))
+
+
+# Reading a saved result: (True, result) when it is in the file, (False, None) otherwise. Its last use is only kept in
+# memory until the next write of the statistics
+def read_result(connection, key, name):
+    row = connection.execute("SELECT value FROM results WHERE key = ?", (key,)).fetchone()
+    if row is None:
+        return False, None
+    with stats["lock"]:
+        stats["used"][key] = time.time()
+    count(name, "hits")
+    return True, pickle.loads(row[0])
+
+
+# Decorator saving the results of a callback, to put between "@app.callback" and the function.
+# With "today", the result also depends on the day it is computed (e.g. the events already passed).
+# When the cache file can't be used, the callback is just computed.
+# "function.cached(*args)" reads the result if it is saved, without computing it (see "read_result").
+# The version of the data is read once, before the function reads the data: if the data changes meanwhile, the result is
+# saved with the previous version (the data being replaced before its version), and deleted with its results
+def memoize(today=False):
+    def decorator(function):
+        def result_key(args, version):
+            extra = str(pd.Timestamp("today").date()) if today else None
+            return cache_key(function.__name__, args, extra, version)
+
+        @functools.wraps(function)
+        def memoized(*args):
+            version = cache_state["version"]
+            key = result_key(args, version)
+
+            try:
+                connection = cache_connection()
+                found, result = read_result(connection, key, function.__name__)
+                if found:
+                    return result
+            except sqlite3.Error:
+                return function(*args)
+
+            result = function(*args)
+
+            try:
+                save_result(connection, key, result, version)
+            except sqlite3.Error:
+                pass
+            count(function.__name__, "misses")
+
+            return result
+
+        def cached(*args):
+            try:
+                return read_result(cache_connection(), result_key(args, cache_state["version"]), function.__name__)
+            except sqlite3.Error:
+                return False, None
+
+        memoized.cached = cached
+        return memoized
+    return decorator
+
+
+# Key of the rows selected by some filters of a section of the dashboard, for a version of the data (the current one by default)
+def selection_key(section, filters, version=None):
+    return cache_key("selection " + section, filters, None, cache_state["version"] if version is None else version)
+
+
+# Rows selected by the filters of a section in the data of "version", computed once by "compute" for all the callbacks of
+# the section and all the workers: they are read from the memory of the worker, then from the file, and only computed again
+# when they are in neither (e.g. deleted to make room), the same filters giving the same rows
+def shared_selection(section, filters, version, compute):
+    key = selection_key(section, filters, version)
+    with selections_lock:
+        if key in selections:
+            selections.move_to_end(key)
+            return selections[key]
+
+    name = "selection " + section
+    rows = None
+    try:
+        connection = cache_connection()
+        found, rows = read_result(connection, key, name)
+        if not found:
+            rows = compute()
+            count(name, "misses")
+            save_result(connection, key, rows, version)
+    except sqlite3.Error:
+        if rows is None:
+            rows = compute()
+
+    with selections_lock:
+        selections[key] = rows
+        while len(selections) > SELECTIONS:
+            selections.popitem(last=False)
+    return rows
+
+
+# Number of results found in the cache (hits) and computed (misses) for each callback, for all the workers (the counts of
+# the other workers being written every FLUSH_INTERVAL seconds)
+def cache_counters():
+    flush_stats()
+    try:
+        rows = cache_connection().execute("SELECT name, hits, misses FROM counters ORDER BY name").fetchall()
+    except sqlite3.Error:
+        return {}
+    return {name: {"hits": hits, "misses": misses} for name, hits, misses in rows}
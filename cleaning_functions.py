@@ -2,67 +2,81 @@ import pandas as pd
 import numpy as np
 import os
 import glob
+import re
+import json
+import hashlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
-def grouping_notifications(string):
-    if string in ["INFORMATION_EVENT","INVITATION_EVENT", "PERIOD_TO_VALIDATE", "INFORMATION"]:
-        return "EVENT"
-    elif string in ["SETUP_CALENDAR","SETUP_CLASS","SETUP_SCHOOL"]:
-        return "SETUP"
-    elif string in ["HOMEWORK_REQUEST", "HOMEWORK_RESPONSE"]:
-        return "HOMEWORK"
-    elif string in ["INVITATION_CLASS","MODAL_NOTIF_END_COACH","MODAL_NOTIF_INIT_COACH"]:
-        return "CLASSES"
-    else:
-        return "UNKNOWN"
+from urllib.request import urlopen
 
+from loading_functions import SCHEMAS, DEPARTEMENTS_URL, STATIC_FOLDER, DEPARTEMENTS_GEOJSON, apply_schema, read_csv_database_in_chunks, save_columnar, save_columnar_in_chunks
 
-def clean_text(df):
-    # Transform to lowercase
-    df = df.str.lower()
+# Folders of the raw and clean databases, and manifest of the raw files already cleaned
+DATA_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+CLEAN_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data_clean")
+MANIFEST = os.path.join(CLEAN_FOLDER, "manifest.json")
 
-    # Formating some words with weird characters that were translated with the bad accent
-    df = df.str.replace("ãª", "ê").str.replace("ã", "à")
+# Values of the raw databases meaning that the information is missing
+NULL_VALUES = ["Null", "null", ""]
 
-    # Correcting some words
-    df = df.str.replace("lévénement", "l'événement", regex=False).str.replace("l''agenda", "l'agenda", regex=False)
+# Raw files bigger than this size (in bytes) are cleaned chunk by chunk, with CHUNK_SIZE rows in each chunk
+CHUNKED_CLEANING_SIZE = 256 * 1024 ** 2
+CHUNK_SIZE = 100000
 
-    # Replace inconvenient whitespaces
-    df = df.str.replace('  ', ' ', regex=False)
+# Simplification of the départements boundaries: points closer than GEOJSON_TOLERANCE (in degrees) to the simplified
+# line are removed, and the coordinates are rounded to GEOJSON_PRECISION decimals
+GEOJSON_TOLERANCE = 0.005
+GEOJSON_PRECISION = 4
 
-    # Replace different placeholders
-    df = df.str.replace('{0}', '', regex=False).str.replace('{1}', '', regex=False).str.replace('{2}', '',regex=False).str.replace('{3}', '', regex=False)
+# Group of each type of notification, the other types are in the group "UNKNOWN"
+NOTIFICATION_GROUPS = {"INFORMATION_EVENT": "EVENT", "INVITATION_EVENT": "EVENT", "PERIOD_TO_VALIDATE": "EVENT", "INFORMATION": "EVENT",
+                       "SETUP_CALENDAR": "SETUP", "SETUP_CLASS": "SETUP", "SETUP_SCHOOL": "SETUP",
+                       "HOMEWORK_REQUEST": "HOMEWORK", "HOMEWORK_RESPONSE": "HOMEWORK",
+                       "INVITATION_CLASS": "CLASSES", "MODAL_NOTIF_END_COACH": "CLASSES", "MODAL_NOTIF_INIT_COACH": "CLASSES"}
+NOTIFICATION_GROUP_TYPE = pd.CategoricalDtype(["CLASSES", "EVENT", "HOMEWORK", "SETUP", "UNKNOWN"])
 
-    # Removing ponctuation
-    # df = df.str.replace(".","", regex=False).str.replace(",","", regex=False).str.replace(":","", regex=False).str.replace("-","", regex=False).str.replace("'","",regex=False)
-    df = df.str.replace('[^\w\s]', '', regex=True)
 
-    df = df.str.strip("'.")
+def grouping_notifications(notification_types):
+    # Looking up the group of each different type only once
+    codes, types = pd.factorize(notification_types)
+    groups = [NOTIFICATION_GROUPS.get(notification_type, "UNKNOWN") for notification_type in types] + ["UNKNOWN"]
+    group_codes = NOTIFICATION_GROUP_TYPE.categories.get_indexer(groups)
 
-    return df
+    # The code -1 (missing type) takes the "UNKNOWN" added at the end
+    return pd.Series(pd.Categorical.from_codes(group_codes[codes], dtype=NOTIFICATION_GROUP_TYPE), index=notification_types.index)
 
 
-def clean_database(df):
-    # Looping through columns to transform values from "Null" to NaN
-    df = df.where(df != "Null")
-    df = df.where(df != "null")
-    df = df.where(df != "")
+# Substitutions made in the texts, all with one regular expression:
+# - formating some words with weird characters that were translated with the bad accent
+# - replacing inconvenient whitespaces
+# - replacing different placeholders
+# Then the ponctuation is removed (which also corrects "lévénement" and "l''agenda").
+TEXT_REPLACEMENTS = {"ãª": "ê", "ã": "à", "  ": " ", "{0}": "", "{1}": "", "{2}": "", "{3}": ""}
+TEXT_PATTERN = re.compile("|".join(re.escape(text) for text in TEXT_REPLACEMENTS))
+PONCTUATION_PATTERN = re.compile(r"[^\w\s]")
 
-    # Droping rows that contains only NaN (null values)
-    df.dropna(axis=0, how='all', inplace=True)
 
-    # Droping columns that contains only NaN (null values)
-    df.dropna(axis=1, how='all', inplace=True)
+def normalise_text(text):
+    text = TEXT_PATTERN.sub(lambda match: TEXT_REPLACEMENTS[match.group(0)], text.lower())
+    return PONCTUATION_PATTERN.sub("", text)
+
+
+def clean_text(df):
+    # Normalising each different text only once (the labels and messages are often repeated)
+    codes, texts = pd.factorize(df)
+    texts = [normalise_text(text) if isinstance(text, str) else np.nan for text in texts]
+
+    # The code -1 (missing text) takes the NaN added at the end
+    return pd.Series(np.array(texts + [np.nan], dtype=object)[codes], index=df.index, name=df.name)
 
-    # Droping columns that contains less than 99% of NaN values
-    list_columns = []
 
-    for column in df.columns:
-        if df[column].isna().sum() / df.shape[0] >= 0.999:
-            list_columns.append(column)
+# Columns that contain only NaN values or at least 99.9% of NaN values, from the number of NaN values of each column
+def columns_to_drop(null_counts, number_of_rows):
+    return list(null_counts.index[null_counts >= 0.999 * number_of_rows])
 
-    if len(list_columns) > 0:
-        df.drop(columns=list_columns, inplace=True)
 
+# Cleaning the texts and grouping the notifications of a database (or of a chunk of a database)
+def clean_columns(df):
     if ('label' in df.columns):
         df['label'] = clean_text(df['label'])
 
@@ -70,8 +84,10 @@ def clean_database(df):
         df['message'] = clean_text(df['message'])
 
     if ('notificationType' in df.columns):
-        df["Group"] = df["notificationType"].apply(grouping_notifications)
-        df["sphere"].loc[df.sphere.isna()] = df["Group"].loc[df.sphere.isna()]
+        df["Group"] = grouping_notifications(df["notificationType"])
+
+        if ('sphere' in df.columns):
+            df["sphere"] = df["sphere"].fillna(df["Group"].astype(object))
 
     if ('Unnamed: 0' in df.columns):
         df.drop(columns="Unnamed: 0", inplace=True)
@@ -79,31 +95,237 @@ def clean_database(df):
     return df
 
 
-def clean_all_databases():
-    # Changing the working directory if needed
-    if "data" not in os.getcwd().split("/"):
-        os.chdir("data")
+# Reading a raw database as text (as the chunks of "clean_database_in_chunks"), so that the values are written back
+# unchanged in the clean CSV, whatever the mode of cleaning
+def read_raw_database(path, **options):
+    return pd.read_csv(path, dtype=object, na_values=NULL_VALUES, **options)
 
-    # Getting all files from the "data" folder
-    files = glob.glob('*.csv')
 
-    for file in files:
-        # Getting the name of the file
-        file_name = file.strip("export").split("-")[0]
+def clean_database(df):
+    # Transforming values from "Null" to NaN
+    df = df.mask(df.isin(NULL_VALUES))
+
+    # Droping rows that contains only NaN (null values)
+    df.dropna(axis=0, how='all', inplace=True)
+
+    # Droping columns that contains only NaN or at least 99.9% of NaN values
+    df.drop(columns=columns_to_drop(df.isna().sum(), df.shape[0]), inplace=True)
+
+    return clean_columns(df)
+
+
+# Cleaning a raw database too big to be held in memory, chunk by chunk, and writing it to a CSV file.
+# A first reading counts the NaN values of each column to choose the columns to drop, then the second reading
+# cleans the chunks and appends them to the CSV file. The values are read as text, so that every chunk has the same types.
+def clean_database_in_chunks(path, clean_path, chunksize=CHUNK_SIZE):
+    number_of_rows = 0
+    null_counts = 0
+
+    for chunk in read_raw_database(path, chunksize=chunksize):
+        chunk.dropna(axis=0, how='all', inplace=True)
+        number_of_rows += chunk.shape[0]
+        null_counts = null_counts + chunk.isna().sum()
+
+    dropped_columns = columns_to_drop(null_counts, number_of_rows) if number_of_rows > 0 else []
+
+    first_chunk = True
+    for chunk in read_raw_database(path, chunksize=chunksize):
+        chunk.dropna(axis=0, how='all', inplace=True)
+        chunk.drop(columns=dropped_columns, inplace=True)
+        chunk = clean_columns(chunk)
+
+        chunk.to_csv(clean_path, mode="w" if first_chunk else "a", header=first_chunk)
+        first_chunk = False
+
+    return None
+
+
+# Writing a file through a temporary file in the same folder, so that a file is never read half written
+def write_atomically(path, write):
+    temporary_path = path + ".tmp"
+    write(temporary_path)
+    os.replace(temporary_path, path)
+
+
+# Hash of the content of a file, to detect the raw databases that changed since the last cleaning
+def file_hash(path):
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(1024 * 1024), b""):
+            sha256.update(block)
+    return sha256.hexdigest()
+
+
+def save_json(data, path, **options):
+    with open(path, "w") as file:
+        json.dump(data, file, **options)
+
+
+# Checking that the clean files of a database were all exported
+def clean_files_exist(file_name):
+    if not os.path.exists(os.path.join(CLEAN_FOLDER, file_name + ".csv")):
+        return False
+    return file_name not in SCHEMAS or os.path.exists(os.path.join(CLEAN_FOLDER, file_name + ".feather"))
+
+
+# Cleaning one raw database and exporting it to the "data_clean" folder (or another clean folder).
+# The raw files bigger than CHUNKED_CLEANING_SIZE are cleaned chunk by chunk, and their columnar file written chunk by chunk.
+def clean_file(path, file_name, clean_folder=CLEAN_FOLDER):
+    clean_path = os.path.join(clean_folder, file_name + ".csv")
+    columnar_path = os.path.join(clean_folder, file_name + ".feather")
+
+    if os.path.getsize(path) > CHUNKED_CLEANING_SIZE:
+        write_atomically(clean_path, lambda temporary_path: clean_database_in_chunks(path, temporary_path))
 
+        # Reading back only the columns used by the dashboard, one chunk at a time
+        if file_name in SCHEMAS:
+            write_atomically(columnar_path, lambda temporary_path: save_columnar_in_chunks(
+                read_csv_database_in_chunks(clean_path, file_name, CHUNK_SIZE), temporary_path))
+    else:
         # Opening the database
-        df = pd.read_csv(file)
+        df = read_raw_database(path)
 
         # Cleaning the database
         df = clean_database(df)
 
         # Exporting cleaned database to new folder
-        os.chdir("../data_clean/")
-        df.to_csv(file_name + ".csv")
+        write_atomically(clean_path, df.to_csv)
+
+        # Exporting the columns used by the dashboard, already typed, in the columnar format
+        if file_name in SCHEMAS:
+            df = apply_schema(df, file_name)
+            write_atomically(columnar_path, lambda temporary_path: save_columnar(df, temporary_path))
+
+    return file_name
+
+
+def clean_all_databases(workers=None):
+    # Getting all files from the "data" folder, only the last export of each database is cleaned
+    files = {}
+    for path in sorted(glob.glob(os.path.join(DATA_FOLDER, "*.csv"))):
+        # Getting the name of the file
+        file_name = os.path.basename(path).strip("export").split("-")[0]
+        files[file_name] = path
+
+    # Skipping the databases whose raw file didn't change since the last cleaning (see the manifest)
+    manifest = {}
+    if os.path.exists(MANIFEST):
+        with open(MANIFEST) as file:
+            manifest = json.load(file)
+
+    changed = {}
+    for file_name, path in files.items():
+        stat = os.stat(path)
+        entry = {"file": os.path.basename(path), "size": stat.st_size, "mtime": stat.st_mtime}
+        previous = manifest.get(file_name, {})
+
+        # The content is hashed only when the size or the modification time of the file changed
+        if clean_files_exist(file_name) and all(previous.get(key) == value for key, value in entry.items()):
+            continue
+
+        entry["sha256"] = file_hash(path)
+        if clean_files_exist(file_name) and previous.get("sha256") == entry["sha256"]:
+            manifest[file_name] = entry
+            continue
+
+        changed[file_name] = entry
+
+    # Cleaning the changed databases in parallel
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(clean_file, files[file_name], file_name) for file_name in changed]
+        for future in as_completed(futures):
+            file_name = future.result()
+            manifest[file_name] = changed[file_name]
+            print("{}: cleaned".format(file_name))
+
+            # Saving the manifest after each database, so that an interrupted cleaning doesn't start again from zero
+            write_atomically(MANIFEST, lambda temporary_path: save_json(manifest, temporary_path, indent=4))
+
+    write_atomically(MANIFEST, lambda temporary_path: save_json(manifest, temporary_path, indent=4))
+
+    print("{} databases cleaned, {} unchanged".format(len(changed), len(files) - len(changed)))
+
+    return None
+
 
-        # Getting back to the right folder with the raw databases
-        os.chdir("../data")
+# Simplifying a line with the Douglas-Peucker algorithm: only the points farther than the tolerance from the simplified line are kept
+def simplify_line(points, tolerance):
+    points = np.asarray(points, dtype=float)
+    keep = np.zeros(len(points), dtype=bool)
+    keep[0] = keep[-1] = True
+
+    segments = [(0, len(points) - 1)]
+    while segments:
+        first, last = segments.pop()
+        if last - first < 2:
+            continue
+
+        direction = points[last] - points[first]
+        vectors = points[first + 1:last] - points[first]
+        length = np.hypot(direction[0], direction[1])
+        if length == 0:
+            distances = np.hypot(vectors[:, 0], vectors[:, 1])
+        else:
+            distances = np.abs(direction[0] * vectors[:, 1] - direction[1] * vectors[:, 0]) / length
+
+        farthest = np.argmax(distances)
+        if distances[farthest] > tolerance:
+            middle = first + 1 + farthest
+            keep[middle] = True
+            segments += [(first, middle), (middle, last)]
+
+    return points[keep]
+
+
+def simplify_polygon(polygon, tolerance, precision):
+    rings = []
+    for ring in polygon:
+        points = np.round(simplify_line(ring, tolerance), precision)
+
+        # Removing the points that became the same as the previous one after rounding
+        points = points[np.r_[True, np.any(np.diff(points, axis=0) != 0, axis=1)]]
+
+        # A ring needs at least 4 points (the last one is the first one), otherwise the ring is too small to be seen
+        if len(points) >= 4:
+            rings.append(points.tolist())
+        elif len(rings) == 0:
+            return None
+
+    return rings
+
+
+# Making the simplified GeoJSON of the départements used by the map of the dashboard
+def simplify_geojson(source=DEPARTEMENTS_URL, destination=os.path.join(STATIC_FOLDER, DEPARTEMENTS_GEOJSON),
+                     tolerance=GEOJSON_TOLERANCE, precision=GEOJSON_PRECISION):
+    if source.startswith("http"):
+        with urlopen(source) as response:
+            geojson = json.load(response)
+    else:
+        with open(source) as file:
+            geojson = json.load(file)
+
+    for feature in geojson["features"]:
+        geometry = feature["geometry"]
+        polygons = [geometry["coordinates"]] if geometry["type"] == "Polygon" else geometry["coordinates"]
+
+        polygons = [simplify_polygon(polygon, tolerance, precision) for polygon in polygons]
+        polygons = [polygon for polygon in polygons if polygon is not None]
+
+        if len(polygons) == 1:
+            feature["geometry"] = {"type": "Polygon", "coordinates": polygons[0]}
+        elif len(polygons) > 1:
+            feature["geometry"] = {"type": "MultiPolygon", "coordinates": polygons}
+
+    write_atomically(destination, lambda temporary_path: save_json(geojson, temporary_path, separators=(",", ":")))
 
     return None
 
-clean_all_databases()
\ No newline at end of file
+
+if __name__ == "__main__":
+    clean_all_databases()
+
+    if not os.path.exists(os.path.join(STATIC_FOLDER, DEPARTEMENTS_GEOJSON)):
+        try:
+            simplify_geojson()
+        except OSError as error:
+            print("The départements GeoJSON couldn't be simplified: {}".format(error))
@@ -0,0 +1,86 @@
+import flask
+
+# Exports of the tables of the dashboard filtered as in the dashboard (see "feamzy_dashboard.export_dataset"), streamed
+# EXPORT_CHUNK_ROWS rows at a time: the memory used doesn't depend on the number of rows exported, and the rows don't go
+# through the callbacks and the browser (the CSV export of the DataTables only has the rows of the page shown)
+EXPORT_CHUNK_ROWS = 10000
+
+EXPORT_FORMATS = {"csv": "text/csv", "parquet": "application/vnd.apache.parquet"}
+
+
+# Parquet needs pyarrow, which may not be installed
+def parquet_available():
+    try:
+        import pyarrow.parquet
+    except ImportError:
+        return False
+    return True
+
+
+# Chunks of the rows of a table (all of them, or the positions "rows")
+def table_chunks(df, rows=None):
+    number_of_rows = df.shape[0] if rows is None else len(rows)
+    for start in range(0, number_of_rows, EXPORT_CHUNK_ROWS):
+        if rows is None:
+            yield df.iloc[start:start + EXPORT_CHUNK_ROWS]
+        else:
+            yield df.iloc[rows[start:start + EXPORT_CHUNK_ROWS]]
+
+
+def csv_stream(df, rows=None):
+    yield df.head(0).to_csv(index=False)
+    for chunk in table_chunks(df, rows):
+        yield chunk.to_csv(index=False, header=False)
+
+
+# File receiving the Parquet file as it is written, whose bytes are sent after each chunk
+class ParquetSink:
+    def __init__(self):
+        self.written = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data):
+        self.written.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def take(self):
+        data, self.written = b"".join(self.written), []
+        return data
+
+
+# Parquet file with one row group per chunk. The text columns are written as strings, even when a chunk has no value
+def parquet_stream(df, rows=None):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.Schema.from_pandas(df.head(0), preserve_index=False)
+    for i, field in enumerate(schema):
+        if pa.types.is_null(field.type):
+            schema = schema.set(i, field.with_type(pa.string()))
+
+    sink = ParquetSink()
+    writer = pq.ParquetWriter(sink, schema)
+    for chunk in table_chunks(df, rows):
+        writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+        yield sink.take()
+    writer.close()
+    yield sink.take()
+
+
+# Response streaming the rows of a table (all of them, or the positions "rows") as a file to download
+def export_response(df, rows, file_name, export_format):
+    stream = parquet_stream if export_format == "parquet" else csv_stream
+    response = flask.Response(flask.stream_with_context(stream(df, rows)), mimetype=EXPORT_FORMATS[export_format])
+    response.headers["Content-Disposition"] = 'attachment; filename="{}.{}"'.format(file_name, export_format)
+    return response
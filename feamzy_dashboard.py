@@ -2,48 +2,36 @@ import dash
 import dash_core_components as dcc
 import dash_html_components as html
 import dash_bootstrap_components as dbc
-from dash.dependencies import Input, Output
+from dash.dependencies import Input, Output, State
 import dash_table
 import dash_auth
 
 import plotly
-import plotly.express as px
 import plotly.graph_objects as go
-from plotly.subplots import make_subplots
+# plotly.express and make_subplots are imported by the functions using them: they are slow to import
+# and not needed to start the app
 
 import pandas as pd
+import numpy as np
 
-from urllib.request import urlopen
-import json
-from datetime import datetime as dt
+from datetime import datetime as dt, date
+import os
 import random
+import time
+import uuid
+import threading
 from collections import Counter
+from urllib.parse import urlencode
 
-#from cleaning_functions import *
-
-# Function to detect the most closest dates chosen from the filter.
-# Sometimes there's no activity in the date chosen by the user, therefore this function will be able to bypass that
-# by returning the closest precise date within the period given by the user
-def dataset_with_correct_dates(df, column, start_date, end_date):
-    start_date = pd.to_datetime(start_date).date()
-    end_date = pd.to_datetime(end_date).date()
-
-    df.dropna(axis=0, inplace=True)
-    df[column] = pd.to_datetime(df[column]).dt.date
-
-    df = df.sort_values(column, ignore_index=True)
-    dff = df.set_index(column)
-    dff = dff[~dff.index.duplicated(keep='first')]
+import flask
 
-    start_index = dff.index.get_loc(start_date, method='bfill')
-    start_date = dff.reset_index().iloc[start_index][column]
-
-    end_index = dff.index.get_loc(end_date, method='ffill')
-    end_date = dff.reset_index().iloc[end_index][column]
-
-    df = df.loc[(df[column] >= start_date) & (df[column] <= end_date)]
-
-    return df
+#from cleaning_functions import *
+from loading_functions import load_database, dataset_with_correct_dates, departements_source, data_version, watch_data_version
+from cache_functions import memoize, set_data_version, normalise_input, selection_key, shared_selection
+from metrics_functions import instrument_app, end_phase
+from job_functions import JOB_WORKERS, register_job, reset_job_pool, submit_job, job_status
+from export_functions import EXPORT_FORMATS, parquet_available, export_response
+from aggregation_functions import build_schools, index_schools_by_region, schools_in_regions, count_sectors_by_region, build_word_counts, top_words, build_daily_counts, counts_between, counts_with_values, build_rollups, rollup_between, downsample_line, select_rows, build_author_counts, count_authors, rank_authors, index_activities, users_without_activity, build_activity_table, filter_table, table_page
 
 # Cleaning the databases present in the folder "data"
 # run_once = 0
@@ -55,14 +43,6 @@ def dataset_with_correct_dates(df, column, start_date, end_date):
 # Sleeping to have sometime to charge the clean databases
 # sleep(2)
 
-# Charging all databases
-classes = pd.read_csv("data_clean/ClassStats.csv")
-users = pd.read_csv("data_clean/User.csv")
-homeworks = pd.read_csv("data_clean/HomeworkRequest.csv")
-documents = pd.read_csv("data_clean/Document.csv")
-notifications = pd.read_csv("data_clean/Notification.csv")
-events = pd.read_csv("data_clean/Event.csv")
-
 # Saving the words that should not appear in the wordclouds
 stopwords = []
 with open('stopwords.txt', 'r') as file:
@@ -73,359 +53,689 @@ with open('stopwords.txt', 'r') as file:
             # displaying the words
             stopwords.append(word)
 
+days_of_the_week = ["MONDAY", "TUESDAY", "WEDNESDAY", "THURSDAY", "FRIDAY", "SATURDAY", "SUNDAY"]
+
+# Layer of the départements boundaries on the map, referencing the GeoJSON only by its URL
+departements_layer = {
+    'sourcetype': 'geojson',
+    'source': departements_source(),
+    'type': 'line',
+    'color': '#7039bd',
+    'opacity':0.1,
+    'below': "True",
+}
+
+# Checking every RELOAD_INTERVAL seconds if the clean databases have changed, to load them without restarting the app
+# (0 to never check)
+RELOAD_INTERVAL = int(os.environ.get("FEAMZY_RELOAD_INTERVAL", 60))
+
+# Starting the app without waiting for the databases: they are loaded in the background, and the first requests wait for them
+LAZY_START = os.environ.get("FEAMZY_LAZY_START") == "1"
+
+
+# Loading a snapshot of the data of the dashboard: the clean databases of a version of the folder "data_clean" and
+# everything computed from them once (indexes, counts, options of the filters, panels not depending on the filters).
+# The callbacks and the layout read the current snapshot with "get_snapshot", which is replaced all at once by the next one
+def load_snapshot(folder="data_clean"):
+    start = time.perf_counter()
+    data = {"version": data_version(folder)}
+
+    # Charging all databases (only the columns declared in "loading_functions.SCHEMAS", indexed by date)
+    for key, name in [("classes", "ClassStats"), ("users", "User"), ("homeworks", "HomeworkRequest"), ("documents", "Document"),
+                      ("notifications", "Notification"), ("events", "Event")]:
+        data[key] = load_database(name, folder)
+
+    # Gathering the classes by school (for the map and the sectors of the schools), the schools being indexed by region
+    data["schools"] = build_schools(data["classes"])
+    data["schools_by_region"] = index_schools_by_region(data["schools"])
+    data["sectors_by_region"] = count_sectors_by_region(data["schools"])
+
+    # Counting the new users per day, week and month, for the evolution of the users
+    data["users_rollups"] = build_rollups(data["users"])
+
+    # Counting the notifications per day, group and type, for the notifications treemap
+    data["notifications_counts"] = build_daily_counts(data["notifications"], ["Group", "notificationType"])
+
+    # Counting the distinct events starting each day per type and day of the week, for the events key metrics and charts
+    data["events_counts"] = build_daily_counts(data["events"], ["eventType"], distinct=True, weekday=True)
+
+    # Counting the words of the labels of the events per day and per type of event, for the events wordcloud
+    data["events_words"] = build_word_counts(data["events"], "label", "eventType", stopwords)
+
+    # Counting the homeworks and the events of each author per day and per type, for the leaderboards of the authors
+    data["homeworks_authors"] = build_author_counts(data["homeworks"], "userId", "type")
+    data["events_authors"] = build_author_counts(data["events"], "author", "eventType")
+
+    # Indexing the activities of the users (homeworks, events and documents created), for the report of the inactive users
+    data["users_activities"] = index_activities(data["users"], [(data["homeworks"], "userId"), (data["events"], "author"),
+                                                                (data["documents"], "userId")])
+    data["users_activity_table"] = build_activity_table(data["users"], data["users_activities"])
+
+    # Creating variables necessary for filters
+    data["regions"] = sorted(list(data["classes"].libelle_region.unique()))
+    data["region_options"] = [{'label': str(region),'value': region} for region in data["regions"]]
+
+    data["events_types"] = sorted(list(data["events"].eventType.unique()))
+    data["events_options"] = [{'label': str(event_type),'value': event_type} for event_type in data["events_types"]]
+
+    data["notifications_groups"] = sorted(list(data["notifications"].Group.unique()))
+    data["notifications_options"] = [{'label': str(notif),'value': notif} for notif in data["notifications_groups"]]
+
+    # Determining the recency of the databases
+    data["last_update"] = str(max(data[key].creationDate.max() for key in ["users", "classes", "homeworks", "documents", "notifications", "events"]))
+
+    data["panels"] = precompute_panels(data)
+
+    print("Data version {} loaded in {:.2f}s".format(data["version"], time.perf_counter() - start))
+
+    return data
+
 
-# Creating variables necessary for filters
-region_options = []
-for region in sorted(list(classes.libelle_region.unique())):
-    region_options.append({'label': str(region),'value': region})
+# Current snapshot. A callback reads it once, so that it finishes with the same snapshot if the next one is swapped in meanwhile.
+# Until the first snapshot is loaded (in the background when the app is started with FEAMZY_LAZY_START=1), it waits for it
+snapshot = {"current": None}
+snapshot_ready = threading.Event()
 
-events_types = []
-for event_type in sorted(list(events.eventType.fillna("NOT ASSIGNED").unique())):
-    events_types.append({'label': str(event_type),'value': event_type})
 
-notifications_group = []
-for notif in sorted(list(notifications.Group.fillna("NOT ASSIGNED").unique())):
-    notifications_group.append({'label': str(notif),'value': notif})
+def get_snapshot():
+    snapshot_ready.wait()
+    return snapshot["current"]
+
+
+# Replacing the current snapshot by a new one, then changing the version of the cached results (in this order, so that
+# no result computed from the previous snapshot is saved for the new version)
+def swap_snapshot(data):
+    snapshot["current"] = data
+    set_data_version(data["version"])
+    reset_job_pool()
+    snapshot_ready.set()
+
+
+# Loading the new version of the clean databases while the current snapshot is still used, then computing the default filters
+def reload_snapshot():
+    swap_snapshot(load_snapshot())
+    warm_up_callbacks()
 
-# Determining the recency of the databases
-last_update = max(users.creationDate.max(), classes.creationDate.max(), homeworks.creationDate.max(),
-                  documents.creationDate.max(), notifications.creationDate.max(), events.creationDate.max())
 
 # Creating the application
-app = dash.Dash(__name__, external_stylesheets=[dbc.themes.CERULEAN])
+# (when starting without the databases, Dash can't check the callbacks against the layout, which is created from them)
+app = dash.Dash(__name__, external_stylesheets=[dbc.themes.CERULEAN], suppress_callback_exceptions=LAZY_START)
 server = app.server
 
 # Setting up the authentification
 auth = dash_auth.BasicAuth(app, [['Username','Password'],['feamzy_adm', 'ironhack']])
 
-# Creating cards that will compose grids in the layout of the application
-card_users_key_metrics = dbc.Card([
-     dbc.CardBody(
-         [
-             html.H3('Key Metrics',style={'marginLeft': 4,'color': '#f8e71c', 'textShadow': '2px 2px black'}),
-             html.Div(children=[users.id.count()], style={'fontSize': 50,'color': 'white','textAlign': 'center'}), #'marginTop': 25,
-             html.H4(['Total Users'], style={'color': 'white','textAlign': 'center'}),
-             html.Br(),
-             html.Div(children=[users.groupChildSize.sum()], style={'fontSize': 50,'color': 'white','textAlign': 'center'}), #'marginTop': 25,
-             html.H4(['Children Profiles Created'], style={'color': 'white','textAlign': 'center'}),
-             html.Br(),
-             html.Br(),
-             dcc.Graph(id="children_number"),
-             html.Br(),
-             html.P(children=["PS.: the 'y' axis is in logarithm scale"], style={'fontSize': 10,'color': 'white','textAlign': 'right','font-style': 'italic',})
-         ]
-     )
- ],color='#4e99f6',inverse=True,style={"border": "none"})
-
-card_users_evolution = dbc.Card([
-     dbc.CardBody(
-         [
-             dcc.Graph(id='users-evolution'),
-             html.Br(),
-             dcc.DatePickerRange(id="selected-dates-users", calendar_orientation='horizontal', day_size=20,
-                                         end_date_placeholder_text="End date", with_portal=False, first_day_of_week=0, reopen_calendar_on_clear=True, is_RTL=False,
-                                         clearable=True, number_of_months_shown=3, min_date_allowed=dt(2020, 1, 1),max_date_allowed=pd.to_datetime("today").date(),
-                                         initial_visible_month=dt(2021, 1, 1), start_date=dt(2020, 8, 1).date(), end_date=pd.to_datetime("today").date(),
-                                         display_format="DD-MMMM-YYYY", minimum_nights=6,
-                                         persistence=True, persisted_props=["start_date"], persistence_type="session",
-                                         updatemode="singledate"
-                                         )
-         ]
-     )
- ],color='#4e99f6',inverse=True,style={"border": "none"})
-
-card_users_inactive = dbc.Card([
-     dbc.CardBody(
-         [
-             dash_table.DataTable(id='inactive-users',
-                                  style_cell={"TextAlign": "left", },
-                                  style_header={'backgroundColor': '#4e99f6', 'color': 'white', 'fontWeight': 'bold',
-                                                'border': '1px solid black'},
-                                  style_data_conditional=[
-                                      {'if': {'row_index': 'odd'}, 'backgroundColor': 'rgb(248,248,248)'}], page_size=5,
-                                  style_table={'width': '100px', 'height': '200px', },
-                                  style_as_list_view=True,
-                                  export_format="csv",
-                                  )
-         ]
-     )
- ],color='#4e99f6',inverse=True,style={"border": "none"})
-
-card_classes_key_metrics_1 = dbc.Card([
-     dbc.CardBody([
-            dbc.Row([dbc.CardImg(src="https://img.icons8.com/bubbles/2x/classroom.png", alt="Classroom icon",
-                                        style={'maxWidth': '25%', 'maxHeight': '25%', 'textAlign': 'center','width': 200}),
-                     dbc.Col([html.H4(id='unique-classes', style={'marginTop': 25, 'fontSize': 50, 'color': '#4e99f6','textAlign': 'center'}),
-                               html.H6(children=["Classes", html.Br(),"Created"],style={'marginBottom': 25, 'textAlign': 'center', 'color': 'grey'})], align="end"
-                              ),
-                     dbc.Col([html.H4(id='classes-without-children', children=[],style={'marginTop': 25, 'fontSize': 50, 'color': '#4e99f6','textAlign': 'center'}),
-                               html.H6(children=["Classes without Children assigned"],style={'marginBottom': 25, 'textAlign': 'center', 'color': 'grey'})],align="end")
-                    ], align="center"),
-         ])
- ],inverse=True, outline=False,style={'boxShadow':'4px 4px lightgrey'})
-
-card_classes_key_metrics_2 = dbc.Card([
-     dbc.CardBody([
-         dbc.Row([dbc.CardImg(
-                 src="data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAOEAAADhCAMAAAAJbSJIAAABOFBMVEX////toz+gLCzT1daPvc8AAAA1IgDW1tba3N5OT0+YAADfmTvvny7U0s4cEAAuGAB1bWTtIiSeJCSmxdHzpj3I0dW2ytOFblXuoTTdwqQrEgCbFRWPi4WfwtGeIyOdHh7u3t6aDg5RVlz79vZwZFdWVFZndn1gaW6yydLfwsL27e26c3O/fn60ZWWqSUnr2NjUq6skHxX55M1sbW/xu3r32bjOoKDrmh58foDChYX10Kb77NuvV1f0HR97VVOkNzf0yZnvr17uqU798+lLPi+mPT3wtm4jAACMXyKjoZ3zwYjIk5MiFAC7u7nky8utdy5PNxXIijVsSh1YTUCIgHcbAAB0TBCXaChWOxc7OTa8ikr0hzXtZzHtmz3tOChONAwnCgD0dDHtSyueaRm6p5JCMyJVMQAeHh925WAnAAAPmElEQVR4nO2dCXvaOBrHA1mOOqRJPbTDxBTbS7NbA07YLCELYZcjJQdp7qsz7dzTme//DVa2ZSzZkpEvTIv/zzPTYIOtn/XqfV/JsryykihRokSJEiVKlChRokSJEiUKVdVaTdrVJNVq1bgLE6aqktLuqDsix3GyKfC3MFY7bWX3C0etKW01zcmCKPJ82i6eF0VB5tLquVKLu6C+JDXrPCeITjIHqShwfL0pxV1gT6oqDZETKjPhLFUETmwoX4jJVhXVGx1CqTYXH1JRZWG2ZdLEA0glbgQ31c6FAHgmpHwuxQ1C0WWPEwPiGRK53mXcMAQ1+3LQ6rPEy/1m3EA2NcXA5mljFMRFYmxWhFDxDAmVRWFU+ox8PF8xRMhwyIzpRXCs0o48C6yiZWcCP+6p9Yamutobg7gAsrnKLFR5R4obsMG5FhKwyTsNkGE7U8/artJu7Miye2bHc40YqCwpokt8APlmvzMz35SUzhjkry6HEeMz1arKUS+9yKU7zHlmVemkOXpVcmpMuZxCzT5FbtyWPB5Nao+pCUNFiKUa65QK5OWKz7RLOge/pVRjPdzCs5QmTb7gIqeSMq6jw/3uYNI6Ph4Oh8fHrcmgu793RPjepUqpSDEtRUxkU5PsQgXh3O40j/a6rVGhUCgBFVOGitoHsG3U6jo4teydaBrcXON/g2ihjkTraH+S0thSNBUBZ2qyb6OkpEhzjBvVHZIl2ZOsw0HKDc4SqM7UYI+BUdyZk0+VSEmXKLcxvEmpwEI3pSyUJofoAdoy4SryvDQPwEtCLwlkHsjlrXZHnvBMyFQXPQgpW+LlOXQcFUITFNDs8bB14B0PQh60kIokZrxc5JGx6QTkZaQB7g19VB9akUOkRTYJ5hK1S207AeWeFSD2RoUAeIYKI4ux1nNWI9cmFSw6QDRMHQ6D8+mMQ8tWCYE3SkQnoNiXzJ1HrYNQ+DQdtKYhUuo7nGp0iM42KFvpYjdQ+7OrVOhOj1x3WGpUbdHpRa0zHYbQAHEVRlNTdV7ZaDzqpf08vLxr7huEZ6CWDgbm4XcdPpWLIC5KdluppE0fejQK00AtlUZma6yl7b0qWQobsGpP1awkcT9sA7VU2DdPb0+FeT7sHHXHDtgz90yisFBTBxPzND074k64gA3b8QXV3DOMxkJNlYbmiVRbd0MMtTNl92ZTwKNUtIAAMWU2xroNMcyYIdkARRPwMLomaKlghg3VZkicFBphGm+E0za4F2UTtHRgJqq2tsinwwKs4weumG18fz6AANF0qTt40BBDGoGz5TJ8ujpnQAuxarOmcHKbqq2By7W5A1qINVveIYQRFVXcMjiYqs2pDU4RYVvcxQ2qotILziqbjZr9+cP5AgJE6FGbeC2GYKe4lzHb9tE8wgSuAoyLNr8nBgXEkxm+DzfPnU8TPHcf8zZBUxtbrDdjbMSpGllmAkcpk0/hCbfZCCcugMVikb4zICJMw/GmGCwFV/BjwVzGLU4Uf/j2h8gQzZjRw697EGfTx/2oEQldvczHN3//NjJC09vYomLfDcFdTSzYmzY6opfg04v//m8GYTD8ESwYhij472Rgsd609wG1Ef7404tZhMWbn2+CMJYGRiFw/1AJpwqhz6KF+h8/fnrxYgZhce32efb57VoARhj4cX/quxKxUGjGHZKNvrDkRlh8er+RzWY3nj8FQIR2isdpn2Hf1gqNHLdLcjNMhMWb7PusofdZ/6YKh4qrYbRELHcQjJF0sh9lINQNVKvAX7RqDGKq0J+20evP+3Knl9hVgo25RXQzswmLV7qBZk/uLu5OdNL3fk211DKKgrlBX3dOsbAKzYDiZmYRAg+qG+jWxlk+nz/b2ApkqtDZYI2I77mhkIV7K1iFQ/I53QmLqUfDQB82V/Orq+C/zQfDVB/9mSrMTzFfw3l/KuUcPQCswj1KNjPl++nTr46cZmqg7y40Pk35i3fQVK/8IBb2nJUonnsmxBypYGyjZTMm4EfAYyeEBrqxdWby6YxnW4ap/nzjA3FELyK7FMIFolUhJPyk/WknLJ7qgNBAEURgqjriqY9ahJWIm5nX/FtF/Qw08iHtjL/99unXj5DIQQhM9BfLQBFG3VQ3/BDCllhDXQXvccSmiv4YDvcwDXATCDe2yvmcAxCaqj9COAyOV4O3YTesFcNgQ46FMwkziIHmDSGmmvFFCGMiFrI95jXY1eGNamUaXXMQ/v6HBXRRvts42bgrWzab/+N3XwHjwKgwNOp7M1PMSKGf6TKNzTh8aek7pMIyd/fl+7sMUq3f+RvxKRnZKeZrPJkp5klht4nt1FTC/MVWpmyUoVrObJnV6JMQBgwsLfHkTRtI9fNjfRPjjTQaYe7iIat55GpO+38t+3CRC0QIfc0YaU0VL+OKaOWLRq/CbXyNgXA1m9UrcD1T1qsxmw1Wh3DcrY2VlB0Qq3xopIwloRDm7zN5/TA5g3Aln7nPByFMlaglZRHe99U3sd7tpdXhw/0KRrhy/xCoDk0zRQvqIV7UkWYodvRN9PEnFsL8WSZnI8xl9ETVfx0O9MN0EDOtsN8wxXqGhodiPTGFcPNkxUa4crIZiBDexsC8Ps8KiOV7RpRhvtdEIby7g8fOTwnv7oIRGqMZWORm7iSi1wXGin3WgtAJy5kHoJOTsAhLxhA/OizPHBHRTAE2Q8ZYQSV883nl7PM7TZ/X4Vk+vwlIaMQLtCEyd4PRpNRjM6QRljOOs2TKAduhsyEyp6aoB5YlbQv7LV9KtLjIXNhOArYEihZmQ8TnTLIBYo1X1jdRe/eshPnP72xnefc5WMSf9vRRQsbkexf5Dbwdw9avcCM8y5xhJzkzwmEQQti/QG/SGBY3U6hlw2yWqfPrRgh8DWanF5k3+WA5zbQbjPYSGJ0pms3CtNvlliEjIQgY00i4AiLHXcDek6YRrbizhPpfeFHY55a49IA3M9kzLf3On2UzmwF7wLoKDpODsW2W0GBhTFb3MHuGTgj6wKB3r+vOGsYIRKg7U8xtsIULtOkaeRDZla6RlAKE+J4pIWBcPyvfl8/WkaG374hHIRyXRKh3L9Ack3FeBprLGiPJxJxtLfOcoIdn28+wDRl8rBsdajN8LOkoDmVIiDBvc5Z3lrBxVn0LMVisZTYI2gKEW+iGkzPnYDBKeEI6ikNkQiNcYIOmLIBYwDfybnLn8HGTpO3tbXzDhQsgSHaIB3HokVQA2EUco4QsIR+za+O2HDnvLqznCfr39n/wDa6A00Fid60THQHMvXsOvzGL0OmbWsRR28I6qcAa4Qwo76IQGiEf8/0shGgqC8cFjknHj5+weKyXDh1zkSUGQjS+wKTNhfClqVX4ARDqH15ieyjCvkT+4EKYMgjRtM162Mwb4ZBK+PJvpnKruVfav//c/of+4RtzxzfE+066sC/lXpsf3oIP0+O+ytEJh7ERvk4IF46Q3g7jJfTZDj350lgJ/fpST/EwVkK/8dBDThM3oc+chjkvjZ9woJfOc17K2rdYAEKffQvW/uECEDr7h2w3SVn7+LET+u7js47TxJ61+R6nYR1r0zPvnCn4t963yKE76IC2L9E/0Aj1svkYa2MdL4299+R7vJR1zDtuQv9j3qz3LWIn9H3fgvXek1dCL6M3LIT+7z2x3j90eJpV1NOsojs0XZRRwRE4268pHyiEvu8fst4D1qPF21dQOfgBEBofzB1wFCNfftiy9KDfAMa+lHtF+vD2JZUwwD1gxvv43iJ+vryVtbSlEwaKh0Hu4zPOxYibMMBcDMb5NDETHgSYT8M4JypmQsKcKPaVQNjmtcVLGGxeG9vcxHgJg81NZJtfGnMdUkvKJKY5wrESkuYIe3kcmGmed6yEQed5M83Vj5Uw6Fx9puct4iQM/LwF0zMzOuFrUxqh9i8gfK2V9625460L4SvkS7lvzA+v0A/kvDTwMzNMzz15G8UgEbKMYhD7FsTnnrw9nsfw7FrRW/+QSMiq9QK+YkoIz665P38ITrd2dfon6e5uNIQv/zy9uklZlCE8f+j2DGlx7elan7w1R0L9fNdP8MnoUJ4hpT8HvPYBzk7LEGeKOGabmLITetGqecoPa1aoCPgcMP1Z7ivzbJlnJG1vbxO3P/v+X6i+J3+Jpuk5r6wqDPosN/V5/OLNtBJJerb9zG13MH3QFykI6Xl8lzUViqmbUyplZIQfTm+M5XvCWlPBfV2MYrG4dnN1envtKMhf3/8VMtr1LXCka9MVtsJbF2P22iZFTSlAevX0eHudfR8i1fPs9e3j0xUgg2dBYmFoa5t4WJ+mWITFWFu7AbxXT6enj4+3Hz5cA+zns1jeZ6+vrz/c3j6engKkq5sbbbrs9IgOhbk+DfsaQ0Rem8y9a2xfoyrMNYa8rRM1J4W7TpTXtb7moJDX+vK+XlvkGpEKFmC9Nh9r7kWr0Nfc87FuYqSKYN1EH2tfRqgo1r5cgvVLv/41aJdgHeElWAv661/PewnWZP/619VfgncjLMH7LZbgHSVf/3tmluBdQUvwvqcleGfXylf/3rUleHfeErz/cAneYbkE7yFdgnfJzn4fcAiM8b4PmOWdzr7fWa0p/nc6L8F7uaN8t/poMd6tDq6tPYHTJMpY8ziclDxBgm9PDtEDtGWHC9VSNWkegIQk0TBVEW8hh4PUQYmFslQ6SA0wvJVmRSCcwUqFo1eD0BidjCtH+5NUoeCCWSoVCqnJ/hH+MzJfmgu5u+QuQpjSGYVz+6yPo71ua1QoaKClknGLt6j9CdgKo1Z3z0a3UjsXiHx89E4Ul5QmWSqwJE4lOYOjw/3uYNI6Ph4Oh8fHrcmgu+9g03SpcpTjpqWIiZyqEy1V83eVc3+lkc7Bb8kH5UIbVfMiRaAUB1TkuC15PJrUHlOqD3RFvU/LC0dVlVKNoCJFLt1RWF1fVemkOZHYsvUKVOfnQ+1SRNpl16881+80pRmHkJTOmBNcDiOKMVUgFCnzQIsnyPJOo63sOifW1XaVdmNHlgV65aX1bCkGKkzE7BEvZAVwcgI/7qn1hqa62hvzAgfYKq6XB0hGM97YpPSJAYyAylcMkdI+koR+vAZqiZKEBJRQmXOMd1VTFBjrhVH8YvFpavYJvSrffHJ/0fg0XfaoIdubRK43l26gD2lZMy3PYa4+kL1LcYO4SVHlAC0SxBB1UdwnXVVF5XzVJMiB1GZ8+ZknVZVGxRsloBMbzHnsYkhq1tOce0YGLVMUOL4+M39dTNWUtprWsjORkMXwvKhlc2n1XPHxNMgiqSop7Y66I3IcJ5sCfwtjtdNWpC/LMGeoWqtJu5qkWu2rAkuUKFGiRIkSJUqUKFGiRIkWQf8H/qEGTltowFkAAAAASUVORK5CYII=",
-                 alt="School icon", style={'maxWidth': '25%', 'maxHeight': '25%', 'textAlign': 'center'}),
-
-                      dbc.Col([html.H4(id='unique-schools', style={'marginTop': 25, 'fontSize': 50, 'color': '#4e99f6','textAlign': 'center'}),
-                               html.H6(children=["Unique", html.Br(),"Schools"],style={'marginBottom': 25, 'textAlign': 'center', 'color': 'grey'})], align="end"
-                              ),
-                      dbc.Col([html.H4(id='schools-without-children', children=[],style={'marginTop': 25, 'fontSize': 50, 'color': '#4e99f6','textAlign': 'center'}),
-                               html.H6(children=["Schools without Children assigned"],style={'marginBottom': 25, 'textAlign': 'center', 'color': 'grey'})],
-                              align="end")
-                      ], align="center"),
-         ])
- ],inverse=True, outline=False,style={'boxShadow':'4px 4px lightgrey'})
-
-card_classes_key_metrics_3 = dbc.Card([
-     dbc.CardBody(
-         [
-             dbc.Row([dbc.CardImg(src="https://img.icons8.com/clouds/2x/child-safe-zone.png", alt="Kids icon", className='align-self-center', style={'maxWidth': '25%', 'maxHeight': '25%'}),
-                      dbc.Col([html.H4(children=[(classes["nbChild"].sum())], style={'marginTop': 25, 'fontSize': 50, 'color': '#4e99f6','textAlign': 'center'}),
-                                html.H6(children=["Children assigned to Classes"], style={'marginBottom': 25, 'color': 'grey', 'textAlign': 'center'})]),
-                      dbc.Col([html.H4(children=[classes["nbArchivedChildren"].sum()], style={'marginTop': 25, 'fontSize': 50, 'color': '#4e99f6','textAlign': 'center'}),
-                               html.H6(children=["Archived", html.Br(),"Children"], style={'marginBottom': 25, 'color': 'grey', 'textAlign': 'center'})]),
-                      ], align="center"),
-         ]
-     )
- ],inverse=True,outline=False,style={'boxShadow':'4px 4px lightgrey'})
-
-card_classes_map = dbc.Card([dbc.CardBody([dcc.Graph(id="classes_map")])],inverse=True, outline=False,style={"border": "none"})
-
-card_classes_pie_chart = dbc.Card([dbc.CardBody([dcc.Graph(id='public-prive')])],inverse=True,style={"border": "none"})
-
-card_homeworks_key_metrics_1 = dbc.Card([
-    dbc.CardBody([
-    dbc.Row([dbc.Col(html.Div(children=[homeworks.id.nunique()], style={'fontSize': 50,'color': '#4e99f6','textAlign': 'center'})),], style={'height': 60}, align="end"),
-    dbc.Row([dbc.Col(html.Div(children=["Homeworks Created"], style={'marginBottom': 25, 'textAlign': 'center'})),], style={'height': 20}, align="start"),
-    ])
-],color='#F8F4F4',style={"border": "none"})
+# Computing the panels not depending on the filters (they only change with the databases), once per snapshot
+def school_number(data):
+    return [data["schools"].shape[0]], [(data["schools"].nbChild < 1).sum()]
 
-card_homeworks_key_metrics_2 = dbc.Card([
-    dbc.CardBody([
-    dbc.Row([dbc.Col(html.Div(children=[homeworks.classId.nunique()], style={'fontSize': 50,'color': '#4e99f6','textAlign': 'center'})),], style={'height': 60}, align="end"),
-    dbc.Row([dbc.Col(html.Div(children=["Classes having Homeworks assigned"], style={'marginBottom': 25, 'textAlign': 'center'})),], style={'height': 20}, align="start"),
-    ])
-],color='#F8F4F4',style={"border": "none"})
+def classes_number(data):
+    df = data["classes"].groupby("id")["nbChild"].sum()
 
-card_homeworks_key_metrics_3 = dbc.Card([
-    dbc.CardBody([
-    dbc.Row([dbc.Col(html.Div(children=[homeworks.userId.nunique()], style={'fontSize': 50,'color': '#4e99f6','textAlign': 'center'})),], style={'height': 60}, align="end"),
-    dbc.Row([dbc.Col(html.Div(children=["Unique Authors having created Homeworks"], style={'marginBottom': 25, 'textAlign': 'center'})),], style={'height': 20}, align="start"),
-    ])
-],color='#F8F4F4',style={"border": "none"})
-
-card_homeworks_visualisations_1 = dbc.Card([dbc.CardBody([dcc.Graph(id="homeworks-type")])],color='#F8F4F4',style={"border": "none"})
-
-card_homeworks_visualisations_2 = dbc.Card([dbc.CardBody([
-    dash_table.DataTable(id='homeworks-authors',
-                         style_cell={"TextAlign" : "left",},
-                         style_header={'backgroundColor':'#4e99f6', 'color': 'white', 'fontWeight': 'bold', 'border':'1px solid black'},
-                         style_data_conditional=[{'if':{'row_index':'odd'},  'backgroundColor':'rgb(248,248,248)'}], page_size=5,
-                         style_table={'width':'600px','height':'200px',},
-                         style_as_list_view=True,
-                         export_format="csv",
-                         )
-            ]
-    )],color='#F8F4F4',style={"border": "none"})
-
-card_events_key_metrics_1 = dbc.Card([
-     dbc.CardBody([
-            dbc.Row([
-                     dbc.Col([html.H4(id='events-past',style={'marginTop': 25, 'fontSize': 50, 'color': '#4e99f6','textAlign': 'center'}),
-                               html.H6(children=["Events Passed"],style={'marginBottom': 25, 'textAlign': 'center', 'color': 'grey'})],align="end")
-                    ], align="center"),
-         ])
- ],inverse=True, outline=False, style={'boxShadow':'-4px -4px lightgrey'})
-
-card_events_key_metrics_2 = dbc.Card([
-     dbc.CardBody([
-            dbc.Row([
-                     dbc.Col([html.H4(id='events-future', style={'marginTop': 25, 'fontSize': 50, 'color': '#4e99f6','textAlign': 'center'}),
-                               html.H6(children=["Upcoming Events"],style={'marginBottom': 25, 'textAlign': 'center', 'color': 'grey'})],align="end")
-                    ], align="center"),
-         ])
- ],inverse=True, outline=False,style={'boxShadow':'4px 4px lightgrey'})
-
-card_events_key_metrics_3 = dbc.Card([
-     dbc.CardBody([
-            dcc.Graph(id='events-slots'),
-            html.P(children=["PS.: the 'y' axis is in logarithm scale"], style={'fontSize': 10,'color': 'grey','textAlign': 'right','font-style': 'italic',})
-         ])
- ],inverse=True, outline=False,style={"border": "none"})
-
-card_events_given_period_1 = dbc.Card([
-     dbc.CardBody([
-            dbc.Row([
-                     dbc.Col([html.H4(id='events-in-this-period',style={'marginTop': 70, 'fontSize': 50, 'color': '#4e99f6','textAlign': 'center'}),
-                               html.H6(children=["Events in this period (of selected types)"],style={'marginBottom': 70, 'textAlign': 'center', 'color': 'grey'})],align="end")
-                    ], align="center"),
-            ])
-    ],inverse=True, outline=False,style={"border": "none"})
-
-card_events_given_period_2 = dbc.Card([dbc.CardBody([dbc.Row([dcc.Graph(id='events-dayofweek')], align="center"),])
-                                        ],inverse=True, outline=False,style={"border": "none", 'marginLeft': 50, "width": "50rem", 'textAlign':"center"})
-
-
-card_events_key_metrics_filter = dbc.Card([
-     dbc.CardBody([
-            dbc.Row([
-                     dcc.Dropdown(id='events-types-key-metrics', options=events_types, value=sorted(list(events.eventType.fillna("NOT ASSIGNED").unique())), multi=True)
-                    ], align="center"),
-         ])
- ],inverse=True, outline=False,style={'width':'50%'})#style={'boxShadow':'4px 4px lightgrey'})
-
-
-# Creating layout for the app with content, format and style
-app.layout = html.Div(children=[
-    dbc.Row([dbc.Col(html.Img(src="/static/feamzy-logo-bluebcg.png", alt="Feamzy logo", style={'maxWidth': '50%', 'maxHeight': '50%'}),width=4,align="center"),
-            dbc.Col(html.H1(['Dashboard'], style={'color': 'white', 'offset':3,'marginLeft': 150, 'textShadow': '2px 2px black'}),width=4),
-            dbc.Col(html.H6(['Last update: ',last_update], style={'color': 'white', 'offset':4,'marginLeft': 150, 'textShadow': '2px 2px black'}),width=4,align="center"),
-            ], style={'backgroundColor':'#4e99f6','position':'sticky', 'top':'0','zIndex': 10, 'border':'1px grey solid','height': '60px'}),
-    html.Div([
-        html.Br(),
-        html.H2('USERS', style={'color':'white','marginLeft': 20, 'textShadow': '2px 2px black'}),
-        dbc.Row([dbc.Col(card_users_key_metrics,width=5), dbc.Col(card_users_evolution, width=7)]),
-        html.Br(),
-        ],   style={'backgroundColor':'#4e99f6'}),
-    html.Br(),
-    html.Br(),
-    html.Div([
-        html.H2('CLASSES & SCHOOLS',style={'marginLeft': 10,'color': '#4e99f6', 'textShadow': '2px 2px black'}),
+    return [data["classes"].id.nunique()], [df[df < 1].shape[0]]
+
+def children_number(data):
+    import plotly.express as px
+
+    df = data["users"].groupChildSize.value_counts().reset_index()
+    df.rename(columns={'index': 'Number of Children', 'groupChildSize': "Number of Users"}, inplace=True)
+    fig = px.bar(df, df["Number of Children"], df["Number of Users"], color_discrete_sequence=['#2dd36f','#4e99f6'], log_y=True, hover_name=df["Number of Users"])
+
+    fig.layout.paper_bgcolor = 'rgba(0,0,0,0)'
+    fig.layout.plot_bgcolor = 'rgba(0,0,0,0)'
+    fig.update_layout(
+        margin={"r": 0, "t": 40, "l": 0, "b": 0},
+        title_text='Relationship between User and number of Children', title_font={'color': '#FFF'}, font_color='white',
+        width=500, height=250, xaxis={'showgrid': False}, yaxis={'showgrid': False}
+        )
+
+    return fig
+
+def homeworks_type(data):
+    import plotly.express as px
+
+    df = pd.DataFrame(data["homeworks"].type.value_counts()).reset_index()
+    df.rename(columns={'index': "Type", "type": "Number"}, inplace=True)
+
+    fig = px.bar(df, x=df.Number, y=df.Type, color_discrete_sequence=["#2dd36f"])
+
+    fig.layout.paper_bgcolor = 'rgba(0,0,0,0)'
+    fig.layout.plot_bgcolor = 'rgba(0,0,0,0)'
+    fig.update_layout(
+        margin={"r": 0, "t": 40, "l": 0, "b": 0},
+        title_text='Homeworks Type', title_x=0.5, xaxis={'showgrid': False},yaxis={'showgrid': False},
+        width=400, height=200
+        )
+
+    return fig
+
+def doc_type(data):
+    df = pd.DataFrame(data["documents"].type.value_counts()).reset_index()
+    df.rename(columns={'index': "Type", "type": "Number"}, inplace=True)
+
+    fig = go.Figure(data=[go.Pie(labels=df["Type"],
+                                 values=df["Number"],
+                                 insidetextfont={'color': 'white'},hole=.4)])
+    fig.layout.paper_bgcolor = 'rgba(0,0,0,0)'
+
+    colors = ['#4e99f6', '#2dd36f']
+    fig.update_traces(hoverinfo='label+percent', textinfo='value', marker=dict(colors=colors))
+
+    fig.update_layout(showlegend=True,
+                      margin={"r": 0, "t": 40, "l": 0, "b": 0},
+                      title_text='Documents Types', title_x=0.5,  # title_y=0.9,
+                      width=350, height=350, title_font={'color': 'black'},
+                      font_color='black')
+
+    return fig
+
+
+def precompute_panels(data):
+    start = time.perf_counter()
+    panels = {"school_number": school_number(data), "classes_number": classes_number(data), "children_number": children_number(data),
+              "homeworks_type": homeworks_type(data), "doc_type": doc_type(data)}
+    print("Panels precomputed in {:.2f}s".format(time.perf_counter() - start))
+    return panels
+
+
+# Number of authors shown by the leaderboards when they are neither filtered nor sorted (see "authors_ranking")
+LEADERBOARD_SIZE = 100
+
+
+# Columns of the leaderboards of the authors, the ranks and numbers being filtered as numbers
+def leaderboard_columns(count_name):
+    return [{"name": "Rank", "id": "Rank", "type": "numeric"}, {"name": "Author", "id": "Author", "type": "text"},
+            {"name": count_name, "id": count_name, "type": "numeric"}]
+
+
+def leaderboard_caption():
+    return html.P("Top {} authors: filter or sort the table to search all of them".format(LEADERBOARD_SIZE),
+                  style={'fontSize': 12, 'color': 'grey', 'font-style': 'italic'})
+
+
+# Columns of the report of the inactive users, the activities being filtered as numbers
+def inactive_users_columns():
+    return [{"name": "User", "id": "User", "type": "text"}, {"name": "Username", "id": "Username", "type": "text"},
+            {"name": "Sign-up", "id": "Sign-up", "type": "text"}, {"name": "Last activity", "id": "Last activity", "type": "text"},
+            {"name": "Activities", "id": "Activities", "type": "numeric"}]
+
+
+# Links downloading all the rows of a table or of the rows selected by the filters of a section (see "export_dataset"),
+# whose addresses are updated with the filters
+def export_links(name):
+    return html.Div([html.A("Export all (CSV)", id=name + "-export-csv", href="", style={'marginRight': 15}),
+                     html.A("Export all (Parquet)", id=name + "-export-parquet", href="")],
+                    style={'fontSize': 12, 'textAlign': 'right'})
+
+
+# Components of the charts computed in the background (see "background_callback"): the job computing the chart and the
+# interval asking for its result, enabled while the job runs
+def background_components(component_id):
+    return [dcc.Store(id=component_id + "-job"), dcc.Interval(id=component_id + "-poll", interval=500, disabled=True)]
+
+
+# Figure shown instead of a chart while it is computed in the background, or when it couldn't be computed
+def message_figure(message):
+    fig = go.Figure()
+    fig.layout.paper_bgcolor = 'rgba(0,0,0,0)'
+    fig.layout.plot_bgcolor = 'rgba(0,0,0,0)'
+    fig.update_layout(xaxis={'visible': False}, yaxis={'visible': False},
+                      annotations=[{'text': message, 'showarrow': False, 'font': {'size': 20, 'color': 'grey'}}])
+    return fig
+
+
+# Creating the layout of the application from the current snapshot, every time the page is loaded (so that a new snapshot
+# is shown without restarting the app)
+def serve_layout():
+    data = get_snapshot()
+
+    # Creating cards that will compose grids in the layout of the application
+    card_users_key_metrics = dbc.Card([
+         dbc.CardBody(
+             [
+                 html.H3('Key Metrics',style={'marginLeft': 4,'color': '#f8e71c', 'textShadow': '2px 2px black'}),
+                 html.Div(children=[data["users"].id.count()], style={'fontSize': 50,'color': 'white','textAlign': 'center'}), #'marginTop': 25,
+                 html.H4(['Total Users'], style={'color': 'white','textAlign': 'center'}),
+                 html.Br(),
+                 html.Div(children=[int(data["users"].groupChildSize.sum())], style={'fontSize': 50,'color': 'white','textAlign': 'center'}), #'marginTop': 25,
+                 html.H4(['Children Profiles Created'], style={'color': 'white','textAlign': 'center'}),
+                 html.Br(),
+                 html.Br(),
+                 dcc.Graph(id="children_number", figure=data["panels"]["children_number"]),
+                 html.Br(),
+                 html.P(children=["PS.: the 'y' axis is in logarithm scale"], style={'fontSize': 10,'color': 'white','textAlign': 'right','font-style': 'italic',})
+             ]
+         )
+     ],color='#4e99f6',inverse=True,style={"border": "none"})
+
+    card_users_evolution = dbc.Card([
+         dbc.CardBody(
+             [
+                 dcc.Graph(id='users-evolution'),
+                 dcc.RadioItems(id='users-granularity', options=[{'label': 'Day', 'value': 'day'}, {'label': 'Week', 'value': 'week'},
+                                                                 {'label': 'Month', 'value': 'month'}],
+                                value='day', labelStyle={'display': 'inline-block', 'marginRight': 15}, inputStyle={'marginRight': 5}),
+                 html.Br(),
+                 dcc.DatePickerRange(id="selected-dates-users", calendar_orientation='horizontal', day_size=20,
+                                             end_date_placeholder_text="End date", with_portal=False, first_day_of_week=0, reopen_calendar_on_clear=True, is_RTL=False,
+                                             clearable=True, number_of_months_shown=3, min_date_allowed=dt(2020, 1, 1),max_date_allowed=pd.to_datetime("today").date(),
+                                             initial_visible_month=dt(2021, 1, 1), start_date=dt(2020, 8, 1).date(), end_date=pd.to_datetime("today").date(),
+                                             display_format="DD-MMMM-YYYY", minimum_nights=6,
+                                             persistence=True, persisted_props=["start_date"], persistence_type="session",
+                                             updatemode="singledate"
+                                             ),
+                 dcc.Store(id='users-selection')
+             ]
+         )
+     ],color='#4e99f6',inverse=True,style={"border": "none"})
+
+    card_users_inactive = dbc.Card([
+         dbc.CardBody(
+             [
+                 html.H4("Users without activity since their sign-up in the chosen period", style={'color': 'white'}),
+                 html.P("No homework, event or document created in the period (last activity and activities: at any time)",
+                        style={'fontSize': 12, 'color': 'white', 'font-style': 'italic'}),
+                 dash_table.DataTable(id='inactive-users', columns=inactive_users_columns(),
+                                      page_action="custom", page_current=0, sort_action="custom", sort_mode="single", sort_by=[],
+                                      filter_action="custom", filter_query="",
+                                      style_cell={"TextAlign": "left", },
+                                      style_header={'backgroundColor': '#4e99f6', 'color': 'white', 'fontWeight': 'bold',
+                                                    'border': '1px solid black'},
+                                      style_data_conditional=[
+                                          {'if': {'row_index': 'odd'}, 'backgroundColor': 'rgb(248,248,248)'}], page_size=5,
+                                      style_table={'width': '100%', },
+                                      style_as_list_view=True,
+                                      export_format="csv",
+                                      ),
+                 export_links('inactive-users')
+             ]
+         )
+     ],color='#4e99f6',inverse=True,style={"border": "none"})
+
+    card_classes_key_metrics_1 = dbc.Card([
+         dbc.CardBody([
+                dbc.Row([dbc.CardImg(src="https://img.icons8.com/bubbles/2x/classroom.png", alt="Classroom icon",
+                                            style={'maxWidth': '25%', 'maxHeight': '25%', 'textAlign': 'center','width': 200}),
+                         dbc.Col([html.H4(id='unique-classes', children=data["panels"]["classes_number"][0], style={'marginTop': 25, 'fontSize': 50, 'color': '#4e99f6','textAlign': 'center'}),
+                                   html.H6(children=["Classes", html.Br(),"Created"],style={'marginBottom': 25, 'textAlign': 'center', 'color': 'grey'})], align="end"
+                                  ),
+                         dbc.Col([html.H4(id='classes-without-children', children=data["panels"]["classes_number"][1],style={'marginTop': 25, 'fontSize': 50, 'color': '#4e99f6','textAlign': 'center'}),
+                                   html.H6(children=["Classes without Children assigned"],style={'marginBottom': 25, 'textAlign': 'center', 'color': 'grey'})],align="end")
+                        ], align="center"),
+             ])
+     ],inverse=True, outline=False,style={'boxShadow':'4px 4px lightgrey'})
+
+    card_classes_key_metrics_2 = dbc.Card([
+         dbc.CardBody([
+             dbc.Row([dbc.CardImg(
+                     src="data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAOEAAADhCAMAAAAJbSJIAAABOFBMVEX////toz+gLCzT1daPvc8AAAA1IgDW1tba3N5OT0+YAADfmTvvny7U0s4cEAAuGAB1bWTtIiSeJCSmxdHzpj3I0dW2ytOFblXuoTTdwqQrEgCbFRWPi4WfwtGeIyOdHh7u3t6aDg5RVlz79vZwZFdWVFZndn1gaW6yydLfwsL27e26c3O/fn60ZWWqSUnr2NjUq6skHxX55M1sbW/xu3r32bjOoKDrmh58foDChYX10Kb77NuvV1f0HR97VVOkNzf0yZnvr17uqU798+lLPi+mPT3wtm4jAACMXyKjoZ3zwYjIk5MiFAC7u7nky8utdy5PNxXIijVsSh1YTUCIgHcbAAB0TBCXaChWOxc7OTa8ikr0hzXtZzHtmz3tOChONAwnCgD0dDHtSyueaRm6p5JCMyJVMQAeHh925WAnAAAPmElEQVR4nO2dCXvaOBrHA1mOOqRJPbTDxBTbS7NbA07YLCELYZcjJQdp7qsz7dzTme//DVa2ZSzZkpEvTIv/zzPTYIOtn/XqfV/JsryykihRokSJEiVKlChRokSJEiUKVdVaTdrVJNVq1bgLE6aqktLuqDsix3GyKfC3MFY7bWX3C0etKW01zcmCKPJ82i6eF0VB5tLquVKLu6C+JDXrPCeITjIHqShwfL0pxV1gT6oqDZETKjPhLFUETmwoX4jJVhXVGx1CqTYXH1JRZWG2ZdLEA0glbgQ31c6FAHgmpHwuxQ1C0WWPEwPiGRK53mXcMAQ1+3LQ6rPEy/1m3EA2NcXA5mljFMRFYmxWhFDxDAmVRWFU+ox8PF8xRMhwyIzpRXCs0o48C6yiZWcCP+6p9Yamutobg7gAsrnKLFR5R4obsMG5FhKwyTsNkGE7U8/artJu7Miye2bHc40YqCwpokt8APlmvzMz35SUzhjkry6HEeMz1arKUS+9yKU7zHlmVemkOXpVcmpMuZxCzT5FbtyWPB5Nao+pCUNFiKUa65QK5OWKz7RLOge/pVRjPdzCs5QmTb7gIqeSMq6jw/3uYNI6Ph4Oh8fHrcmgu793RPjepUqpSDEtRUxkU5PsQgXh3O40j/a6rVGhUCgBFVOGitoHsG3U6jo4teydaBrcXON/g2ihjkTraH+S0thSNBUBZ2qyb6OkpEhzjBvVHZIl2ZOsw0HKDc4SqM7UYI+BUdyZk0+VSEmXKLcxvEmpwEI3pSyUJofoAdoy4SryvDQPwEtCLwlkHsjlrXZHnvBMyFQXPQgpW+LlOXQcFUITFNDs8bB14B0PQh60kIokZrxc5JGx6QTkZaQB7g19VB9akUOkRTYJ5hK1S207AeWeFSD2RoUAeIYKI4ux1nNWI9cmFSw6QDRMHQ6D8+mMQ8tWCYE3SkQnoNiXzJ1HrYNQ+DQdtKYhUuo7nGp0iM42KFvpYjdQ+7OrVOhOj1x3WGpUbdHpRa0zHYbQAHEVRlNTdV7ZaDzqpf08vLxr7huEZ6CWDgbm4XcdPpWLIC5KdluppE0fejQK00AtlUZma6yl7b0qWQobsGpP1awkcT9sA7VU2DdPb0+FeT7sHHXHDtgz90yisFBTBxPzND074k64gA3b8QXV3DOMxkJNlYbmiVRbd0MMtTNl92ZTwKNUtIAAMWU2xroNMcyYIdkARRPwMLomaKlghg3VZkicFBphGm+E0za4F2UTtHRgJqq2tsinwwKs4weumG18fz6AANF0qTt40BBDGoGz5TJ8ujpnQAuxarOmcHKbqq2By7W5A1qINVveIYQRFVXcMjiYqs2pDU4RYVvcxQ2qotILziqbjZr9+cP5AgJE6FGbeC2GYKe4lzHb9tE8wgSuAoyLNr8nBgXEkxm+DzfPnU8TPHcf8zZBUxtbrDdjbMSpGllmAkcpk0/hCbfZCCcugMVikb4zICJMw/GmGCwFV/BjwVzGLU4Uf/j2h8gQzZjRw697EGfTx/2oEQldvczHN3//NjJC09vYomLfDcFdTSzYmzY6opfg04v//m8GYTD8ESwYhij472Rgsd609wG1Ef7404tZhMWbn2+CMJYGRiFw/1AJpwqhz6KF+h8/fnrxYgZhce32efb57VoARhj4cX/quxKxUGjGHZKNvrDkRlh8er+RzWY3nj8FQIR2isdpn2Hf1gqNHLdLcjNMhMWb7PusofdZ/6YKh4qrYbRELHcQjJF0sh9lINQNVKvAX7RqDGKq0J+20evP+3Knl9hVgo25RXQzswmLV7qBZk/uLu5OdNL3fk211DKKgrlBX3dOsbAKzYDiZmYRAg+qG+jWxlk+nz/b2ApkqtDZYI2I77mhkIV7K1iFQ/I53QmLqUfDQB82V/Orq+C/zQfDVB/9mSrMTzFfw3l/KuUcPQCswj1KNjPl++nTr46cZmqg7y40Pk35i3fQVK/8IBb2nJUonnsmxBypYGyjZTMm4EfAYyeEBrqxdWby6YxnW4ap/nzjA3FELyK7FMIFolUhJPyk/WknLJ7qgNBAEURgqjriqY9ahJWIm5nX/FtF/Qw08iHtjL/99unXj5DIQQhM9BfLQBFG3VQ3/BDCllhDXQXvccSmiv4YDvcwDXATCDe2yvmcAxCaqj9COAyOV4O3YTesFcNgQ46FMwkziIHmDSGmmvFFCGMiFrI95jXY1eGNamUaXXMQ/v6HBXRRvts42bgrWzab/+N3XwHjwKgwNOp7M1PMSKGf6TKNzTh8aek7pMIyd/fl+7sMUq3f+RvxKRnZKeZrPJkp5klht4nt1FTC/MVWpmyUoVrObJnV6JMQBgwsLfHkTRtI9fNjfRPjjTQaYe7iIat55GpO+38t+3CRC0QIfc0YaU0VL+OKaOWLRq/CbXyNgXA1m9UrcD1T1qsxmw1Wh3DcrY2VlB0Qq3xopIwloRDm7zN5/TA5g3Aln7nPByFMlaglZRHe99U3sd7tpdXhw/0KRrhy/xCoDk0zRQvqIV7UkWYodvRN9PEnFsL8WSZnI8xl9ETVfx0O9MN0EDOtsN8wxXqGhodiPTGFcPNkxUa4crIZiBDexsC8Ps8KiOV7RpRhvtdEIby7g8fOTwnv7oIRGqMZWORm7iSi1wXGin3WgtAJy5kHoJOTsAhLxhA/OizPHBHRTAE2Q8ZYQSV883nl7PM7TZ/X4Vk+vwlIaMQLtCEyd4PRpNRjM6QRljOOs2TKAduhsyEyp6aoB5YlbQv7LV9KtLjIXNhOArYEihZmQ8TnTLIBYo1X1jdRe/eshPnP72xnefc5WMSf9vRRQsbkexf5Dbwdw9avcCM8y5xhJzkzwmEQQti/QG/SGBY3U6hlw2yWqfPrRgh8DWanF5k3+WA5zbQbjPYSGJ0pms3CtNvlliEjIQgY00i4AiLHXcDek6YRrbizhPpfeFHY55a49IA3M9kzLf3On2UzmwF7wLoKDpODsW2W0GBhTFb3MHuGTgj6wKB3r+vOGsYIRKg7U8xtsIULtOkaeRDZla6RlAKE+J4pIWBcPyvfl8/WkaG374hHIRyXRKh3L9Ack3FeBprLGiPJxJxtLfOcoIdn28+wDRl8rBsdajN8LOkoDmVIiDBvc5Z3lrBxVn0LMVisZTYI2gKEW+iGkzPnYDBKeEI6ikNkQiNcYIOmLIBYwDfybnLn8HGTpO3tbXzDhQsgSHaIB3HokVQA2EUco4QsIR+za+O2HDnvLqznCfr39n/wDa6A00Fid60THQHMvXsOvzGL0OmbWsRR28I6qcAa4Qwo76IQGiEf8/0shGgqC8cFjknHj5+weKyXDh1zkSUGQjS+wKTNhfClqVX4ARDqH15ieyjCvkT+4EKYMgjRtM162Mwb4ZBK+PJvpnKruVfav//c/of+4RtzxzfE+066sC/lXpsf3oIP0+O+ytEJh7ERvk4IF46Q3g7jJfTZDj350lgJ/fpST/EwVkK/8dBDThM3oc+chjkvjZ9woJfOc17K2rdYAEKffQvW/uECEDr7h2w3SVn7+LET+u7js47TxJ61+R6nYR1r0zPvnCn4t963yKE76IC2L9E/0Aj1svkYa2MdL4299+R7vJR1zDtuQv9j3qz3LWIn9H3fgvXek1dCL6M3LIT+7z2x3j90eJpV1NOsojs0XZRRwRE4268pHyiEvu8fst4D1qPF21dQOfgBEBofzB1wFCNfftiy9KDfAMa+lHtF+vD2JZUwwD1gxvv43iJ+vryVtbSlEwaKh0Hu4zPOxYibMMBcDMb5NDETHgSYT8M4JypmQsKcKPaVQNjmtcVLGGxeG9vcxHgJg81NZJtfGnMdUkvKJKY5wrESkuYIe3kcmGmed6yEQed5M83Vj5Uw6Fx9puct4iQM/LwF0zMzOuFrUxqh9i8gfK2V9625460L4SvkS7lvzA+v0A/kvDTwMzNMzz15G8UgEbKMYhD7FsTnnrw9nsfw7FrRW/+QSMiq9QK+YkoIz665P38ITrd2dfon6e5uNIQv/zy9uklZlCE8f+j2DGlx7elan7w1R0L9fNdP8MnoUJ4hpT8HvPYBzk7LEGeKOGabmLITetGqecoPa1aoCPgcMP1Z7ivzbJlnJG1vbxO3P/v+X6i+J3+Jpuk5r6wqDPosN/V5/OLNtBJJerb9zG13MH3QFykI6Xl8lzUViqmbUyplZIQfTm+M5XvCWlPBfV2MYrG4dnN1envtKMhf3/8VMtr1LXCka9MVtsJbF2P22iZFTSlAevX0eHudfR8i1fPs9e3j0xUgg2dBYmFoa5t4WJ+mWITFWFu7AbxXT6enj4+3Hz5cA+zns1jeZ6+vrz/c3j6engKkq5sbbbrs9IgOhbk+DfsaQ0Rem8y9a2xfoyrMNYa8rRM1J4W7TpTXtb7moJDX+vK+XlvkGpEKFmC9Nh9r7kWr0Nfc87FuYqSKYN1EH2tfRqgo1r5cgvVLv/41aJdgHeElWAv661/PewnWZP/619VfgncjLMH7LZbgHSVf/3tmluBdQUvwvqcleGfXylf/3rUleHfeErz/cAneYbkE7yFdgnfJzn4fcAiM8b4PmOWdzr7fWa0p/nc6L8F7uaN8t/poMd6tDq6tPYHTJMpY8ziclDxBgm9PDtEDtGWHC9VSNWkegIQk0TBVEW8hh4PUQYmFslQ6SA0wvJVmRSCcwUqFo1eD0BidjCtH+5NUoeCCWSoVCqnJ/hH+MzJfmgu5u+QuQpjSGYVz+6yPo71ua1QoaKClknGLt6j9CdgKo1Z3z0a3UjsXiHx89E4Ul5QmWSqwJE4lOYOjw/3uYNI6Ph4Oh8fHrcmgu+9g03SpcpTjpqWIiZyqEy1V83eVc3+lkc7Bb8kH5UIbVfMiRaAUB1TkuC15PJrUHlOqD3RFvU/LC0dVlVKNoCJFLt1RWF1fVemkOZHYsvUKVOfnQ+1SRNpl16881+80pRmHkJTOmBNcDiOKMVUgFCnzQIsnyPJOo63sOifW1XaVdmNHlgV65aX1bCkGKkzE7BEvZAVwcgI/7qn1hqa62hvzAgfYKq6XB0hGM97YpPSJAYyAylcMkdI+koR+vAZqiZKEBJRQmXOMd1VTFBjrhVH8YvFpavYJvSrffHJ/0fg0XfaoIdubRK43l26gD2lZMy3PYa4+kL1LcYO4SVHlAC0SxBB1UdwnXVVF5XzVJMiB1GZ8+ZknVZVGxRsloBMbzHnsYkhq1tOce0YGLVMUOL4+M39dTNWUtprWsjORkMXwvKhlc2n1XPHxNMgiqSop7Y66I3IcJ5sCfwtjtdNWpC/LMGeoWqtJu5qkWu2rAkuUKFGiRIkSJUqUKFGiRIkWQf8H/qEGTltowFkAAAAASUVORK5CYII=",
+                     alt="School icon", style={'maxWidth': '25%', 'maxHeight': '25%', 'textAlign': 'center'}),
+
+                          dbc.Col([html.H4(id='unique-schools', children=data["panels"]["school_number"][0], style={'marginTop': 25, 'fontSize': 50, 'color': '#4e99f6','textAlign': 'center'}),
+                                   html.H6(children=["Unique", html.Br(),"Schools"],style={'marginBottom': 25, 'textAlign': 'center', 'color': 'grey'})], align="end"
+                                  ),
+                          dbc.Col([html.H4(id='schools-without-children', children=data["panels"]["school_number"][1],style={'marginTop': 25, 'fontSize': 50, 'color': '#4e99f6','textAlign': 'center'}),
+                                   html.H6(children=["Schools without Children assigned"],style={'marginBottom': 25, 'textAlign': 'center', 'color': 'grey'})],
+                                  align="end")
+                          ], align="center"),
+             ])
+     ],inverse=True, outline=False,style={'boxShadow':'4px 4px lightgrey'})
+
+    card_classes_key_metrics_3 = dbc.Card([
+         dbc.CardBody(
+             [
+                 dbc.Row([dbc.CardImg(src="https://img.icons8.com/clouds/2x/child-safe-zone.png", alt="Kids icon", className='align-self-center', style={'maxWidth': '25%', 'maxHeight': '25%'}),
+                          dbc.Col([html.H4(children=[int(data["classes"]["nbChild"].sum())], style={'marginTop': 25, 'fontSize': 50, 'color': '#4e99f6','textAlign': 'center'}),
+                                    html.H6(children=["Children assigned to Classes"], style={'marginBottom': 25, 'color': 'grey', 'textAlign': 'center'})]),
+                          dbc.Col([html.H4(children=[int(data["classes"]["nbArchivedChildren"].sum())], style={'marginTop': 25, 'fontSize': 50, 'color': '#4e99f6','textAlign': 'center'}),
+                                   html.H6(children=["Archived", html.Br(),"Children"], style={'marginBottom': 25, 'color': 'grey', 'textAlign': 'center'})]),
+                          ], align="center"),
+             ]
+         )
+     ],inverse=True,outline=False,style={'boxShadow':'4px 4px lightgrey'})
+
+    card_classes_map = dbc.Card([dbc.CardBody([dcc.Graph(id="classes_map")] + background_components("classes_map"))],inverse=True, outline=False,style={"border": "none"})
+
+    card_classes_pie_chart = dbc.Card([dbc.CardBody([dcc.Graph(id='public-prive')])],inverse=True,style={"border": "none"})
+
+    card_homeworks_key_metrics_1 = dbc.Card([
+        dbc.CardBody([
+        dbc.Row([dbc.Col(html.Div(children=[data["homeworks"].id.nunique()], style={'fontSize': 50,'color': '#4e99f6','textAlign': 'center'})),], style={'height': 60}, align="end"),
+        dbc.Row([dbc.Col(html.Div(children=["Homeworks Created"], style={'marginBottom': 25, 'textAlign': 'center'})),], style={'height': 20}, align="start"),
+        ])
+    ],color='#F8F4F4',style={"border": "none"})
+
+    card_homeworks_key_metrics_2 = dbc.Card([
+        dbc.CardBody([
+        dbc.Row([dbc.Col(html.Div(children=[data["homeworks"].classId.nunique()], style={'fontSize': 50,'color': '#4e99f6','textAlign': 'center'})),], style={'height': 60}, align="end"),
+        dbc.Row([dbc.Col(html.Div(children=["Classes having Homeworks assigned"], style={'marginBottom': 25, 'textAlign': 'center'})),], style={'height': 20}, align="start"),
+        ])
+    ],color='#F8F4F4',style={"border": "none"})
+
+    card_homeworks_key_metrics_3 = dbc.Card([
+        dbc.CardBody([
+        dbc.Row([dbc.Col(html.Div(children=[data["homeworks"].userId.nunique()], style={'fontSize': 50,'color': '#4e99f6','textAlign': 'center'})),], style={'height': 60}, align="end"),
+        dbc.Row([dbc.Col(html.Div(children=["Unique Authors having created Homeworks"], style={'marginBottom': 25, 'textAlign': 'center'})),], style={'height': 20}, align="start"),
+        ])
+    ],color='#F8F4F4',style={"border": "none"})
+
+    card_homeworks_visualisations_1 = dbc.Card([dbc.CardBody([dcc.Graph(id="homeworks-type", figure=data["panels"]["homeworks_type"])])],color='#F8F4F4',style={"border": "none"})
+
+    card_homeworks_visualisations_2 = dbc.Card([dbc.CardBody([
+        html.P("Homeworks created in the period chosen in the events section",
+               style={'fontSize': 12, 'color': 'grey', 'font-style': 'italic'}),
+        leaderboard_caption(),
+        dash_table.DataTable(id='homeworks-authors', columns=leaderboard_columns("Homeworks Created"),
+                             page_action="custom", page_current=0, sort_action="custom", sort_mode="single", sort_by=[],
+                             filter_action="custom", filter_query="",
+                             style_cell={"TextAlign" : "left",},
+                             style_header={'backgroundColor':'#4e99f6', 'color': 'white', 'fontWeight': 'bold', 'border':'1px solid black'},
+                             style_data_conditional=[{'if':{'row_index':'odd'},  'backgroundColor':'rgb(248,248,248)'}], page_size=5,
+                             style_table={'width':'600px','height':'200px',},
+                             style_as_list_view=True,
+                             export_format="csv",
+                             ),
+        export_links('homeworks-authors')
+                ]
+        )],color='#F8F4F4',style={"border": "none"})
+
+    card_events_key_metrics_1 = dbc.Card([
+         dbc.CardBody([
+                dbc.Row([
+                         dbc.Col([html.H4(id='events-past',style={'marginTop': 25, 'fontSize': 50, 'color': '#4e99f6','textAlign': 'center'}),
+                                   html.H6(children=["Events Passed"],style={'marginBottom': 25, 'textAlign': 'center', 'color': 'grey'})],align="end")
+                        ], align="center"),
+             ])
+     ],inverse=True, outline=False, style={'boxShadow':'-4px -4px lightgrey'})
+
+    card_events_key_metrics_2 = dbc.Card([
+         dbc.CardBody([
+                dbc.Row([
+                         dbc.Col([html.H4(id='events-future', style={'marginTop': 25, 'fontSize': 50, 'color': '#4e99f6','textAlign': 'center'}),
+                                   html.H6(children=["Upcoming Events"],style={'marginBottom': 25, 'textAlign': 'center', 'color': 'grey'})],align="end")
+                        ], align="center"),
+             ])
+     ],inverse=True, outline=False,style={'boxShadow':'4px 4px lightgrey'})
+
+    card_events_key_metrics_3 = dbc.Card([
+         dbc.CardBody([
+                dcc.Graph(id='events-slots'),
+                html.P(children=["PS.: the 'y' axis is in logarithm scale"], style={'fontSize': 10,'color': 'grey','textAlign': 'right','font-style': 'italic',})
+             ])
+     ],inverse=True, outline=False,style={"border": "none"})
+
+    card_events_given_period_1 = dbc.Card([
+         dbc.CardBody([
+                dbc.Row([
+                         dbc.Col([html.H4(id='events-in-this-period',style={'marginTop': 70, 'fontSize': 50, 'color': '#4e99f6','textAlign': 'center'}),
+                                   html.H6(children=["Events in this period (of selected types)"],style={'marginBottom': 70, 'textAlign': 'center', 'color': 'grey'})],align="end")
+                        ], align="center"),
+                ])
+        ],inverse=True, outline=False,style={"border": "none"})
+
+    card_events_given_period_2 = dbc.Card([dbc.CardBody([dbc.Row([dcc.Graph(id='events-dayofweek')], align="center"),])
+                                            ],inverse=True, outline=False,style={"border": "none", 'marginLeft': 50, "width": "50rem", 'textAlign':"center"})
+
+
+    card_events_key_metrics_filter = dbc.Card([
+         dbc.CardBody([
+                dbc.Row([
+                         dcc.Dropdown(id='events-types-key-metrics', options=data["events_options"], value=data["events_types"], multi=True)
+                        ], align="center"),
+             ])
+     ],inverse=True, outline=False,style={'width':'50%'})#style={'boxShadow':'4px 4px lightgrey'})
+
+
+    # Creating layout for the app with content, format and style
+    # (with an id of the page, to tell apart the jobs computing the charts of each page)
+    return html.Div(children=[
+        dcc.Store(id='client-id', data=uuid.uuid4().hex),
+        dbc.Row([dbc.Col(html.Img(src="/static/feamzy-logo-bluebcg.png", alt="Feamzy logo", style={'maxWidth': '50%', 'maxHeight': '50%'}),width=4,align="center"),
+                dbc.Col(html.H1(['Dashboard'], style={'color': 'white', 'offset':3,'marginLeft': 150, 'textShadow': '2px 2px black'}),width=4),
+                dbc.Col(html.H6(['Last update: ',data["last_update"]], style={'color': 'white', 'offset':4,'marginLeft': 150, 'textShadow': '2px 2px black'}),width=4,align="center"),
+                ], style={'backgroundColor':'#4e99f6','position':'sticky', 'top':'0','zIndex': 10, 'border':'1px grey solid','height': '60px'}),
+        html.Div([
+            html.Br(),
+            html.H2('USERS', style={'color':'white','marginLeft': 20, 'textShadow': '2px 2px black'}),
+            dbc.Row([dbc.Col(card_users_key_metrics,width=5), dbc.Col(card_users_evolution, width=7)]),
+            html.Br(),
+            dbc.Row([dbc.Col(card_users_inactive, width=12)]),
+            html.Br(),
+            ],   style={'backgroundColor':'#4e99f6'}),
         html.Br(),
-        html.H3('Key Metrics',style={'marginLeft': 10,'color': '#f8e71c', 'textShadow': '2px 2px black'}),
-        dbc.CardColumns([card_classes_key_metrics_1, card_classes_key_metrics_2, card_classes_key_metrics_3]),
         html.Br(),
-        dbc.Row([dbc.Col(card_classes_map, width=9),
-                 dbc.Col(card_classes_pie_chart,width=3)],align='center'),
-        ],   style={'marginLeft': 10,'marginRight': 10, 'backgroundColor':'white'}),
-        dbc.Row([dcc.Dropdown(id='regions_picker', options=region_options, value=sorted(list(classes.libelle_region.unique())), multi=True,)
-                ],align='center', style={'marginLeft': 40,'marginRight': 40}),
-    html.Br(),
-    html.Br(),
-    html.Div([html.Br(),
-            html.Br(),
-            html.H2('HOMEWORKS', style={'marginLeft': 10, 'marginRight': 10,'color': '#4e99f6', 'textShadow': '2px 2px black'}),
+        html.Div([
+            html.H2('CLASSES & SCHOOLS',style={'marginLeft': 10,'color': '#4e99f6', 'textShadow': '2px 2px black'}),
             html.Br(),
             html.H3('Key Metrics',style={'marginLeft': 10,'color': '#f8e71c', 'textShadow': '2px 2px black'}),
-            dbc.CardGroup([card_homeworks_key_metrics_1, card_homeworks_key_metrics_2, card_homeworks_key_metrics_3]),
-            html.Br(),
-            dbc.CardDeck([card_homeworks_visualisations_1, card_homeworks_visualisations_2]),
+            dbc.CardColumns([card_classes_key_metrics_1, card_classes_key_metrics_2, card_classes_key_metrics_3]),
             html.Br(),
-              ],   style={'backgroundColor':'#F8F4F4'}),
-    html.Div([html.Br(),
-        html.H2('DOCUMENTS', style={'marginLeft': 10, 'marginRight': 10,'color': '#4e99f6', 'textShadow': '2px 2px black'}),
+            dbc.Row([dbc.Col(card_classes_map, width=9),
+                     dbc.Col(card_classes_pie_chart,width=3)],align='center'),
+            ],   style={'marginLeft': 10,'marginRight': 10, 'backgroundColor':'white'}),
+            dbc.Row([dcc.Dropdown(id='regions_picker', options=data["region_options"], value=data["regions"], multi=True,)
+                    ],align='center', style={'marginLeft': 40,'marginRight': 40}),
         html.Br(),
-        html.H3('Key Metrics',style={'marginLeft': 10,'color': '#f8e71c', 'textShadow': '2px 2px black'}),
-        dbc.Row(
-            [dbc.Col(html.Div(children=["Documents Created"], style={'marginBottom': 25, 'color': 'black','textAlign': 'center'}), width=3),
-             dbc.Col(html.Div(), width=6),
-             ], style={'height': 10, 'marginLeft': 10}, align="end"),
-        dbc.Row(
-            [dbc.Col(html.Div(children=[documents.id.nunique()], style={'marginTop': 25, 'fontSize': 50,'color': '#4e99f6','textAlign': 'center'}),width=3),
-             dbc.Col(html.Div(dcc.Graph(id='documents_type')),width=6),
-             ], style={'height': 350, 'marginLeft': 10}, align="start")
-        ],   style={'backgroundColor':'lightgrey'}),
-    html.Br(),
-    html.Br(),
-    html.H2('EVENTS', style={'marginLeft': 10,'color': '##4e99f6', 'border':'1px red', 'textShadow': '2px 2px black'}),
-    html.Br(),
-    html.Div([
-            dbc.Row([html.H3('Key Metrics',style={'marginLeft': 50,'color': '#f8e71c', 'textShadow': '2px 2px black'})],align="center"),
+        html.Br(),
+        html.Div([html.Br(),
+                html.Br(),
+                html.H2('HOMEWORKS', style={'marginLeft': 10, 'marginRight': 10,'color': '#4e99f6', 'textShadow': '2px 2px black'}),
+                html.Br(),
+                html.H3('Key Metrics',style={'marginLeft': 10,'color': '#f8e71c', 'textShadow': '2px 2px black'}),
+                dbc.CardGroup([card_homeworks_key_metrics_1, card_homeworks_key_metrics_2, card_homeworks_key_metrics_3]),
+                html.Br(),
+                dbc.CardDeck([card_homeworks_visualisations_1, card_homeworks_visualisations_2]),
+                html.Br(),
+                  ],   style={'backgroundColor':'#F8F4F4'}),
+        html.Div([html.Br(),
+            html.H2('DOCUMENTS', style={'marginLeft': 10, 'marginRight': 10,'color': '#4e99f6', 'textShadow': '2px 2px black'}),
             html.Br(),
-            dbc.Row([dcc.Dropdown(id='events-types-key-metrics', options=events_types, value=sorted(list(events.eventType.fillna("NOT ASSIGNED").unique())), multi=True)
-                    ],align="center",style={'marginLeft': 500,})
-            ]),
-    html.Br(),
-    dbc.Row([dbc.Col(card_events_key_metrics_1, width=3),
-             dbc.Col(card_events_key_metrics_2, width=3),
-             dbc.Col(card_events_key_metrics_3, width=6)
-             ], align='center', style={'marginLeft': 20}),
-    html.Br(),
-    html.Div(dbc.Row([
-        html.H3('Given Period Analysis',style={'marginLeft': 50,'color': '#f8e71c', 'textShadow': '2px 2px black'}),
-    ],align="center")),
-    html.Br(),
-    html.Div([dbc.Row(html.H5('Filter for all the Analysis below', style={'marginLeft': 500, 'marginRight': 0, 'textAlign': 'center'}), style={'textAlign': 'center'}),
-              dbc.Row([dbc.Col(html.H6('Dates Filter'),width =6),
-                       dbc.Col(html.H6('Events Type Filter'),width =6)
-                       ], align="center",style={'marginLeft': 10, 'marginRight': 10, 'textAlign': 'center'}),
-              dbc.Row([dbc.Col([
-                    dcc.DatePickerRange(id="selected-dates-events", calendar_orientation='horizontal',
-                                       day_size=20, end_date_placeholder_text="End date", with_portal=False,
-                                       first_day_of_week=0, reopen_calendar_on_clear=True, is_RTL=False,
-                                       clearable=False, number_of_months_shown=3,
-                                       min_date_allowed=dt(2020, 1, 1),
-                                       max_date_allowed=dt(2022, 12, 31),
-                                       initial_visible_month=dt(2021, 1, 1),
-                                       start_date=dt(2020, 8, 1).date(),
-                                       end_date=pd.to_datetime("today").date(),
-                                       display_format="DD-MMMM-YYYY", minimum_nights=6,
-                                       persistence=True, persisted_props=["start_date"],
-                                       persistence_type="session", updatemode="singledate")]),
-                      dbc.Col(dcc.Dropdown(id='events-types', options=events_types, value=sorted(list(events.eventType.fillna("NOT ASSIGNED").unique())), multi=True))#,width=6,align="center")
-                      ],style={'marginLeft': 10, 'marginRight': 10, 'textAlign': 'center'})
-              ], style={'marginLeft': 100, 'marginRight': 100, 'border':'1px solid lightgrey','border-radius': 10}),
-    html.Br(),
-    dbc.CardColumns([card_events_given_period_1, card_events_given_period_2]),
-    html.Br(),
-    dbc.Row([dbc.Col(html.Div(dcc.Graph(id='events-wordcloud')),width=8),
-            dbc.Col(dash_table.DataTable(
-                id='events-authors',
-                style_cell={"TextAlign" : "left",},
-                style_header={'backgroundColor':'#4e99f6', 'color': 'white', 'fontWeight': 'bold', 'border':'1px solid black'},
-                style_data_conditional=[{'if':{'row_index':'odd'},  'backgroundColor':'rgb(248,248,248)'}],
-                page_size=15,
-                style_table={'width':'400px','height':'500px',},
-                style_as_list_view=True,
-                export_format="csv",
-            ),width=4)]),
-    html.Div(),
-    html.Br(),
-    html.H2('NOTIFICATIONS',style={'marginLeft': 10,'color': '#4e99f6', 'textShadow': '2px 2px black'}),
-    html.Br(),
-    html.Div([dbc.Row(html.H5('Filter for all the Analysis below', style={'marginLeft': 500, 'marginRight': 0, 'textAlign': 'center'}), style={'textAlign': 'center'}),
-              dbc.Row([dbc.Col(html.H6('Dates Filter'),width =6),
-                       dbc.Col(html.H6('Notifications Type Filter'),width =6)
-                       ], align="center",style={'marginLeft': 10, 'marginRight': 10, 'textAlign': 'center'}),
-              dbc.Row([dbc.Col(dcc.DatePickerRange(id="selected-dates-notifications",calendar_orientation='horizontal',day_size=20,end_date_placeholder_text="End date",with_portal=False,
-                             first_day_of_week=0,reopen_calendar_on_clear=True,is_RTL=False,clearable=False,number_of_months_shown=3,min_date_allowed=dt(2020,1,1),
-                             max_date_allowed=pd.to_datetime("today").date(),initial_visible_month=dt(2021,1,1),
-                             start_date=dt(2020, 8, 1).date(), end_date=pd.to_datetime("today").date(),display_format="DD-MMMM-YYYY",minimum_nights=6,
-                             persistence=True,persisted_props=["start_date"],persistence_type="session",updatemode="singledate",style={'width':'500px','height':'100px',}
-                             )),
-                      dbc.Col(dcc.Dropdown(id='notifications-types', options=notifications_group, value=sorted(list(notifications.Group.fillna("NOT ASSIGNED").unique())), multi=True))
-                      ],style={'marginLeft': 10, 'marginRight': 10, 'textAlign': 'center'})
-              ], style={'marginLeft': 100, 'marginRight': 100, 'border':'1px solid lightgrey','border-radius': 10}),
-    html.Div(dcc.Graph(id='notifications-treemap')),
-    html.Div(dcc.Graph(id='notifications-wordcloud')),
-    html.Br(),
-    html.Div(),
-])
+            html.H3('Key Metrics',style={'marginLeft': 10,'color': '#f8e71c', 'textShadow': '2px 2px black'}),
+            dbc.Row(
+                [dbc.Col(html.Div(children=["Documents Created"], style={'marginBottom': 25, 'color': 'black','textAlign': 'center'}), width=3),
+                 dbc.Col(html.Div(), width=6),
+                 ], style={'height': 10, 'marginLeft': 10}, align="end"),
+            dbc.Row(
+                [dbc.Col(html.Div(children=[data["documents"].id.nunique()], style={'marginTop': 25, 'fontSize': 50,'color': '#4e99f6','textAlign': 'center'}),width=3),
+                 dbc.Col(html.Div(dcc.Graph(id='documents_type', figure=data["panels"]["doc_type"])),width=6),
+                 ], style={'height': 350, 'marginLeft': 10}, align="start")
+            ],   style={'backgroundColor':'lightgrey'}),
+        html.Br(),
+        html.Br(),
+        html.H2('EVENTS', style={'marginLeft': 10,'color': '##4e99f6', 'border':'1px red', 'textShadow': '2px 2px black'}),
+        html.Br(),
+        html.Div([
+                dbc.Row([html.H3('Key Metrics',style={'marginLeft': 50,'color': '#f8e71c', 'textShadow': '2px 2px black'})],align="center"),
+                html.Br(),
+                dbc.Row([dcc.Dropdown(id='events-types-key-metrics', options=data["events_options"], value=data["events_types"], multi=True)
+                        ],align="center",style={'marginLeft': 500,})
+                ]),
+        html.Br(),
+        dbc.Row([dbc.Col(card_events_key_metrics_1, width=3),
+                 dbc.Col(card_events_key_metrics_2, width=3),
+                 dbc.Col(card_events_key_metrics_3, width=6)
+                 ], align='center', style={'marginLeft': 20}),
+        html.Br(),
+        html.Div(dbc.Row([
+            html.H3('Given Period Analysis',style={'marginLeft': 50,'color': '#f8e71c', 'textShadow': '2px 2px black'}),
+        ],align="center")),
+        html.Br(),
+        html.Div([dbc.Row(html.H5('Filter for all the Analysis below', style={'marginLeft': 500, 'marginRight': 0, 'textAlign': 'center'}), style={'textAlign': 'center'}),
+                  dbc.Row([dbc.Col(html.H6('Dates Filter'),width =6),
+                           dbc.Col(html.H6('Events Type Filter'),width =6)
+                           ], align="center",style={'marginLeft': 10, 'marginRight': 10, 'textAlign': 'center'}),
+                  dbc.Row([dbc.Col([
+                        dcc.DatePickerRange(id="selected-dates-events", calendar_orientation='horizontal',
+                                           day_size=20, end_date_placeholder_text="End date", with_portal=False,
+                                           first_day_of_week=0, reopen_calendar_on_clear=True, is_RTL=False,
+                                           clearable=False, number_of_months_shown=3,
+                                           min_date_allowed=dt(2020, 1, 1),
+                                           max_date_allowed=dt(2022, 12, 31),
+                                           initial_visible_month=dt(2021, 1, 1),
+                                           start_date=dt(2020, 8, 1).date(),
+                                           end_date=pd.to_datetime("today").date(),
+                                           display_format="DD-MMMM-YYYY", minimum_nights=6,
+                                           persistence=True, persisted_props=["start_date"],
+                                           persistence_type="session", updatemode="singledate")]),
+                          dbc.Col(dcc.Dropdown(id='events-types', options=data["events_options"], value=data["events_types"], multi=True))#,width=6,align="center")
+                          ],style={'marginLeft': 10, 'marginRight': 10, 'textAlign': 'center'}),
+                  dcc.Store(id='events-selection'),
+                  export_links('events')
+                  ], style={'marginLeft': 100, 'marginRight': 100, 'border':'1px solid lightgrey','border-radius': 10}),
+        html.Br(),
+        dbc.CardColumns([card_events_given_period_1, card_events_given_period_2]),
+        html.Br(),
+        dbc.Row([dbc.Col(html.Div([dcc.Graph(id='events-wordcloud')] + background_components('events-wordcloud')),width=8),
+                dbc.Col([leaderboard_caption(), dash_table.DataTable(
+                    id='events-authors', columns=leaderboard_columns("Events Created"),
+                    page_action="custom", page_current=0, sort_action="custom", sort_mode="single", sort_by=[],
+                    filter_action="custom", filter_query="",
+                    style_cell={"TextAlign" : "left",},
+                    style_header={'backgroundColor':'#4e99f6', 'color': 'white', 'fontWeight': 'bold', 'border':'1px solid black'},
+                    style_data_conditional=[{'if':{'row_index':'odd'},  'backgroundColor':'rgb(248,248,248)'}],
+                    page_size=15,
+                    style_table={'width':'400px','height':'500px',},
+                    style_as_list_view=True,
+                    export_format="csv",
+                ), export_links('events-authors')],width=4)]),
+        html.Div(),
+        html.Br(),
+        html.H2('NOTIFICATIONS',style={'marginLeft': 10,'color': '#4e99f6', 'textShadow': '2px 2px black'}),
+        html.Br(),
+        html.Div([dbc.Row(html.H5('Filter for all the Analysis below', style={'marginLeft': 500, 'marginRight': 0, 'textAlign': 'center'}), style={'textAlign': 'center'}),
+                  dbc.Row([dbc.Col(html.H6('Dates Filter'),width =6),
+                           dbc.Col(html.H6('Notifications Type Filter'),width =6)
+                           ], align="center",style={'marginLeft': 10, 'marginRight': 10, 'textAlign': 'center'}),
+                  dbc.Row([dbc.Col(dcc.DatePickerRange(id="selected-dates-notifications",calendar_orientation='horizontal',day_size=20,end_date_placeholder_text="End date",with_portal=False,
+                                 first_day_of_week=0,reopen_calendar_on_clear=True,is_RTL=False,clearable=False,number_of_months_shown=3,min_date_allowed=dt(2020,1,1),
+                                 max_date_allowed=pd.to_datetime("today").date(),initial_visible_month=dt(2021,1,1),
+                                 start_date=dt(2020, 8, 1).date(), end_date=pd.to_datetime("today").date(),display_format="DD-MMMM-YYYY",minimum_nights=6,
+                                 persistence=True,persisted_props=["start_date"],persistence_type="session",updatemode="singledate",style={'width':'500px','height':'100px',}
+                                 )),
+                          dbc.Col(dcc.Dropdown(id='notifications-types', options=data["notifications_options"], value=data["notifications_groups"], multi=True))
+                          ],style={'marginLeft': 10, 'marginRight': 10, 'textAlign': 'center'}),
+                  export_links('notifications')
+                  ], style={'marginLeft': 100, 'marginRight': 100, 'border':'1px solid lightgrey','border-radius': 10}),
+        html.Div([dcc.Graph(id='notifications-treemap')] + background_components('notifications-treemap')),
+        html.Div([dcc.Graph(id='notifications-wordcloud')] + background_components('notifications-wordcloud')),
+        html.Br(),
+        html.Div(),
+    ])
+
+
+# Loading the first snapshot, which the layout is created from
+if not LAZY_START:
+    swap_snapshot(load_snapshot())
+
+app.layout = serve_layout
+
+
+# Sections of the dashboard whose callbacks share the filters (and the rows selected by them): database and column filtered
+# by the dropdown of the section (None when the section only has dates)
+SECTIONS = {"users": ("users", None), "events": ("events", "eventType")}
+
+
+# Filters of a section, normalised once per change: the selection (its filters and the key of its rows) is kept by a
+# dcc.Store that the callbacks drawing the section take as input. The rows are only selected by the callbacks needing
+# them (see "selected_rows"), most callbacks reading counts prepared at load
+def make_selection(section, values, start_date, end_date):
+    selection = {"section": section, "values": normalise_input(values),
+                 "start_date": normalise_input(start_date), "end_date": normalise_input(end_date)}
+    selection["key"] = selection_key(section, [selection["values"], selection["start_date"], selection["end_date"]])
+    end_phase("filtering")
+
+    return selection
+
+
+# Rows of a selection, selected once for all the callbacks and workers needing them (see "shared_selection"), the key being
+# made again from its filters and the version of "data" (the selection comes from the browser, and may have been made from a
+# previous version of the data)
+def selected_rows(data, selection):
+    name, column = SECTIONS[selection["section"]]
+    filters = [selection["values"], selection["start_date"], selection["end_date"]]
+    return shared_selection(selection["section"], filters, data["version"],
+                            lambda: select_rows(data[name], selection["start_date"], selection["end_date"], column, selection["values"]))
+
+
+# Computing a slow callback in the background (see "job_functions"), to register instead of "@app.callback": when its
+# inputs change, its result is sent at once if it is in the cache. Otherwise a job computes it while the chart shows that
+# it is loading, and the page asks for the result every half second until the job is done; changing the filters again
+# replaces the job. The function has to be memoized, the result of the job being read from the cache
+background_callbacks = {}
+
+
+def background_callback(output, inputs, function):
+    component_id = output.component_id
+    register_job(function.__name__, function)
+    background_callbacks[function.__name__] = (function, len(inputs))
+
+    def run_in_background(*values):
+        args, job, client = list(values[:len(inputs)]), values[-2], values[-1]
+        polled = [trigger["prop_id"] for trigger in dash.callback_context.triggered] == [component_id + "-poll.n_intervals"]
+        if polled and job is not None:
+            args = job["args"]
+
+        found, result = function.cached(*args)
+        if found:
+            return result, True, None
+
+        if polled:
+            status, error = ("superseded", None) if job is None else job_status(job["slot"], job["job"])
+            if status == "failed":
+                print("Background job {} failed: {}".format(function.__name__, error))
+                return message_figure("This chart couldn't be computed"), True, None
+            if status in ["done", "lost"]:
+                # the result was computed but couldn't be read from the cache, or the job was deleted with the previous data
+                return function(*args), True, None
+            if status == "superseded":
+                return dash.no_update, True, dash.no_update
+            return dash.no_update, False, dash.no_update
+
+        if JOB_WORKERS == 0:
+            return function(*args), True, None
+
+        slot = "{} {}".format(client, component_id)
+        job = submit_job(slot, function.__name__, args)
+        return message_figure("Loading..."), False, {"slot": slot, "job": job, "args": args}
+
+    run_in_background.__name__ = function.__name__
+    app.callback([output, Output(component_id + "-poll", "disabled"), Output(component_id + "-job", "data")],
+                 inputs + [Input(component_id + "-poll", "n_intervals")],
+                 [State(component_id + "-job", "data"), State("client-id", "data")])(run_in_background)
 
 
 # Creating the interactive parts of the app (graphs visualisations and filters mainly)
 
-@app.callback(Output('users-evolution', 'figure'),[Input('selected-dates-users', 'start_date'),Input('selected-dates-users', 'end_date')])
-def users_evolution(start_date, end_date):
-    start_date = pd.to_datetime(start_date).date()
-    end_date = pd.to_datetime(end_date).date()
+@app.callback(Output('users-selection', 'data'),[Input('selected-dates-users', 'start_date'),Input('selected-dates-users', 'end_date')])
+def select_users(start_date, end_date):
+    return make_selection("users", None, start_date, end_date)
+
+
+@app.callback(Output('events-selection', 'data'),
+              [Input('events-types', 'value'), Input('selected-dates-events', 'start_date'),Input('selected-dates-events', 'end_date')])
+def select_events(events_types, start_date, end_date):
+    return make_selection("events", events_types, start_date, end_date)
 
-    df = dataset_with_correct_dates(users[["id", "creationDate"]].copy(), "creationDate", start_date, end_date)
 
-    df["creationDate"] = pd.to_datetime(df["creationDate"]).dt.date
-    df["Count"] = 1
-    dff = df.groupby("creationDate").sum()
-    dff["Evolution"] = dff.sort_values(by="creationDate").Count.cumsum()
-    dff = dff.loc[start_date:end_date]
+# Maximum number of points of the line of the cumulated new users: the line of a longer period is downsampled
+USERS_EVOLUTION_POINTS = 500
+
+@app.callback(Output('users-evolution', 'figure'),[Input('users-selection', 'data'), Input('users-granularity', 'value')])
+@memoize()
+def users_evolution(selection, granularity):
+    from plotly.subplots import make_subplots
+
+    data = get_snapshot()
+
+    dff = rollup_between(data["users_rollups"], granularity, selection["start_date"], selection["end_date"])
+    line = dff.iloc[downsample_line(dff.index.asi8, dff['Evolution'].to_numpy(), USERS_EVOLUTION_POINTS)]
+    end_phase("filtering")
 
     fig = make_subplots(specs=[[{"secondary_y": True}]])
 
-    fig.add_bar(x=dff.index, y=dff.Count, name="New daily users", secondary_y=False, marker=dict(color="#2dd36f"))
-    fig.add_trace(go.Scatter(x=dff.index, y=dff['Evolution'], name="Cumulated New Users in chosen period", marker=dict(color="#7039bd")), secondary_y=True)
+    fig.add_bar(x=dff.index, y=dff.Count, name="New {} users".format({"day": "daily", "week": "weekly", "month": "monthly"}[granularity]),
+                secondary_y=False, marker=dict(color="#2dd36f"))
+    fig.add_trace(go.Scatter(x=line.index, y=line['Evolution'], name="Cumulated New Users in chosen period", marker=dict(color="#7039bd")), secondary_y=True)
 
     fig.layout.paper_bgcolor = 'rgba(0,0,0,0)'
 
@@ -435,73 +745,44 @@ def users_evolution(start_date, end_date):
                         width=800, height=550,
                         legend=dict(yanchor="top",y=0.99,xanchor="left",x=0.01, font=dict(color="black")),
                         xaxis={'showgrid': False},yaxis={'showgrid': False},yaxis2={'showgrid': False,"overlaying":"y","zeroline":False})
+    end_phase("figure")
 
     return fig
 
-@app.callback([Output('unique-schools', 'children'),Output('schools-without-children', 'children')],[Input('selected-dates-users', 'start_date'),Input('selected-dates-users', 'end_date')])
-def school_number(start_date, end_date):
-    df = classes.groupby("schoolid").sum()["nbChild"]
-
-    return [classes.schoolid.nunique()], [df[df < 1].shape[0]]
 
-@app.callback([Output('unique-classes', 'children'),Output('classes-without-children', 'children')],[Input('selected-dates-users', 'start_date'),Input('selected-dates-users', 'end_date')])
-def classes_number(start_date, end_date):
-    df = classes.groupby("id").sum()["nbChild"]
+# Users signed up in the period of the users section without any activity in this period, found with the index of the
+# activities of the users built at load. Computed once for all the pages of the report, paged, sorted and filtered by the server
+@memoize()
+def inactive_users_report(selection):
+    data = get_snapshot()
+    rows = users_without_activity(data["users_activities"], selected_rows(data, selection), selection["start_date"], selection["end_date"])
+    return data["users_activity_table"].iloc[rows]
 
-    return [classes.id.nunique()], [df[df < 1].shape[0]]
+@app.callback([Output('inactive-users', 'data'),Output('inactive-users', 'page_count')],
+              [Input('users-selection', 'data'), Input('inactive-users', 'page_current'), Input('inactive-users', 'page_size'),
+               Input('inactive-users', 'sort_by'), Input('inactive-users', 'filter_query')])
+@memoize()
+def inactive_users(selection, page_current, page_size, sort_by, filter_query):
+    report = inactive_users_report(selection)
+    end_phase("filtering")
 
-@app.callback(Output('children_number', 'figure'),[Input('selected-dates-users', 'start_date'),Input('selected-dates-users', 'end_date')])
-def children_number(start_date, end_date):
-    df = users.groupChildSize.value_counts().reset_index()
-    df.rename(columns={'index': 'Number of Children', 'groupChildSize': "Number of Users"}, inplace=True)
-    fig = px.bar(df, df["Number of Children"], df["Number of Users"], color_discrete_sequence=['#2dd36f','#4e99f6'], log_y=True, hover_name=df["Number of Users"])
+    page = table_page(report, page_current, page_size, sort_by, filter_query)
+    end_phase("figure")
 
-    fig.layout.paper_bgcolor = 'rgba(0,0,0,0)'
-    fig.layout.plot_bgcolor = 'rgba(0,0,0,0)'
-    fig.update_layout(
-        margin={"r": 0, "t": 40, "l": 0, "b": 0},
-        title_text='Relationship between User and number of Children', title_font={'color': '#FFF'}, font_color='white',
-        width=500, height=250, xaxis={'showgrid': False}, yaxis={'showgrid': False}
-        )
-
-    return fig
-
-
-# Try out to identify users without any activity, but it didn't work very well:
-
-# @app.callback([Output('inactive-users', 'data'),Output('inactive-users', 'columns')],
-#               [Input('selected-dates-users', 'start_date'),Input('selected-dates-users', 'end_date')])
-# def users_without_activities(start_date, end_date):
-#
-#     df = users.copy()
-#     df = dataset_with_correct_dates(df, "creationDate", start_date, end_date)
-#
-#     df = df[['id', 'username', 'firstName', 'lastName', 'nbPhoneNumbers', 'nbEmails', 'city', 'groupChildSize',
-#              'creationDate', 'lastModificationDate']]
-#
-#     df_homeworks = dataset_with_correct_dates(homeworks, "creationDate", dt(2020, 1, 1).date(), end_date)
-#     df_events = dataset_with_correct_dates(events, "creationDate", start_date, end_date)
-#     df_documents = dataset_with_correct_dates(documents, "creationDate", start_date, end_date)
-#
-#     #active_users = list(set(list(df_homeworks.userId.unique()) + list(df_events.author.unique())))
-#     active_users = list(set(list(df_homeworks.userId.unique())+list(df_events.author.unique())+list(df_documents.userId.unique())))
-#
-#     df = df[~df.id.isin(active_users)]
-#
-#     data_columns = [{"name": i, "id": i} for i in df.columns]
-#     data = df.to_dict('records')
-#
-#     return data, data_columns
+    return page
 
 
 @app.callback(Output('public-prive', 'figure'),[Input('regions_picker', 'value')])
+@memoize()
 def pie_public_prive(selected_regions):
-    classes_filtered = classes[classes.libelle_region.isin(selected_regions)]
-    df = pd.DataFrame(classes_filtered.groupby(["schoolid", "secteur_public_prive_libe"]).count()['id']).reset_index()
-    df.secteur_public_prive_libe.value_counts()
+    data = get_snapshot()
 
-    fig = go.Figure(data=[go.Pie(labels=df.secteur_public_prive_libe.value_counts().index,
-                                 values=df.secteur_public_prive_libe.value_counts().values,
+    df = data["sectors_by_region"].loc[data["sectors_by_region"].index.isin(selected_regions)].sum()
+    df = df[df > 0].sort_values(ascending=False)
+    end_phase("filtering")
+
+    fig = go.Figure(data=[go.Pie(labels=df.index,
+                                 values=df.values,
                                  insidetextfont={'color':'white'}, hole=.4,)])
 
     fig.layout.paper_bgcolor = 'rgba(0,0,0,0)'
@@ -515,24 +796,21 @@ def pie_public_prive(selected_regions):
         width=250, height=250, title_font = {'color': 'black'},
         font_color='black',
         )
+    end_phase("figure")
 
     return fig
 
-@app.callback(Output('classes_map', 'figure'),
-                 [Input('regions_picker', 'value')])
+@memoize()
 def update_map(selected_regions):
+    import plotly.express as px
+
     if selected_regions ==[]:
         return dash.no_update
 
-    with urlopen('https://france-geojson.gregoiredavid.fr/repo/departements.geojson') as response:
-        france = json.load(response)
-
-    classes_filtered = classes[classes.libelle_region.isin(selected_regions)]
-    df1 = classes_filtered.groupby("schoolid").sum().drop(columns=["code_postal_uai","coordinatesLat","coordinatesLong"])
-    df2 = classes[["schoolid","secteur_public_prive_libe","appellation_officielle","libelle_commune","localite_acheminement_uai","libelle_departement","libelle_region","code_postal_uai","geometry_type","coordinatesLat","coordinatesLong"]]
-
-    classes_filtered = pd.merge(df1, df2, on="schoolid")
-    classes_filtered.rename(columns={"appellation_officielle":"Nom de l'Ecole","secteur_public_prive_libe":"Secteur","nbChild":"Children assigned","nbArchivedChildren":"Children archived"}, inplace=True)
+    data = get_snapshot()
+    classes_filtered = schools_in_regions(data["schools"], data["schools_by_region"], selected_regions)
+    classes_filtered = classes_filtered.astype({"secteur_public_prive_libe": str}).rename(columns={"appellation_officielle":"Nom de l'Ecole","secteur_public_prive_libe":"Secteur","nbChild":"Children assigned","nbArchivedChildren":"Children archived"})
+    end_phase("filtering")
 
     fig = go.Figure(px.scatter_mapbox(classes_filtered, lat="coordinatesLat", lon="coordinatesLong", size="Children assigned", color='Secteur',
                                       color_discrete_map={'Public':'#4e99f6', 'Privé':'#2dd36f'},
@@ -544,93 +822,42 @@ def update_map(selected_regions):
         title_text = 'Schools per Region',
         mapbox=go.layout.Mapbox(style="carto-positron",
                                zoom=4.5, center_lat=47, center_lon=3,
-                               layers=[{
-                                   'sourcetype': 'geojson',
-                                   'source': france,
-                                   'type': 'line',
-                                   'color': '#7039bd',
-                                   'opacity':0.1,
-                                   'below': "True",
-                               }]
+                               layers=[departements_layer]
                                ))
+    end_phase("figure")
     return fig
 
-@app.callback([Output('homeworks-authors', 'data'),Output('homeworks-authors', 'columns')],[Input('selected-dates-events', 'start_date'),Input('selected-dates-events', 'end_date')])
-def homeworks_authors(start_date, end_date):
-    df = homeworks[["id", "userId", "creationDate"]].copy()
-
-    homeworks_authors = df.groupby("userId").count()["id"].sort_values(ascending=False).reset_index().rename(columns={"userId": "Author", "id": "Homeworks Created"})
-    homeworks_authors["Rank"] = homeworks_authors["Homeworks Created"].rank(ascending=False)
-    homeworks_authors["Rank"] = homeworks_authors["Rank"].apply(int)
-    homeworks_authors = homeworks_authors[["Rank", "Author", "Homeworks Created"]]
-
-    data_columns = [{"name": i, "id": i} for i in homeworks_authors.columns]
-    data = homeworks_authors.to_dict('records')
-
-    return data, data_columns
-
-@app.callback(Output('homeworks-type', 'figure'),[Input('regions_picker', 'value')])
-def homeworks_type(selected_regions):
-    df = pd.DataFrame(homeworks.type.value_counts()).reset_index()
-    df.rename(columns={'index': "Type", "type": "Number"}, inplace=True)
-
-    fig = px.bar(df, x=df.Number, y=df.Type, color_discrete_sequence=["#2dd36f"])
-
-    fig.layout.paper_bgcolor = 'rgba(0,0,0,0)'
-    fig.layout.plot_bgcolor = 'rgba(0,0,0,0)'
-    fig.update_layout(
-        margin={"r": 0, "t": 40, "l": 0, "b": 0},
-        title_text='Homeworks Type', title_x=0.5, xaxis={'showgrid': False},yaxis={'showgrid': False},
-        width=400, height=200
-        )
-
-    return fig
-
-@app.callback(Output('documents_type', 'figure'),[Input('regions_picker', 'value')])
-def doc_type(selected_regions):
-    df = pd.DataFrame(documents.type.value_counts()).reset_index()
-    df.rename(columns={'index': "Type", "type": "Number"}, inplace=True)
-
-    fig = go.Figure(data=[go.Pie(labels=df["Type"],
-                                 values=df["Number"],
-                                 insidetextfont={'color': 'white'},hole=.4)])
-    fig.layout.paper_bgcolor = 'rgba(0,0,0,0)'
-
-    colors = ['#4e99f6', '#2dd36f']
-    fig.update_traces(hoverinfo='label+percent', textinfo='value', marker=dict(colors=colors))
-
-    fig.update_layout(showlegend=True,
-                      margin={"r": 0, "t": 40, "l": 0, "b": 0},
-                      title_text='Documents Types', title_x=0.5,  # title_y=0.9,
-                      width=350, height=350, title_font={'color': 'black'},
-                      font_color='black')
-
-    return fig
+background_callback(Output('classes_map', 'figure'), [Input('regions_picker', 'value')], update_map)
 
 @app.callback([Output(component_id='events-past', component_property='children'),Output(component_id='events-future', component_property='children')],
               [Input('events-types-key-metrics', 'value')])
+@memoize(today=True)
 def events_today(events_types):
     if events_types == []:
         return dash.no_update
 
-    df = events[["id", "eventType", "firstPeriods-startDate"]].copy()
-    df["eventType"].fillna('NOT ASSIGNED', inplace=True)
-    df = df.loc[df["eventType"].isin(events_types)]
+    data = get_snapshot()
+    today = pd.to_datetime("today").date()
+    past = counts_between(data["events_counts"], None, today)
+    future = counts_between(data["events_counts"], today, None)
+    end_phase("filtering")
 
-    dff = dataset_with_correct_dates(df, "firstPeriods-startDate", df["firstPeriods-startDate"].fillna("2020-01-01").min(), pd.to_datetime("today").date())
-    dfff = dataset_with_correct_dates(df, "firstPeriods-startDate", pd.to_datetime("today").date(), df["firstPeriods-startDate"].fillna("2020-01-01").max())
-
-    return [dff.id.nunique()], [dfff.id.nunique()]
+    return [int(past[counts_with_values(past, "eventType", events_types)].sum())], [int(future[counts_with_values(future, "eventType", events_types)].sum())]
 
 @app.callback(Output('events-slots', 'figure'),[Input('events-types-key-metrics', 'value')])
+@memoize()
 def events_slots(events_types):
+    import plotly.express as px
+
     if events_types == []:
         return dash.no_update
 
-    df = events.loc[events["eventType"].isin(events_types)]
+    data = get_snapshot()
+    df = data["events"].loc[data["events"]["eventType"].isin(events_types)]
 
     df = df.nbPeriods.value_counts().reset_index()
     df.rename(columns={"index": "Number of Time Slots", "nbPeriods": "Number of Events Created"}, inplace=True)
+    end_phase("filtering")
 
     fig = px.bar(df, df["Number of Time Slots"], df["Number of Events Created"], color_discrete_sequence=['#2dd36f','#4e99f6'], log_y=True)
 
@@ -642,46 +869,39 @@ def events_slots(events_types):
         title_text='Number of Slots chosen in all Events Created', title_font={'color': 'grey'}, font_color='grey',
         width=500, height=250, xaxis={'showgrid': False}, yaxis={'showgrid': False}
         )
+    end_phase("figure")
 
     return fig
 
 @app.callback([Output(component_id='events-in-this-period', component_property='children')],
-              [Input('events-types', 'value'),Input('selected-dates-events', 'start_date'),Input('selected-dates-events', 'end_date')])
-def events_in_this_period(events_types, start_date, end_date):
-    if events_types == []:
+              [Input('events-selection', 'data')])
+@memoize()
+def events_in_this_period(selection):
+    if selection["values"] == []:
         return dash.no_update
 
-    df = events[["id", "eventType", "firstPeriods-startDate"]].copy()
-    df["eventType"].fillna('NOT ASSIGNED', inplace=True)
-    df = df.loc[df["eventType"].isin(events_types)]
+    data = get_snapshot()
+    df = counts_between(data["events_counts"], selection["start_date"], selection["end_date"])
+    end_phase("filtering")
 
-    df = dataset_with_correct_dates(df, "firstPeriods-startDate", start_date, end_date)
+    return [int(df[counts_with_values(df, "eventType", selection["values"])].sum())]
 
-    return [df.id.nunique()]
+@app.callback(Output('events-dayofweek', 'figure'),[Input('events-selection', 'data')])
+@memoize()
+def events_dayofweek(selection):
+    import plotly.express as px
 
-@app.callback(Output('events-dayofweek', 'figure'),[Input('events-types', 'value'),Input('selected-dates-events', 'start_date'),Input('selected-dates-events', 'end_date')])
-def events_dayofweek(events_types, start_date, end_date):
-    if events_types == []:
+    if selection["values"] == []:
         return dash.no_update
 
-    df = events[["id", "eventType", "firstPeriods-startDate"]].copy()
-    df["eventType"].fillna('NOT ASSIGNED', inplace=True)
-
-    df = df.loc[df["eventType"].isin(events_types)]
-
-    df = dataset_with_correct_dates(df, "firstPeriods-startDate", start_date, end_date)
-
-    df['firstPeriods-startDate'] = pd.to_datetime(df['firstPeriods-startDate']).dt.dayofweek
-    days_dict = {0: "MONDAY", 1: "TUESDAY", 2: "WEDNESDAY", 3: "THURSDAY", 4: "FRIDAY", 5: "SATURDAY", 6: "SUNDAY"}
-    df['firstPeriods-startDate'] = df['firstPeriods-startDate'].apply(lambda x: days_dict[x])
+    data = get_snapshot()
+    df = counts_between(data["events_counts"], selection["start_date"], selection["end_date"])
+    df = df[counts_with_values(df, "eventType", selection["values"]) & (df > 0)].rename("Number of Events").reset_index()
 
-    df = df.groupby(by=["eventType", "firstPeriods-startDate"]).count()
-    df.reset_index(inplace=True)
-    days_dict = {"MONDAY": 0, "TUESDAY": 1, "WEDNESDAY": 2, "THURSDAY": 3, "FRIDAY": 4, "SATURDAY": 5, "SUNDAY": 6}
-    df["day_number"] = df["firstPeriods-startDate"].apply(lambda x: days_dict[x])
-    df.set_index("day_number", inplace=True)
-    df.rename(columns={"eventType": "Event Type", "firstPeriods-startDate": "Day of the Week", "id": "Number of Events"},inplace=True)
-    df = df.sort_values(by=["day_number","Number of Events"],ascending=[True, False])
+    df["Day of the Week"] = np.array(days_of_the_week)[df["weekday"]]
+    df["Event Type"] = df["eventType"].astype(str)
+    df = df.sort_values(by=["weekday", "Number of Events"], ascending=[True, False])
+    end_phase("filtering")
 
     fig = px.bar(df, x='Day of the Week', y='Number of Events', color='Event Type',color_discrete_sequence=["#4e99f6","#2dd36f","#7039bd","#f8e71c"])#,barmode='group')
 
@@ -692,33 +912,18 @@ def events_dayofweek(events_types, start_date, end_date):
         title_text='Events per Day of the Week', title_x=0.5, xaxis={'showgrid': False},yaxis={'showgrid': False},
         width=850, height=250
         )
+    end_phase("figure")
 
     return fig
 
-@app.callback(Output('events-wordcloud', 'figure'),
-                 [Input('events-types', 'value'), Input('selected-dates-events', 'start_date'),Input('selected-dates-events', 'end_date')])
-def wordcloud_events(events_types,start_date,end_date):
-    if events_types == []:
+@memoize()
+def wordcloud_events(selection):
+    if selection["values"] == []:
         return dash.no_update
 
-    df = events[["label", "eventType", "firstPeriods-startDate"]].copy()
-    df["eventType"].fillna('NOT ASSIGNED', inplace=True)
-    df = df.loc[df["eventType"].isin(events_types)]
-
-    df = dataset_with_correct_dates(df, "firstPeriods-startDate", start_date, end_date)
-    df.reset_index(inplace=True, drop=True)
-
-    text = " ".join([df.label[i] for i in range(0, df.shape[0]) if pd.notna(df.label[i])])
-
-    counts = Counter(text.split(" "))
-    counts = sorted(counts.items(), key=lambda x: -x[1])
-
-    text_list = set()
-    i = 0
-    while (len(text_list) < 40) and (i < len(counts)):
-        if (counts[i][0] not in stopwords) and (len(counts[i][0])>2):
-            text_list.add(counts[i][0])
-        i += 1
+    data = get_snapshot()
+    text_list = top_words(data["events_words"], selection["values"], selection["start_date"], selection["end_date"], 40)
+    end_phase("filtering")
 
     colors = [plotly.colors.DEFAULT_PLOTLY_COLORS[random.randrange(1, 10)] for i in range(40)]
     weights = [45 - i for i in range(40)]
@@ -735,80 +940,93 @@ def wordcloud_events(events_types,start_date,end_date):
                         'yaxis': {'showgrid': False, 'showticklabels': False, 'zeroline': False},
                         'margin': {"r": 0, "t": 30, "l": 0, "b": 0}})
     fig = go.Figure(data=[data], layout=layout)
+    end_phase("figure")
 
     return fig
 
-@app.callback([Output('events-authors', 'data'),Output('events-authors', 'columns')],
-              [Input('events-types', 'value'), Input('selected-dates-events', 'start_date'),Input('selected-dates-events', 'end_date')])
-def events_authors(events_types, start_date, end_date):
-    if events_types == []:
+background_callback(Output('events-wordcloud', 'figure'), [Input('events-selection', 'data')], wordcloud_events)
+
+# Ranking of the authors with the most homeworks or events of some types over a period, computed once for all the pages
+# of the leaderboard from the counts per author and per day. Only the LEADERBOARD_SIZE first authors are ranked unless
+# "complete": a filter or a sort has to search all the authors (an author outside the top can be looked for by name)
+@memoize()
+def authors_ranking(name, types, start_date, end_date, count_name, complete=False):
+    data = get_snapshot()
+    counts = count_authors(data[name], start_date, end_date, types)
+    return rank_authors(data[name], counts, count_name, len(counts) if complete else LEADERBOARD_SIZE)
+
+# The leaderboards of the authors are paged, sorted and filtered by the server: only the rows of the page shown are sent
+@app.callback([Output('homeworks-authors', 'data'),Output('homeworks-authors', 'page_count')],
+              [Input('selected-dates-events', 'start_date'), Input('selected-dates-events', 'end_date'),
+               Input('homeworks-authors', 'page_current'), Input('homeworks-authors', 'page_size'), Input('homeworks-authors', 'sort_by'),
+               Input('homeworks-authors', 'filter_query')])
+@memoize()
+def homeworks_authors_page(start_date, end_date, page_current, page_size, sort_by, filter_query):
+    ranking = authors_ranking("homeworks_authors", None, start_date, end_date, "Homeworks Created",
+                              bool(filter_query or sort_by))
+    end_phase("filtering")
+
+    page = table_page(ranking, page_current, page_size, sort_by, filter_query)
+    end_phase("figure")
+
+    return page
+
+@app.callback([Output('events-authors', 'data'),Output('events-authors', 'page_count')],
+              [Input('events-selection', 'data'), Input('events-authors', 'page_current'), Input('events-authors', 'page_size'),
+               Input('events-authors', 'sort_by'), Input('events-authors', 'filter_query')])
+@memoize()
+def events_authors(selection, page_current, page_size, sort_by, filter_query):
+    if selection["values"] == []:
         return dash.no_update
 
-    df = events[["id", "author", "eventType", "firstPeriods-startDate"]].copy()
-    df["eventType"].fillna('NOT ASSIGNED', inplace=True)
-    df = df.loc[df["eventType"].isin(events_types)]
+    ranking = authors_ranking("events_authors", selection["values"], selection["start_date"], selection["end_date"], "Events Created",
+                              bool(filter_query or sort_by))
+    end_phase("filtering")
 
-    df = dataset_with_correct_dates(df, "firstPeriods-startDate", start_date, end_date)
+    page = table_page(ranking, page_current, page_size, sort_by, filter_query)
+    end_phase("figure")
 
-    events_authors = df.groupby("author").count()["id"].sort_values(ascending=False).reset_index().rename(columns={"author": "Author", "id": "Events Created"})
-    events_authors["Rank"] = events_authors["Events Created"].rank(ascending=False)
-    events_authors["Rank"] = events_authors["Rank"].apply(int)
-    events_authors = events_authors[["Rank", "Author", "Events Created"]]
+    return page
 
-    data_columns = [{"name": i, "id": i} for i in events_authors.columns]
-    data = events_authors.to_dict('records')
-
-    return data, data_columns
-
-@app.callback(Output('notifications-treemap', 'figure'),
-                 [Input('notifications-types', 'value'), Input('selected-dates-notifications', 'start_date'), Input('selected-dates-notifications', 'end_date')])
+@memoize()
 def treemap_notifications(notifications_group, start_date, end_date):
+    import plotly.express as px
+
     if notifications_group == []:
         return dash.no_update
 
-    df = notifications[["id", "creationDate", "notificationType", "Group"]].copy()
-    df.fillna("NOT ASSIGNED",inplace=True)
-    df = df.loc[df["Group"].isin(notifications_group)]
-    df = dataset_with_correct_dates(df, "creationDate", start_date, end_date)
-
-    df = df.groupby(["Group", "notificationType"]).count()
-    df = df.reset_index().rename(columns={'id': 'Number'})
+    data = get_snapshot()
+    df = counts_between(data["notifications_counts"], start_date, end_date)
+    df = df[counts_with_values(df, "Group", notifications_group) & (df > 0)]
+    df = df.rename("Number").reset_index()
+    df = df.astype({"Group": str, "notificationType": str})
     df["Notifications"] = "NOTIFICATIONS"
+    end_phase("filtering")
 
     fig = px.treemap(df, path=['Notifications', 'Group', 'notificationType'], values=df["Number"], color=df["Group"],
                      color_discrete_map={"(?)":"#d3d3d3", "SETUP": "#4e99f6", "EVENT":"#2dd36f", "HOMEWORK" : "#7039bd", "CLASSES" : "#f8e71c"},
                      hover_name=df["Number"])
 
     fig.data[0].textinfo = 'label+text+value+percent parent+percent root'
+    end_phase("figure")
 
     return fig
 
-@app.callback(Output('notifications-wordcloud', 'figure'),
-                 [Input('selected-dates-notifications', 'start_date'),Input('selected-dates-notifications', 'end_date')])
+background_callback(Output('notifications-treemap', 'figure'),
+                    [Input('notifications-types', 'value'), Input('selected-dates-notifications', 'start_date'), Input('selected-dates-notifications', 'end_date')],
+                    treemap_notifications)
+
+@memoize()
 def wordcloud_notifications(start_date,end_date):
-    start_date = pd.to_datetime(start_date).date()
-    end_date = pd.to_datetime(end_date).date()
+    data = get_snapshot()
 
-    source = notifications[["creationDate", "message"]].copy()
-    source.dropna(axis=0, inplace=True)
-    source["creationDate"] = pd.to_datetime(source["creationDate"]).dt.date
+    source = dataset_with_correct_dates(data["notifications"], start_date, end_date)
+    source = source[["message"]].dropna(axis=0)
 
     source["message"] = source["message"].str.strip(',.!?\n\t')
     source["message"] = source["message"].str.replace(",", "")
     source["message"] = source["message"].str.replace("l''agenda", "l'agenda")
     source["message"] = source["message"].str.replace(",", "")
-
-    source = source.sort_values("creationDate", ignore_index=True)
-    source2 = source.set_index("creationDate")
-    source2 = source2[~source2.index.duplicated(keep='first')]
-
-    start_index = source2.index.get_loc(start_date, method='bfill')
-    start_date = source2.reset_index().iloc[start_index]["creationDate"]
-
-    end_index = source2.index.get_loc(end_date, method='ffill')
-    end_date = source2.reset_index().iloc[end_index]["creationDate"]
-
-    source = source.loc[(source.creationDate>=start_date)&(source.creationDate<=end_date)]
     source.reset_index(inplace=True, drop=True)
 
     text = " ".join([source.message[i] for i in range(0, source.shape[0]) if pd.notna(source.message[i])])
@@ -822,6 +1040,7 @@ def wordcloud_notifications(start_date,end_date):
         if (counts[i][0] not in stopwords) and (len(counts[i][0])>2):
             text_list.add(counts[i][0])
         i += 1
+    end_phase("filtering")
 
     colors = [plotly.colors.DEFAULT_PLOTLY_COLORS[random.randrange(1, 10)] for i in range(40)]
     weights = [45 - i for i in range(40)]
@@ -838,9 +1057,156 @@ def wordcloud_notifications(start_date,end_date):
                         'yaxis': {'showgrid': False, 'showticklabels': False, 'zeroline': False},
                         'margin': {"r": 0, "t": 30, "l": 0, "b": 0}})
     fig = go.Figure(data=[data], layout=layout)
+    end_phase("figure")
 
     return fig
 
+background_callback(Output('notifications-wordcloud', 'figure'),
+                    [Input('selected-dates-notifications', 'start_date'),Input('selected-dates-notifications', 'end_date')],
+                    wordcloud_notifications)
+
+# Exports of all the rows of a dataset or a table filtered as in the dashboard, streamed by the server:
+# /export/<name>?format=csv|parquet with the filters of the section as parameters ("values" several times, the dates,
+# and the "filter_query" of the DataTables). Without "values", all the values are selected
+EXPORTS = {"events": "events_types", "notifications": "notifications_groups", "events-authors": "events_types",
+           "homeworks-authors": None, "inactive-users": None}
+
+
+def export_url(name, export_format, values=None, start_date=None, end_date=None, filter_query=None):
+    parameters = {"format": export_format}
+    if values is not None:
+        parameters["values"] = values if values != [] else ""
+    for key, value in [("start_date", start_date), ("end_date", end_date), ("filter_query", filter_query)]:
+        if value:
+            parameters[key] = value
+    return app.get_relative_path("/export/{}".format(name)) + "?" + urlencode(parameters, doseq=True)
+
+
+def export_urls(name, *filters):
+    return [export_url(name, export_format, *filters) for export_format in EXPORT_FORMATS]
+
+
+def export_dataset(name):
+    arguments = flask.request.args
+    export_format = arguments.get("format", "csv")
+    if name not in EXPORTS or export_format not in EXPORT_FORMATS:
+        flask.abort(404)
+    if export_format == "parquet" and not parquet_available():
+        flask.abort(501, "The Parquet export needs pyarrow")
+
+    data = get_snapshot()
+    start_date, end_date = arguments.get("start_date") or None, arguments.get("end_date") or None
+    filter_query = arguments.get("filter_query", "")
+    values = None
+    if EXPORTS[name] is not None:
+        values = [value for value in arguments.getlist("values") if value] if "values" in arguments else data[EXPORTS[name]]
+
+    if name == "events":
+        rows = selected_rows(data, make_selection(name, values, start_date, end_date))
+        return export_response(data[name], rows, name, export_format)
+    if name == "notifications":
+        rows = select_rows(data[name], start_date, end_date, "Group", values)
+        return export_response(data[name], rows, name, export_format)
+
+    if name == "inactive-users":
+        table = inactive_users_report(make_selection("users", None, start_date, end_date))
+    else:
+        source = "events_authors" if name == "events-authors" else "homeworks_authors"
+        table = authors_ranking(source, values, start_date, end_date,
+                                "Events Created" if name == "events-authors" else "Homeworks Created", True)
+    return export_response(filter_table(table, filter_query), None, name, export_format)
+
+
+app.server.add_url_rule("/export/<name>", "export", auth.auth_wrapper(export_dataset))
+
+@app.callback([Output('events-export-csv', 'href'), Output('events-export-parquet', 'href')], [Input('events-selection', 'data')])
+def events_export(selection):
+    return export_urls("events", selection["values"], selection["start_date"], selection["end_date"])
+
+@app.callback([Output('events-authors-export-csv', 'href'), Output('events-authors-export-parquet', 'href')],
+              [Input('events-selection', 'data'), Input('events-authors', 'filter_query')])
+def events_authors_export(selection, filter_query):
+    return export_urls("events-authors", selection["values"], selection["start_date"], selection["end_date"], filter_query)
+
+@app.callback([Output('homeworks-authors-export-csv', 'href'), Output('homeworks-authors-export-parquet', 'href')],
+              [Input('selected-dates-events', 'start_date'), Input('selected-dates-events', 'end_date'),
+               Input('homeworks-authors', 'filter_query')])
+def homeworks_authors_export(start_date, end_date, filter_query):
+    return export_urls("homeworks-authors", None, start_date, end_date, filter_query)
+
+@app.callback([Output('notifications-export-csv', 'href'), Output('notifications-export-parquet', 'href')],
+              [Input('notifications-types', 'value'), Input('selected-dates-notifications', 'start_date'), Input('selected-dates-notifications', 'end_date')])
+def notifications_export(notifications_groups, start_date, end_date):
+    return export_urls("notifications", notifications_groups, start_date, end_date)
+
+@app.callback([Output('inactive-users-export-csv', 'href'), Output('inactive-users-export-parquet', 'href')],
+              [Input('users-selection', 'data'), Input('inactive-users', 'filter_query')])
+def inactive_users_export(selection, filter_query):
+    return export_urls("inactive-users", None, selection["start_date"], selection["end_date"], filter_query)
+
+# Measuring the callbacks and the requests to the server, served on /metrics
+instrument_app(app, auth)
+
+
+# Functions of the callbacks with their inputs for the default filters of the layout (the dates are sent as strings by
+# the date pickers). The selections are made first, the callbacks drawing the sections taking them as input. The callbacks
+# computed in the background are given as their function, without the inputs polling their job
+def default_callback_inputs():
+    layout = serve_layout()
+    outputs = {}
+    inputs = []
+    for output, callback in sorted(app.callback_map.items(), key=lambda item: not item[0].endswith("-selection.data")):
+        values = [outputs.get("{}.{}".format(value["id"], value["property"]), getattr(layout[value["id"]], value["property"], None))
+                  for value in callback["inputs"]]
+        values = [str(value) if isinstance(value, date) else value for value in values]
+        function = callback["callback"].__wrapped__
+        if output.endswith("-selection.data"):
+            outputs[output] = function(*values)
+        if function.__name__ in background_callbacks:
+            function, number_of_inputs = background_callbacks[function.__name__]
+            values = values[:number_of_inputs]
+        inputs.append((output, function, values))
+    return inputs
+
+
+# Computing the callbacks with the default filters of the layout once at startup, so that the first page loads find
+# their results in the cache
+def warm_up_callbacks():
+    start = time.perf_counter()
+    for output, function, values in default_callback_inputs():
+        function(*values)
+    print("Callbacks warmed up in {:.2f}s".format(time.perf_counter() - start))
+
+
+# Checking for new versions of the clean databases in the background. When gunicorn loads the app before forking its
+# workers (see "gunicorn.conf.py"), each worker starts its background tasks after the fork: the threads are not copied
+# by the fork. A new version is then loaded by each worker in its own memory, until the workers are restarted
+def start_reloading():
+    if RELOAD_INTERVAL > 0:
+        watch_data_version("data_clean", reload_snapshot, RELOAD_INTERVAL)
+
+
+def load_first_snapshot():
+    swap_snapshot(load_snapshot())
+    warm_up_callbacks()
+    start_reloading()
+
+
+# Starting the tasks running in the background: loading the first snapshot if the app was started without it, then
+# checking for new versions of the databases
+def start_background_tasks():
+    if snapshot["current"] is None:
+        threading.Thread(target=load_first_snapshot, name="load data_clean", daemon=True).start()
+    else:
+        start_reloading()
+
+
+# Computing the default filters of the first snapshot
+if not LAZY_START:
+    warm_up_callbacks()
+if os.environ.get("FEAMZY_START_AFTER_FORK") != "1":
+    start_background_tasks()
+
 # Running the app
 if __name__ == '__main__':
     app.run_server(debug=True)
\ No newline at end of file
@@ -0,0 +1,27 @@
+import os
+import gc
+
+# Configuration of gunicorn (read automatically when it is started from this folder, as in the Procfile).
+# The app is loaded once by the master process before the workers are forked: the workers share the memory of the
+# loaded databases, indexes and counts (copy-on-write) instead of loading their own copy.
+# FEAMZY_PRELOAD=0 loads the app in each worker instead (e.g. to compare the memory used, see "benchmarks.py")
+preload_app = os.environ.get("FEAMZY_PRELOAD", "1") != "0"
+
+if preload_app:
+    # the threads loading the databases (with FEAMZY_LAZY_START=1) and checking for their new versions are started
+    # in the workers, after the fork
+    os.environ["FEAMZY_START_AFTER_FORK"] = "1"
+
+
+# Called once the app is loaded, before the workers are forked: the objects of the app are moved out of the reach of
+# the garbage collector, which would otherwise write in all their pages (and copy them in each worker) when it runs
+def when_ready(server):
+    if preload_app:
+        gc.collect()
+        gc.freeze()
+
+
+def post_fork(server, worker):
+    if preload_app:
+        import feamzy_dashboard
+        feamzy_dashboard.start_background_tasks()
@@ -0,0 +1,117 @@
+import os
+import time
+import uuid
+import sqlite3
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from cache_functions import cache_connection, flush_stats, transaction, register_version_cleaner
+
+# Slow callbacks computed in the background by a pool of JOB_WORKERS processes of each app process, so that the requests
+# of the other users are answered meanwhile (0 to compute them in the requests). The processes are forked from the app
+# process: they share its memory and its snapshot of the data, and save the results in the cache, where the page finds them.
+# The state of the jobs is kept in the file of the cache, so that any app process can answer the page asking for a result
+JOB_WORKERS = int(os.environ.get("FEAMZY_JOB_WORKERS", 2))
+
+# A job neither done nor failed after JOB_TIMEOUT seconds is considered failed (e.g. its app process was restarted). The
+# jobs submitted more than JOB_TIMEOUT seconds ago are deleted when a job is submitted, and all of them when the data changes
+JOB_TIMEOUT = 300
+
+# Functions that can be computed in the background, by name, and pool of processes of this app process
+job_functions = {}
+pool_state = {"pool": None, "pid": None}
+pool_lock = threading.Lock()
+created = threading.local()
+
+
+def jobs_connection():
+    connection = cache_connection()
+    if getattr(created, "connection", None) is not connection:
+        connection.execute("CREATE TABLE IF NOT EXISTS jobs (slot TEXT PRIMARY KEY, job TEXT, status TEXT, submitted REAL, error TEXT)")
+        created.connection = connection
+    return connection
+
+
+# The jobs of the previous data are deleted with its results: a page asking for one of them computes its chart again
+def clear_jobs(connection):
+    jobs_connection().execute("DELETE FROM jobs")
+
+
+register_version_cleaner(clear_jobs)
+
+
+def register_job(name, function):
+    job_functions[name] = function
+
+
+def job_pool():
+    with pool_lock:
+        if pool_state["pool"] is None or pool_state["pid"] != os.getpid():
+            pool_state["pool"] = ProcessPoolExecutor(max_workers=JOB_WORKERS, mp_context=multiprocessing.get_context("fork"))
+            pool_state["pid"] = os.getpid()
+        return pool_state["pool"]
+
+
+# Stopping the processes of the pool (e.g. when a new snapshot of the data is loaded: they have the previous one), the jobs
+# not started yet being cancelled. The next job starts a new pool
+def reset_job_pool():
+    with pool_lock:
+        pool, pool_state["pool"] = pool_state["pool"], None
+    if pool is not None and pool_state["pid"] == os.getpid():
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def set_job_status(slot, job, status, error=None):
+    jobs_connection().execute("UPDATE jobs SET status = ?, error = ? WHERE slot = ? AND job = ?", (status, error, slot, job))
+
+
+# Computing a job in a process of the pool, unless another job was submitted since in its slot (the same chart of the
+# same page): the result of the previous filters isn't wanted anymore
+def run_job(slot, job, name, args):
+    try:
+        row = jobs_connection().execute("SELECT job FROM jobs WHERE slot = ?", (slot,)).fetchone()
+        if row is None or row[0] != job:
+            return "superseded"
+        set_job_status(slot, job, "running")
+    except sqlite3.Error:
+        pass
+
+    # the statistics of the cache are written with the job, the processes of the pool being stopped without writing them
+    try:
+        job_functions[name](*args)
+    except Exception as error:
+        set_job_status(slot, job, "failed", repr(error))
+        return "failed"
+    finally:
+        flush_stats()
+
+    set_job_status(slot, job, "done")
+    return "done"
+
+
+# Submitting the computation of "name" with some arguments, replacing the job of the slot. Returns the id of the job
+def submit_job(slot, name, args):
+    job = uuid.uuid4().hex
+    now = time.time()
+    with transaction(jobs_connection()) as connection:
+        connection.execute("DELETE FROM jobs WHERE submitted < ?", (now - JOB_TIMEOUT,))
+        connection.execute("INSERT OR REPLACE INTO jobs VALUES (?, ?, ?, ?, ?)", (slot, job, "queued", now, None))
+    job_pool().submit(run_job, slot, job, name, args)
+    return job
+
+
+# State of a job: "queued", "running", "done", "failed", "superseded" when another job replaced it in its slot, or "lost"
+# when it was deleted (the data changed, or it was submitted long ago)
+def job_status(slot, job):
+    try:
+        row = jobs_connection().execute("SELECT job, status, submitted, error FROM jobs WHERE slot = ?", (slot,)).fetchone()
+    except sqlite3.Error:
+        return "queued", None
+    if row is None:
+        return "lost", None
+    if row[0] != job:
+        return "superseded", None
+    if row[1] in ["queued", "running"] and time.time() - row[2] > JOB_TIMEOUT:
+        return "failed", "timeout"
+    return row[1], row[3]
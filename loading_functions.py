@@ -0,0 +1,264 @@
+import pandas as pd
+import os
+import time
+import hashlib
+import threading
+
+# Original GeoJSON of the French départements, and simplified copy served by the dashboard as a static file
+# (made by "cleaning_functions.simplify_geojson")
+DEPARTEMENTS_URL = "https://france-geojson.gregoiredavid.fr/repo/departements.geojson"
+STATIC_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
+DEPARTEMENTS_GEOJSON = "departements.geojson"
+
+# Columns of each clean database used by the dashboard, and how to store them:
+# - "dtypes": columns read from the file with their types ("category" for the strings with only a few different values)
+# - "dates": columns parsed as dates
+# - "missing": values given to the empty cells of some columns
+# - "index": date column used to sort and index the database (see "index_by_date")
+SCHEMAS = {
+    "ClassStats": {
+        "dtypes": {"id": "object", "schoolid": "object", "nbChild": "float32", "nbArchivedChildren": "float32",
+                   "libelle_region": "category", "secteur_public_prive_libe": "category",
+                   "appellation_officielle": "object", "libelle_commune": "object", "localite_acheminement_uai": "object",
+                   "libelle_departement": "category", "code_postal_uai": "object", "geometry_type": "category",
+                   "coordinatesLat": "float64", "coordinatesLong": "float64"},
+        "dates": ["creationDate"],
+        "missing": {},
+        "index": "creationDate",
+    },
+    "User": {
+        "dtypes": {"id": "object", "username": "object", "groupChildSize": "float32"},
+        "dates": ["creationDate"],
+        "missing": {},
+        "index": "creationDate",
+    },
+    "HomeworkRequest": {
+        "dtypes": {"id": "object", "userId": "object", "classId": "object", "type": "category"},
+        "dates": ["creationDate"],
+        "missing": {"type": "NOT ASSIGNED"},
+        "index": "creationDate",
+    },
+    "Document": {
+        "dtypes": {"id": "object", "userId": "object", "type": "category"},
+        "dates": ["creationDate"],
+        "missing": {},
+        "index": "creationDate",
+    },
+    "Notification": {
+        "dtypes": {"id": "object", "notificationType": "category", "Group": "category", "message": "object"},
+        "dates": ["creationDate"],
+        "missing": {"notificationType": "NOT ASSIGNED", "Group": "NOT ASSIGNED"},
+        "index": "creationDate",
+    },
+    "Event": {
+        "dtypes": {"id": "object", "eventType": "category", "label": "object", "author": "object", "nbPeriods": "float32"},
+        "dates": ["firstPeriods-startDate", "creationDate"],
+        "missing": {"eventType": "NOT ASSIGNED"},
+        "index": "firstPeriods-startDate",
+    },
+}
+
+
+# Function to index a dataset by one of its date columns, only once when the dataset is loaded.
+# The rows are sorted by day (rows without a valid date come first), so that the dates filters become binary searches
+def index_by_date(df, column):
+    dates = pd.to_datetime(df[column], errors="coerce")
+    if dates.dt.tz is not None:
+        dates = dates.dt.tz_localize(None)
+
+    df = df.set_index(pd.DatetimeIndex(dates.dt.normalize(), name="day"))
+    df = df.sort_index(kind="mergesort", na_position="first")
+
+    return df
+
+
+# Function to detect the most closest dates chosen from the filter.
+# Sometimes there's no activity in the date chosen by the user, therefore this function will be able to bypass that
+# by returning the closest precise date within the period given by the user.
+# The dataset has to be indexed with "index_by_date": the closest dates are found by binary search and the rows
+# in between are returned as a slice of the dataset, without copying it. A missing date leaves the period open.
+def dataset_with_correct_dates(df, start_date, end_date):
+    start_index, end_index = rows_between(df, start_date, end_date)
+    return df.iloc[start_index:end_index]
+
+
+# Positions of the first row of a period and of the row after it in a dataset indexed with "index_by_date"
+def rows_between(df, start_date, end_date):
+    days = df.index.asi8
+
+    if start_date is None:
+        start_index = days.searchsorted(pd.NaT.value, side="right")
+    else:
+        start_index = days.searchsorted(pd.to_datetime(start_date).normalize().value, side="left")
+
+    if end_date is None:
+        end_index = len(days)
+    else:
+        end_index = days.searchsorted(pd.to_datetime(end_date).normalize().value, side="right")
+
+    return start_index, end_index
+
+
+# Giving to a database the columns and types declared in its schema, then indexing it by date
+def apply_schema(df, name):
+    schema = SCHEMAS[name]
+
+    for column, dtype in schema["dtypes"].items():
+        if column not in df.columns:
+            df[column] = pd.Series(index=df.index, dtype=dtype)
+
+    for column, value in schema["missing"].items():
+        if df[column].dtype.name == "category" and value not in df[column].cat.categories:
+            df[column] = df[column].cat.add_categories(value)
+        df[column] = df[column].fillna(value)
+
+    df = df.astype(schema["dtypes"])
+
+    for column in schema["dates"]:
+        if column not in df.columns:
+            df[column] = pd.NaT
+        df[column] = pd.to_datetime(df[column], errors="coerce", utc=True).dt.tz_convert(None)
+
+    df = df[list(schema["dtypes"]) + schema["dates"]]
+
+    return index_by_date(df, schema["index"])
+
+
+# Printing the memory used by a database
+def report_memory(name, df):
+    memory = df.memory_usage(deep=True).sum() / 1024 ** 2
+    print("{}: {} rows, {:.1f} MB".format(name, df.shape[0], memory))
+
+
+# Writing a typed database in the columnar format (Feather), so that the dates and categories are kept
+# and the dashboard doesn't have to parse the CSV again
+def save_columnar(df, path):
+    df.reset_index(drop=True).to_feather(path)
+
+
+# Writing the chunks of a typed database to one Feather file, chunk by chunk (see "read_csv_database_in_chunks"). The chunks
+# have the types of the first one, the text columns without any value being written as strings
+def save_columnar_in_chunks(chunks, path):
+    import pyarrow as pa
+
+    writer = None
+    for chunk in chunks:
+        chunk = chunk.reset_index(drop=True)
+        if writer is None:
+            schema = pa.Schema.from_pandas(chunk, preserve_index=False)
+            for i, field in enumerate(schema):
+                if pa.types.is_null(field.type):
+                    schema = schema.set(i, field.with_type(pa.string()))
+            writer = pa.ipc.new_file(path, schema, options=pa.ipc.IpcWriteOptions(compression="lz4"))
+        writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+    writer.close()
+
+
+# Reading a database saved with "save_columnar", returning None if it can't be used (pyarrow not installed,
+# file older than the CSV or written with another schema): the CSV is read instead
+def load_columnar(name, folder="data_clean"):
+    schema = SCHEMAS[name]
+    path = os.path.join(folder, name + ".feather")
+    csv_path = os.path.join(folder, name + ".csv")
+
+    if not os.path.exists(path):
+        return None
+    if os.path.exists(csv_path) and os.path.getmtime(csv_path) > os.path.getmtime(path):
+        return None
+
+    try:
+        df = pd.read_feather(path)
+    except ImportError:
+        return None
+
+    if list(df.columns) != list(schema["dtypes"]) + schema["dates"]:
+        return None
+
+    return index_by_date(df, schema["index"])
+
+
+# Reading a clean CSV with only the columns of the schema of its database
+def read_csv_database(path, name):
+    schema = SCHEMAS[name]
+    columns = list(schema["dtypes"]) + schema["dates"]
+
+    df = pd.read_csv(path, usecols=lambda column: column in columns, dtype=schema["dtypes"])
+
+    return apply_schema(df, name)
+
+
+# Reading a clean CSV as "read_csv_database", chunk by chunk: a first reading of the columns of categories only finds all
+# their values, so that every chunk has the same categories as the whole database read at once
+def read_csv_database_in_chunks(path, name, chunksize):
+    schema = SCHEMAS[name]
+    columns = list(schema["dtypes"]) + schema["dates"]
+    category_columns = [column for column, dtype in schema["dtypes"].items() if dtype == "category"]
+
+    values = {column: set() for column in category_columns}
+    for chunk in pd.read_csv(path, usecols=lambda column: column in category_columns, dtype=object, chunksize=chunksize):
+        for column in chunk.columns:
+            values[column].update(chunk[column].dropna())
+    categories = {column: sorted(values[column]) for column in category_columns}
+    for column, value in schema["missing"].items():
+        if column in categories and value not in categories[column]:
+            categories[column].append(value)
+
+    for chunk in pd.read_csv(path, usecols=lambda column: column in columns, dtype=schema["dtypes"], chunksize=chunksize):
+        chunk = apply_schema(chunk, name)
+        for column in category_columns:
+            chunk[column] = chunk[column].cat.set_categories(categories[column])
+        yield chunk
+
+
+# Version of the clean databases of a folder, changing whenever one of them is written again: the results computed from
+# the databases (e.g. the cached results of the callbacks) are only valid for this version
+def data_version(folder="data_clean"):
+    files = []
+    for name in sorted(SCHEMAS):
+        for extension in [".feather", ".csv"]:
+            path = os.path.join(folder, name + extension)
+            if os.path.exists(path):
+                status = os.stat(path)
+                files.append("{}:{}:{}".format(name + extension, status.st_size, status.st_mtime_ns))
+    return hashlib.sha256("|".join(files).encode("utf-8")).hexdigest()[:16]
+
+
+# Checking in the background, every "interval" seconds, if the version of the clean databases of a folder has changed.
+# "on_change" is called once the new version hasn't changed for a whole interval (the cleaning may still be writing the
+# databases before), and called again at the next check if it failed
+def watch_data_version(folder, on_change, interval=60):
+    def watch():
+        loaded = previous = data_version(folder)
+        while True:
+            time.sleep(interval)
+            version = data_version(folder)
+            if version != loaded and version == previous:
+                try:
+                    on_change()
+                    loaded = version
+                except Exception as error:
+                    print("Loading the version {} of {} failed: {!r}".format(version, folder, error))
+            previous = version
+
+    thread = threading.Thread(target=watch, name="watch " + folder, daemon=True)
+    thread.start()
+    return thread
+
+
+# Reading a clean database, from its columnar file if possible
+def load_database(name, folder="data_clean"):
+    df = load_columnar(name, folder)
+    if df is None:
+        df = read_csv_database(os.path.join(folder, name + ".csv"), name)
+
+    report_memory(name, df)
+
+    return df
+
+
+# Source of the départements boundaries for the maps: the local simplified GeoJSON when it exists, only referenced
+# by its URL so that the browser downloads it once instead of receiving it with every figure, or the original one otherwise
+def departements_source():
+    if os.path.exists(os.path.join(STATIC_FOLDER, DEPARTEMENTS_GEOJSON)):
+        return "/static/" + DEPARTEMENTS_GEOJSON
+    return DEPARTEMENTS_URL
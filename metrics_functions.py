@@ -0,0 +1,262 @@
+import os
+import json
+import time
+import bisect
+import sqlite3
+import threading
+
+import flask
+from dash.exceptions import PreventUpdate
+
+from cache_functions import cache_connection, cache_counters, register_flusher, start_flusher, flush_stats
+
+# Metrics of the callbacks of the dashboard and of the requests to its server, added up in the memory of each process and
+# written to the file of the cache with its statistics (every FLUSH_INTERVAL seconds, in one transaction), so that all the
+# gunicorn workers add to the same metrics, served in the Prometheus text format on /metrics (see "instrument_app").
+# The callbacks taking more than SLOW_CALLBACK seconds are also printed with their inputs (0 to not print them)
+SLOW_CALLBACK = float(os.environ.get("FEAMZY_SLOW_CALLBACK", 0))
+
+# Upper bounds (in seconds) of the buckets of the histogram of the time of the callbacks
+LATENCY_BUCKETS = [0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+
+# Phases of a callback: filtering the data and building the figure (marked by the callback with "end_phase"), and the rest
+# of the time (reading the cache, serialising the response)
+PHASES = ["filtering", "figure", "other"]
+
+# Timer of the callback being computed by each thread, and connection of each thread whose tables were created
+timers = threading.local()
+created = threading.local()
+
+# Metrics of this process not written yet: per callback (calls, prevented, errors, seconds, bytes, then the seconds of
+# each phase), per callback and bucket of latency (calls), and per route and status (calls, seconds, bytes)
+measures = {"callbacks": {}, "latencies": {}, "requests": {}, "lock": threading.Lock()}
+
+
+def metrics_connection():
+    connection = cache_connection()
+    if getattr(created, "connection", None) is not connection:
+        connection.execute("CREATE TABLE IF NOT EXISTS callback_metrics (name TEXT PRIMARY KEY, calls INTEGER DEFAULT 0, "
+                           "prevented INTEGER DEFAULT 0, errors INTEGER DEFAULT 0, seconds REAL DEFAULT 0, bytes INTEGER DEFAULT 0, "
+                           "filtering REAL DEFAULT 0, figure REAL DEFAULT 0, other REAL DEFAULT 0)")
+        connection.execute("CREATE TABLE IF NOT EXISTS callback_latencies (name TEXT, bucket INTEGER, calls INTEGER DEFAULT 0, "
+                           "PRIMARY KEY (name, bucket))")
+        connection.execute("CREATE TABLE IF NOT EXISTS request_metrics (path TEXT, status INTEGER, calls INTEGER DEFAULT 0, "
+                           "seconds REAL DEFAULT 0, bytes INTEGER DEFAULT 0, PRIMARY KEY (path, status))")
+        created.connection = connection
+    return connection
+
+
+def add_measure(kind, key, values):
+    with measures["lock"]:
+        totals = measures[kind].setdefault(key, [0] * len(values))
+        for i, value in enumerate(values):
+            totals[i] += value
+    start_flusher()
+
+
+# Statements adding the metrics measured since the last write (see "cache_functions.flush_stats"). While the tables can't
+# be created, the metrics stay in memory
+def metrics_stats():
+    try:
+        metrics_connection()
+    except sqlite3.Error:
+        return []
+    with measures["lock"]:
+        callbacks, latencies, requests = measures["callbacks"], measures["latencies"], measures["requests"]
+        measures.update({"callbacks": {}, "latencies": {}, "requests": {}})
+
+    return [("INSERT OR IGNORE INTO callback_metrics (name) VALUES (?)", [(name,) for name in callbacks]),
+            ("UPDATE callback_metrics SET calls = calls + ?, prevented = prevented + ?, errors = errors + ?, seconds = seconds + ?, "
+             "bytes = bytes + ?, filtering = filtering + ?, figure = figure + ?, other = other + ? WHERE name = ?",
+             [tuple(values) + (name,) for name, values in callbacks.items()]),
+            ("INSERT OR IGNORE INTO callback_latencies (name, bucket) VALUES (?, ?)", list(latencies)),
+            ("UPDATE callback_latencies SET calls = calls + ? WHERE name = ? AND bucket = ?",
+             [(values[0],) + key for key, values in latencies.items()]),
+            ("INSERT OR IGNORE INTO request_metrics (path, status) VALUES (?, ?)", list(requests)),
+            ("UPDATE request_metrics SET calls = calls + ?, seconds = seconds + ?, bytes = bytes + ? WHERE path = ? AND status = ?",
+             [tuple(values) + key for key, values in requests.items()])]
+
+
+# A forked process starts without the metrics of its parent, and with a new lock (see "cache_functions.reset_stats")
+def reset_measures():
+    measures.update({"callbacks": {}, "latencies": {}, "requests": {}, "lock": threading.Lock()})
+
+
+register_flusher(metrics_stats)
+os.register_at_fork(after_in_child=reset_measures)
+
+
+# Marking the end of a phase of the callback computed by this thread: the time since the previous phase is counted in it.
+# Outside of an instrumented callback (e.g. during the warm-up), nothing is counted
+def end_phase(phase):
+    timer = getattr(timers, "timer", None)
+    if timer is None:
+        return
+    now = time.perf_counter()
+    timer[phase] += now - timer["last"]
+    timer["last"] = now
+
+
+def record_callback(name, outcome, seconds, timer, size, inputs):
+    phases = {"filtering": timer["filtering"], "figure": timer["figure"]}
+    phases["other"] = max(seconds - phases["filtering"] - phases["figure"], 0)
+    bucket = bisect.bisect_left(LATENCY_BUCKETS, seconds)
+
+    add_measure("callbacks", name, [1, int(outcome == "prevented"), int(outcome == "error"), seconds, size,
+                                    phases["filtering"], phases["figure"], phases["other"]])
+    add_measure("latencies", (name, bucket), [1])
+
+    if SLOW_CALLBACK > 0 and seconds >= SLOW_CALLBACK:
+        print("Slow callback {} ({}): {:.3f}s (filtering {:.3f}s, figure {:.3f}s, other {:.3f}s), {} bytes, inputs: {}".format(
+            name, outcome, seconds, phases["filtering"], phases["figure"], phases["other"], size, json.dumps(inputs, default=str)[:1000]))
+
+
+# Measuring a callback as Dash calls it: the time of the whole callback (including the cache and the serialisation of the
+# response) and the size of its response (JSON, only ASCII characters). The callback stays reachable by "__wrapped__",
+# as the callbacks of Dash, to be computed without being measured
+def instrument_callback(name, callback):
+    def instrumented(*args, **kwargs):
+        timer = timers.timer = {"last": time.perf_counter(), "filtering": 0.0, "figure": 0.0}
+        start = timer["last"]
+        outcome, response = "ok", None
+        try:
+            response = callback(*args, **kwargs)
+            return response
+        except PreventUpdate:
+            outcome = "prevented"
+            raise
+        except Exception:
+            outcome = "error"
+            raise
+        finally:
+            timers.timer = None
+            record_callback(name, outcome, time.perf_counter() - start, timer, len(response or ""), args)
+
+    instrumented.__name__ = name
+    instrumented.__wrapped__ = callback.__wrapped__
+    return instrumented
+
+
+def record_request(path, status, seconds, size):
+    add_measure("requests", (path, status), [1, seconds, size])
+
+
+# Body of a streamed response (e.g. an export) counting the bytes sent, the request being measured when the server closes
+# the response, once the whole body is sent (see "instrument_app")
+class MeasuredStream:
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.size = 0
+
+    def __iter__(self):
+        for chunk in self.chunks:
+            self.size += len(chunk.encode("utf-8") if isinstance(chunk, str) else chunk)
+            yield chunk
+
+    def close(self):
+        if hasattr(self.chunks, "close"):
+            self.chunks.close()
+
+
+def escape_label(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def labels(**values):
+    return "{" + ",".join('{}="{}"'.format(key, escape_label(value)) for key, value in values.items()) + "}"
+
+
+# Metrics of all the workers in the Prometheus text format, the metrics of this process being written first (the other
+# workers write theirs every FLUSH_INTERVAL seconds)
+def render_metrics():
+    flush_stats()
+    try:
+        connection = metrics_connection()
+        callbacks = connection.execute("SELECT name, calls, prevented, errors, seconds, bytes, filtering, figure, other "
+                                       "FROM callback_metrics ORDER BY name").fetchall()
+        latencies = connection.execute("SELECT name, bucket, calls FROM callback_latencies").fetchall()
+        requests = connection.execute("SELECT path, status, calls, seconds, bytes FROM request_metrics ORDER BY path, status").fetchall()
+    except sqlite3.Error:
+        callbacks, latencies, requests = [], [], []
+
+    buckets = {}
+    for name, bucket, calls in latencies:
+        buckets.setdefault(name, [0] * (len(LATENCY_BUCKETS) + 1))[bucket] += calls
+
+    lines = []
+
+    def metric(name, kind, description, samples):
+        lines.append("# HELP {} {}".format(name, description))
+        lines.append("# TYPE {} {}".format(name, kind))
+        for sample_name, sample_labels, value in samples:
+            lines.append("{}{} {}".format(sample_name, sample_labels, value))
+
+    metric("feamzy_callback_calls_total", "counter", "Calls of each callback of the dashboard",
+           [("feamzy_callback_calls_total", labels(callback=row[0]), row[1]) for row in callbacks])
+    metric("feamzy_callback_prevented_total", "counter", "Calls of each callback not updating the page (e.g. empty filter)",
+           [("feamzy_callback_prevented_total", labels(callback=row[0]), row[2]) for row in callbacks])
+    metric("feamzy_callback_errors_total", "counter", "Calls of each callback raising an error",
+           [("feamzy_callback_errors_total", labels(callback=row[0]), row[3]) for row in callbacks])
+
+    samples = []
+    for name, calls, prevented, errors, seconds, size, filtering, figure, other in callbacks:
+        cumulated = 0
+        for bound, count in zip(LATENCY_BUCKETS + ["+Inf"], buckets.get(name, [0] * (len(LATENCY_BUCKETS) + 1))):
+            cumulated += count
+            samples.append(("feamzy_callback_seconds_bucket", labels(callback=name, le=bound), cumulated))
+        samples.append(("feamzy_callback_seconds_sum", labels(callback=name), seconds))
+        samples.append(("feamzy_callback_seconds_count", labels(callback=name), calls))
+    metric("feamzy_callback_seconds", "histogram", "Time of each callback, cache and serialisation of the response included", samples)
+
+    metric("feamzy_callback_phase_seconds_total", "counter", "Time of each callback spent filtering the data, building the figure and in the rest",
+           [("feamzy_callback_phase_seconds_total", labels(callback=row[0], phase=phase), value)
+            for row in callbacks for phase, value in zip(PHASES, row[6:9])])
+    metric("feamzy_callback_response_bytes_total", "counter", "Size of the responses of each callback",
+           [("feamzy_callback_response_bytes_total", labels(callback=row[0]), row[5]) for row in callbacks])
+
+    counters = cache_counters()
+    metric("feamzy_cache_hits_total", "counter", "Results of each callback (and selections of rows) read from the cache",
+           [("feamzy_cache_hits_total", labels(callback=name), counts["hits"]) for name, counts in counters.items()])
+    metric("feamzy_cache_misses_total", "counter", "Results of each callback (and selections of rows) computed",
+           [("feamzy_cache_misses_total", labels(callback=name), counts["misses"]) for name, counts in counters.items()])
+
+    metric("feamzy_http_requests_total", "counter", "Requests to the server per route and status",
+           [("feamzy_http_requests_total", labels(path=row[0], status=row[1]), row[2]) for row in requests])
+    metric("feamzy_http_request_seconds_total", "counter", "Time of the requests to the server per route and status",
+           [("feamzy_http_request_seconds_total", labels(path=row[0], status=row[1]), row[3]) for row in requests])
+    metric("feamzy_http_response_bytes_total", "counter", "Size of the responses of the server per route and status",
+           [("feamzy_http_response_bytes_total", labels(path=row[0], status=row[1]), row[4]) for row in requests])
+
+    return "\n".join(lines) + "\n"
+
+
+# Measuring all the callbacks of a Dash app and all the requests to its server, and adding the /metrics route, protected
+# by the same authentication as the app (the views added after the authentication aren't protected by it)
+def instrument_app(app, auth):
+    for callback in app.callback_map.values():
+        callback["callback"] = instrument_callback(callback["callback"].__name__, callback["callback"])
+
+    server = app.server
+
+    @server.before_request
+    def start_request():
+        flask.g.metrics_start = time.perf_counter()
+
+    @server.after_request
+    def end_request(response):
+        start = flask.g.pop("metrics_start", None)
+        if start is None:
+            return response
+        path = flask.request.url_rule.rule if flask.request.url_rule is not None else "other"
+        status = response.status_code
+        if response.is_streamed:
+            stream = response.response = MeasuredStream(response.response)
+            response.call_on_close(lambda: record_request(path, status, time.perf_counter() - start, stream.size))
+        else:
+            record_request(path, status, time.perf_counter() - start, response.content_length or 0)
+        return response
+
+    def metrics():
+        return flask.Response(render_metrics(), mimetype="text/plain; version=0.0.4")
+
+    server.add_url_rule("/metrics", "metrics", auth.auth_wrapper(metrics))
@@ -0,0 +1,131 @@
+import pandas as pd
+import numpy as np
+import os
+import sys
+
+from cleaning_functions import DATA_FOLDER
+
+# Synthetic raw exports of the databases, with the columns read by the cleaning and the dashboard, to measure the
+# dashboard without the real exports (see "benchmarks.py"). Number of rows of each database at the scale 1:
+ROWS = {"ClassStats": 500, "User": 2000, "HomeworkRequest": 3000, "Document": 1000, "Notification": 20000, "Event": 4000}
+
+# Values of the categories, with their frequencies: a few values are much more frequent than the others, as in the exports
+REGIONS = {"Île-de-France": 30, "Auvergne-Rhône-Alpes": 14, "Hauts-de-France": 10, "Nouvelle-Aquitaine": 9, "Occitanie": 9,
+           "Grand Est": 8, "Provence-Alpes-Côte d'Azur": 7, "Pays de la Loire": 5, "Bretagne": 4, "Normandie": 3,
+           "Bourgogne-Franche-Comté": 3, "Centre-Val de Loire": 2, "Corse": 1}
+EVENT_TYPES = {"MEETING": 55, "OUTING": 20, "PARTY": 10, "TRIP": 5, "SPORT": 4, "Null": 6}
+NOTIFICATION_TYPES = {"INFORMATION_EVENT": 30, "INVITATION_EVENT": 20, "PERIOD_TO_VALIDATE": 5, "INFORMATION": 5,
+                      "SETUP_CALENDAR": 3, "SETUP_CLASS": 3, "SETUP_SCHOOL": 2, "HOMEWORK_REQUEST": 15, "HOMEWORK_RESPONSE": 10,
+                      "INVITATION_CLASS": 4, "MODAL_NOTIF_END_COACH": 1, "MODAL_NOTIF_INIT_COACH": 1, "OTHER": 1}
+HOMEWORK_TYPES = {"HOMEWORK": 70, "LESSON": 20, "EXAM": 10}
+DOCUMENT_TYPES = {"PDF": 60, "IMAGE": 35, "Null": 5}
+
+# Messages of the notifications (with the placeholders and the encoding errors the cleaning removes, "Null" for the
+# notifications without message), the first ones being the most frequent, and words of the labels of the events
+MESSAGE_TEMPLATES = ["{0} vous invite à lévénement « {1} »", "Nouveau devoir : {0} pour le {1}", "Rappel : {0} demain",
+                     "{0} a ajouté un évènement à l''agenda", "Configurez votre classe {0}", "Ãªtes-vous disponible le {0} ?",
+                     "{0} a répondu à votre demande", "Bienvenue sur Feamzy !", "Votre abonnement se termine le {0}",
+                     "Null"]
+LABEL_WORDS = ["réunion", "parents", "sortie", "école", "piscine", "musée", "fête", "conseil", "classe", "rendez-vous",
+               "spectacle", "cantine", "kermesse", "photo", "bibliothèque", "vacances", "théâtre", "cinéma", "concert", "football",
+               "de", "la", "le", "du", "des", "l''agenda", "lévénement", "Ã©vÃ¨nement", "{0}"]
+
+
+def choice(rng, values, number_of_rows):
+    frequencies = np.array(list(values.values()), dtype=float)
+    return rng.choice(np.array(list(values), dtype=object), number_of_rows, p=frequencies / frequencies.sum())
+
+
+# Positions following a Zipf law: a few users create most of the homeworks and events
+def zipf_positions(rng, number_of_values, number_of_rows, exponent=1.3):
+    return (rng.zipf(exponent, number_of_rows) - 1) % number_of_values
+
+
+def identifiers(prefix, number_of_rows):
+    return prefix + pd.RangeIndex(number_of_rows).astype(str)
+
+
+# Dates between two days, more and more frequent (the app is used by more and more people)
+def growing_dates(rng, number_of_rows, start, end):
+    start, end = pd.Timestamp(start).value, pd.Timestamp(end).value
+    return pd.to_datetime(start + np.sqrt(rng.random(number_of_rows)) * (end - start)).strftime("%Y-%m-%d %H:%M:%S")
+
+
+# Generating the raw databases at a scale (1 for the number of rows of ROWS, 10 for 10 times more rows...).
+# The dates go from the launch of the app to the day of the export, the first periods of the events up to 6 months after
+def generate_databases(scale=1, seed=0, export_date="2021-04-12"):
+    rng = np.random.default_rng(seed)
+    rows = {name: max(int(number_of_rows * scale), 1) for name, number_of_rows in ROWS.items()}
+    launch = "2020-01-15"
+
+    n = rows["User"]
+    users = pd.DataFrame({"id": identifiers("u", n), "username": identifiers("user", n), "firstName": "Prénom", "lastName": "Nom",
+                          "nbPhoneNumbers": rng.integers(0, 2, n), "nbEmails": 1, "city": "Null",
+                          "groupChildSize": rng.integers(0, 4, n), "creationDate": growing_dates(rng, n, launch, export_date),
+                          "lastModificationDate": growing_dates(rng, n, launch, export_date)})
+
+    # The classes of a school have the same description, about 3 classes per school
+    n = rows["ClassStats"]
+    number_of_schools = max(n // 3, 1)
+    school_regions = choice(rng, REGIONS, number_of_schools)
+    schools = rng.integers(0, number_of_schools, n)
+    classes = pd.DataFrame({"id": identifiers("c", n), "schoolid": identifiers("s", number_of_schools)[schools],
+                            "nbChild": rng.poisson(18, n), "nbArchivedChildren": rng.poisson(1, n),
+                            "libelle_region": school_regions[schools],
+                            "secteur_public_prive_libe": np.where(schools % 5 == 0, "Privé", "Public"),
+                            "appellation_officielle": identifiers("Ecole ", number_of_schools)[schools],
+                            "libelle_commune": "Commune", "localite_acheminement_uai": "COMMUNE", "libelle_departement": "Département",
+                            "code_postal_uai": 75000 + schools % 1000, "geometry_type": "Point",
+                            "coordinatesLat": 43 + (schools % 50) / 10, "coordinatesLong": -1 + (schools % 60) / 10,
+                            "creationDate": growing_dates(rng, n, launch, export_date)})
+    # some classes without children
+    classes.loc[rng.random(n) < 0.1, "nbChild"] = 0
+
+    n = rows["HomeworkRequest"]
+    homeworks = pd.DataFrame({"id": identifiers("h", n), "userId": users["id"].to_numpy()[zipf_positions(rng, rows["User"], n)],
+                              "classId": classes["id"].to_numpy()[rng.integers(0, rows["ClassStats"], n)],
+                              "type": choice(rng, HOMEWORK_TYPES, n), "creationDate": growing_dates(rng, n, launch, export_date)})
+
+    n = rows["Document"]
+    documents = pd.DataFrame({"id": identifiers("d", n), "userId": users["id"].to_numpy()[zipf_positions(rng, rows["User"], n)],
+                              "type": choice(rng, DOCUMENT_TYPES, n), "creationDate": growing_dates(rng, n, launch, export_date)})
+
+    n = rows["Notification"]
+    templates = np.array(MESSAGE_TEMPLATES, dtype=object)
+    notifications = pd.DataFrame({"id": identifiers("n", n), "notificationType": choice(rng, NOTIFICATION_TYPES, n),
+                                  "message": templates[zipf_positions(rng, len(templates), n, 1.5)],
+                                  "sphere": choice(rng, {"Null": 80, "EVENT": 15, "HOMEWORK": 5}, n),
+                                  "creationDate": growing_dates(rng, n, launch, export_date)})
+
+    # The labels are a few words, the frequent words being used more often
+    n = rows["Event"]
+    words = np.array(LABEL_WORDS, dtype=object)
+    lengths = rng.integers(1, 6, n)
+    label_words = words[zipf_positions(rng, len(words), lengths.sum(), 1.2)]
+    labels = [" ".join(label) for label in np.split(label_words, np.cumsum(lengths)[:-1])]
+    end_of_events = str((pd.Timestamp(export_date) + pd.DateOffset(months=6)).date())
+    events = pd.DataFrame({"id": identifiers("e", n), "eventType": choice(rng, EVENT_TYPES, n), "label": labels,
+                           "author": users["id"].to_numpy()[zipf_positions(rng, rows["User"], n)],
+                           "nbPeriods": 1 + rng.poisson(0.7, n), "firstPeriods-startDate": growing_dates(rng, n, launch, end_of_events),
+                           "creationDate": growing_dates(rng, n, launch, export_date), "sphere": "Null"})
+
+    return {"ClassStats": classes, "User": users, "HomeworkRequest": homeworks, "Document": documents,
+            "Notification": notifications, "Event": events}
+
+
+# Writing the databases as exports of the day "export_date" (named as the exports read by "cleaning_functions.clean_all_databases")
+def write_databases(databases, folder=DATA_FOLDER, export_date="2021-04-12"):
+    os.makedirs(folder, exist_ok=True)
+    paths = {}
+    for name, df in databases.items():
+        paths[name] = os.path.join(folder, "export{}-{}.csv".format(name, export_date))
+        df.to_csv(paths[name])
+    return paths
+
+
+# "python synthetic_data.py [scale] [folder]" writes the synthetic exports in the "data" folder (or another folder)
+if __name__ == "__main__":
+    scale = float(sys.argv[1]) if len(sys.argv) > 1 else 1
+    folder = sys.argv[2] if len(sys.argv) > 2 else DATA_FOLDER
+    for name, path in write_databases(generate_databases(scale), folder).items():
+        print("{}: {}".format(name, path))